@@ -154,12 +154,31 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Update the API_URL with the correct National Grid ESO domain
 API_URL = 'https://data.nationalgrideso.com/api/3/action/datastore_search'
 
-# Update your CACHES setting to use the LocMem cache
+# Two-tier cache: a small per-worker LRU in front of a cache shared by all gunicorn
+# workers, so warm data survives --max-requests recycles. The shared tier is Redis when
+# REDIS_URL is set, otherwise a file-based cache on local disk.
+if 'REDIS_URL' in os.environ:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FILE_CACHE_DIR', '/tmp/capacity_checker_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'checker.cache_backends.TieredCache',
+        'OPTIONS': {
+            'L2_ALIAS': 'shared',
+            'L1_MAX_ENTRIES': 256,
+            'L1_TIMEOUT': 60,
+        },
+    },
+    'shared': SHARED_CACHE,
 }
 
 # For Heroku, you might want to use the following:
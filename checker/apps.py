@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CheckerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "checker"
+
+    def ready(self):
+        # Keep the in-process search token index in sync with component saves/deletes
+        from .services.search_index import connect_signals
+        connect_signals()
@@ -0,0 +1,199 @@
+"""
+Two-tier cache backend: a small per-process LRU (L1) in front of a shared cache (L2).
+
+With LocMemCache every gunicorn worker kept its own copy of the CMU data and search
+results, and lost it whenever --max-requests recycled the worker. TieredCache keeps
+hot entries in process memory for a short time and reads/writes everything through to
+another configured cache alias (Redis when REDIS_URL is set, otherwise a file-based
+cache on local disk), so warm data is shared between workers and survives restarts.
+
+Settings example:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'checker.cache_backends.TieredCache',
+            'OPTIONS': {'L2_ALIAS': 'shared', 'L1_MAX_ENTRIES': 256, 'L1_TIMEOUT': 60},
+        },
+        'shared': {...},
+    }
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """Bounded in-process LRU over a shared cache alias, with hit/miss counters."""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = options.get("L2_ALIAS", "shared")
+        # Entry cap for the in-process tier
+        self._l1_max_entries = int(options.get("L1_MAX_ENTRIES", 256))
+        # Upper bound on how long a worker serves an entry without re-reading L2,
+        # so deletes/updates made by other workers are seen within this many seconds
+        self._l1_timeout = options.get("L1_TIMEOUT", 60)
+        self._l1 = OrderedDict()  # key -> (expiry, pickled value)
+        self._lock = threading.Lock()
+        self._stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "sets": 0, "deletes": 0}
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # --- L1 helpers ---
+
+    def _l1_expiry(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        if self._l1_timeout is not None:
+            l1_expiry = time.time() + self._l1_timeout
+            expiry = l1_expiry if expiry is None else min(expiry, l1_expiry)
+        return expiry
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            expiry, pickled = entry
+            if expiry is not None and expiry <= time.time():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout):
+        # Values are pickled like LocMemCache does, so callers can't mutate cached objects
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._l1[key] = (self._l1_expiry(timeout), pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            return self._l1.pop(key, None) is not None
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    # --- Cache API ---
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(l1_key)
+        if value is not _MISSING:
+            self._count("l1_hits")
+            return value
+
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count("misses")
+            return default
+
+        self._count("l2_hits")
+        self._l1_set(l1_key, value, self._l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._count("sets")
+        if timeout is not None and timeout != DEFAULT_TIMEOUT and timeout <= 0:
+            self._l1_delete(l1_key)
+        else:
+            self._l1_set(l1_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._count("sets")
+            self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # Drop the L1 copy; the next get re-reads it with the new expiry
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        self._count("deletes")
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self._l1_get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        self._count("l1_hits", len(found))
+
+        if remaining:
+            from_l2 = self.l2.get_many(remaining, version=version)
+            for key, value in from_l2.items():
+                self._l1_set(self.make_and_validate_key(key, version=version), value, self._l1_timeout)
+            found.update(from_l2)
+            self._count("l2_hits", len(from_l2))
+            self._count("misses", len(remaining) - len(from_l2))
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        self._count("sets", len(data) - len(failed))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self._count("deletes", len(keys))
+        self.l2.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def clear_local(self):
+        """Empty this process's L1 only (the shared tier is left alone)."""
+        with self._lock:
+            self._l1.clear()
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current L1 size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["l1_entries"] = len(self._l1)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["l1_hits"] + stats["l2_hits"]) / lookups, 3) if lookups else None
+        stats["l2_backend"] = type(self.l2).__name__
+        return stats
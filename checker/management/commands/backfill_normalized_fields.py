@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+
+from checker.services.normalized_fields import backfill_normalized_fields
+
+
+class Command(BaseCommand):
+    help = 'Populate Component.company_name_norm and cmu_id_norm (normalized lookup columns) for existing rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per update batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Recheck every row, not just rows with missing values (e.g. after bulk_update/update calls)')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        self.stdout.write(self.style.NOTICE('Backfilling normalized company name / CMU ID columns...'))
+
+        def progress(checked, updated):
+            self.stdout.write(f'Checked {checked} components, updated {updated}...')
+
+        checked, updated = backfill_normalized_fields(
+            batch_size=options['batch_size'],
+            only_missing=not options['all'],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.time() - start_time:.2f}s. Checked: {checked}, Updated: {updated}'
+        ))
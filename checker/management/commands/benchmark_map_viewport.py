@@ -0,0 +1,161 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+
+from checker.models import Component
+from checker.services.spatial import (
+    STRATEGY_BOUNDS,
+    STRATEGY_GEOHASH,
+    STRATEGY_GIST,
+    bbox_filter,
+    bounds_filter,
+)
+
+# (south, west, north, east) viewports from country level down to a few streets
+VIEWPORTS = {
+    'uk': (49.8, -8.2, 59.0, 2.0),
+    'region': (51.0, -2.5, 53.0, 0.5),
+    'city': (51.4, -0.3, 51.6, 0.0),
+    'street': (51.500, -0.130, 51.510, -0.110),
+}
+
+# Box synthetic components are scattered over (roughly Great Britain)
+SYNTHETIC_BOUNDS = (50.0, -5.5, 58.5, 1.7)
+
+# Strategy that hides the coordinates from the indexes, i.e. the scan the map did before
+STRATEGY_SCAN = 'scan'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark map viewport queries (latency vs. row count) for each spatial access path. '
+        'Synthetic geocoded components are inserted inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=str, default='0,25000,100000',
+                            help='Comma-separated numbers of synthetic components to add on top of the existing table (default: 0,25000,100000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (default: 5)')
+        parser.add_argument('--viewports', type=str, default=','.join(VIEWPORTS),
+                            help=f'Comma-separated viewports to run (default: all of {", ".join(VIEWPORTS)})')
+        parser.add_argument('--technology', type=str, default=None,
+                            help='Also filter by this technology, as the map page does')
+        parser.add_argument('--explain', action='store_true', help='Print the query plan for each strategy')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic rows')
+
+    def handle(self, *args, **options):
+        try:
+            row_counts = [int(value) for value in options['rows'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--rows must be a comma-separated list of integers')
+        viewports = [name.strip() for name in options['viewports'].split(',') if name.strip()]
+        unknown = [name for name in viewports if name not in VIEWPORTS]
+        if unknown:
+            raise CommandError(f'Unknown viewport(s): {", ".join(unknown)}')
+
+        strategies = [STRATEGY_SCAN, STRATEGY_BOUNDS, STRATEGY_GEOHASH]
+        if connection.vendor == 'postgresql':
+            strategies.append(STRATEGY_GIST)
+
+        missing = Component.objects.filter(
+            latitude__isnull=False, longitude__isnull=False, geohash__isnull=True
+        ).count()
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{missing} geocoded components have no geohash yet; the geohash strategy will miss them'
+            ))
+
+        self.stdout.write(f'Database: {connection.vendor}, existing components: {Component.objects.count()}')
+        self.stdout.write(f'{"rows":>9} {"viewport":<8} {"strategy":<8} {"matches":>8} {"median ms":>10} {"max ms":>8}')
+
+        rng = random.Random(options['seed'])
+        for extra_rows in sorted(row_counts):
+            try:
+                with transaction.atomic():
+                    self._add_synthetic_components(extra_rows, rng)
+                    self._analyze()
+                    total_rows = Component.objects.count()
+                    for viewport in viewports:
+                        for strategy in strategies:
+                            self._run(total_rows, viewport, strategy, options)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete (synthetic rows rolled back)'))
+
+    def _add_synthetic_components(self, count, rng):
+        if not count:
+            return
+        technologies = list(
+            Component.objects.exclude(technology__isnull=True)
+            .values_list('technology', flat=True).distinct()[:20]
+        ) or ['Combined Heat and Power (CHP)', 'DSR']
+        south, west, north, east = SYNTHETIC_BOUNDS
+        batch = []
+        for index in range(count):
+            batch.append(Component(
+                cmu_id=f'BENCH{index}',
+                location=f'Benchmark location {index}',
+                technology=rng.choice(technologies),
+                delivery_year=str(rng.randint(2019, 2028)),
+                latitude=rng.uniform(south, north),
+                longitude=rng.uniform(west, east),
+                geocoded=True,
+            ))
+            if len(batch) >= 5000:
+                Component.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Component.objects.bulk_create(batch)
+
+    def _analyze(self):
+        # Fresh planner statistics so the indexes are considered at the new table size
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE checker_component' if connection.vendor == 'postgresql' else 'ANALYZE')
+
+    def _queryset(self, viewport, strategy, technology):
+        bbox = VIEWPORTS[viewport]
+        queryset = Component.objects.filter(geocoded=True)
+        if technology:
+            queryset = queryset.filter(technology=technology)
+        if strategy == STRATEGY_SCAN:
+            # Wrapping the columns in an expression keeps the planner off every coordinate index
+            queryset = queryset.annotate(
+                latitude_scan=ExpressionWrapper(F('latitude') + Value(0.0), output_field=FloatField()),
+                longitude_scan=ExpressionWrapper(F('longitude') + Value(0.0), output_field=FloatField()),
+            )
+            south, west, north, east = bbox
+            return queryset.filter(
+                latitude_scan__gte=south, latitude_scan__lte=north,
+                longitude_scan__gte=west, longitude_scan__lte=east,
+            )
+        if strategy == STRATEGY_BOUNDS:
+            return queryset.filter(bounds_filter(bbox))
+        return queryset.filter(bbox_filter(bbox, strategy))
+
+    def _run(self, total_rows, viewport, strategy, options):
+        queryset = self._queryset(viewport, strategy, options['technology']).order_by().values_list('id', flat=True)
+
+        if options['explain']:
+            self.stdout.write(f'-- {viewport} / {strategy}:\n{queryset.explain()}')
+
+        matches = len(list(queryset.all()))  # Warm-up run
+        timings = []
+        for _ in range(max(options['repeat'], 1)):
+            start_time = time.perf_counter()
+            list(queryset.all())  # .all() so each run hits the database instead of the result cache
+            timings.append((time.perf_counter() - start_time) * 1000)
+
+        self.stdout.write(
+            f'{total_rows:>9} {viewport:<8} {strategy:<8} {matches:>8} '
+            f'{statistics.median(timings):>10.2f} {max(timings):>8.2f}'
+        )
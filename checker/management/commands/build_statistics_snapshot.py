@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from checker.models import StatisticsSnapshot
+from checker.services.statistics_snapshot import rebuild_statistics_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed statistics snapshot that the /statistics/ page renders from'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true',
+                            help='List the stored snapshots instead of building a new one')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for snapshot in StatisticsSnapshot.objects.order_by('-version'):
+                self.stdout.write(
+                    f"v{snapshot.version} (schema {snapshot.schema_version}) built {snapshot.created_at:%Y-%m-%d %H:%M:%S} "
+                    f"in {snapshot.build_seconds:.2f}s: {snapshot.component_count} components, "
+                    f"max component id {snapshot.max_component_id}"
+                )
+            return
+
+        self.stdout.write("Building statistics snapshot...")
+        snapshot = rebuild_statistics_snapshot()
+        totals = snapshot.data['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistics snapshot v{snapshot.version} built in {snapshot.build_seconds:.2f}s: "
+            f"{totals['components']} components, {totals['cmus']} CMUs, {totals['companies']} companies, "
+            f"{totals['technologies']} technologies, {len(snapshot.data['years'])} delivery years"
+        ))
@@ -7,7 +7,10 @@ from django.conf import settings
 from ...models import Component
 
 class Command(BaseCommand):
-    help = 'Clean up JSON files after migration to database'
+    help = (
+        'Clean up the legacy json_data/components_*.json shards after migration to database '
+        '(the component store in json_data/component_store is left alone)'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--archive', action='store_true', help='Archive JSON files instead of deleting them')
@@ -0,0 +1,73 @@
+import glob
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.services.component_store import get_component_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Compact the append-only JSON component store (json_data/component_store), dropping '
+        'superseded entries; can also import or export the older components_*.json shards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='store_true', help='Show the store size and exit')
+        parser.add_argument('--min-garbage', type=float, default=0.0,
+                            help='Only compact when at least this share of the segment bytes is superseded')
+        parser.add_argument('--import-shards', action='store_true',
+                            help='First append the CMUs in json_data/components_*.json to the store')
+        parser.add_argument('--export-shards', action='store_true',
+                            help='Afterwards write json_data/components_*.json from the store')
+        parser.add_argument('--rebuild-index', action='store_true',
+                            help='Rebuild index.tsv by scanning the segments (for a lost or damaged index)')
+        parser.add_argument('--dir', type=str, help='Store directory (default json_data/component_store)')
+
+    def handle(self, *args, **options):
+        store = get_component_store(options['dir'])
+        json_dir = os.path.join(settings.BASE_DIR, 'json_data')
+
+        if options['status']:
+            self.show_stats('Component store', store.stats())
+            return
+
+        start_time = time.time()
+        if options['rebuild_index']:
+            self.stdout.write(f"Rebuilt the index: {store.rebuild_index()} CMU IDs")
+
+        if options['import_shards']:
+            shards = sorted(glob.glob(os.path.join(json_dir, 'components_*.json')))
+            if not shards:
+                raise CommandError(f"No components_*.json shards found in {json_dir}")
+            self.stdout.write(f"Importing {len(shards)} shard files...")
+            result = store.import_shards(shards)
+            self.stdout.write(
+                f"Imported {result['cmu_ids']} CMU IDs with {result['components']} components "
+                f"({result['errors']} errors)"
+            )
+
+        stats = store.stats()
+        if stats['garbage_ratio'] >= options['min_garbage'] and stats['segment_bytes']:
+            result = store.compact()
+            self.show_stats('Before', result['before'])
+            self.show_stats('After', result['after'])
+        else:
+            self.show_stats('Not compacted', stats)
+
+        if options['export_shards']:
+            written = store.export_shards(json_dir)
+            self.stdout.write(
+                f"Exported {sum(written.values())} CMU IDs to {len(written)} components_*.json files"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.time() - start_time:.1f}s"))
+
+    def show_stats(self, label, stats):
+        self.stdout.write(
+            f"{label}: {stats['cmu_ids']} CMU IDs, {stats['components']} components in "
+            f"{stats['segments']} segments, {stats['segment_bytes'] / 1024 / 1024:.1f} MB "
+            f"({stats['garbage_ratio']:.0%} superseded)"
+        )
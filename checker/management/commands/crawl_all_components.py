@@ -9,10 +9,11 @@ from django.conf import settings
 import pandas as pd
 from django.core.cache import cache
 import traceback
+from checker.services.component_store import get_component_store
 
 
 class Command(BaseCommand):
-    help = 'Crawl all components from all known CMU IDs and store them in JSON'
+    help = 'Crawl all components from all known CMU IDs and store them in the JSON component store'
 
     def add_arguments(self, parser):
         parser.add_argument('--batch', type=int, default=20, help='Number of CMU IDs to process per batch')
@@ -123,20 +124,9 @@ class Command(BaseCommand):
         # If resume mode, check which CMU IDs already have component data
         if resume_mode:
             self.stdout.write('Resume mode active, checking for already processed CMU IDs...')
-            already_processed = []
-            for cmu_id in all_cmu_ids:
-                prefix = cmu_id[0].upper() if cmu_id else "0"
-                json_path = os.path.join(json_dir, f'components_{prefix}.json')
-
-                if os.path.exists(json_path):
-                    try:
-                        with open(json_path, 'r') as f:
-                            components_data = json.load(f)
-                            if cmu_id in components_data and components_data[cmu_id]:
-                                already_processed.append(cmu_id)
-                    except Exception:
-                        # If there's an error reading the file, assume it's not processed
-                        pass
+            # One index lookup per CMU ID (services/component_store.py), not a shard load
+            store = get_component_store()
+            already_processed = {cmu_id for cmu_id in all_cmu_ids if store.has_cmu(cmu_id)}
 
             if already_processed:
                 self.stdout.write(f'Found {len(already_processed)} already processed CMU IDs, skipping them')
@@ -185,25 +175,10 @@ class Command(BaseCommand):
                 try:
                     components, _ = fetch_components_for_cmu_id(cmu_id)
 
-                    # Double-check the components were saved to JSON
-                    prefix = cmu_id[0].upper() if cmu_id else "0"
-                    json_path = os.path.join(json_dir, f'components_{prefix}.json')
-
-                    # Direct file verification
-                    if os.path.exists(json_path):
-                        try:
-                            with open(json_path, 'r') as f:
-                                file_data = json.load(f)
-                                if cmu_id not in file_data or not file_data[cmu_id]:
-                                    # If the file exists but doesn't have our data, try saving directly
-                                    self.stdout.write(f'  WARNING: {cmu_id} not found in JSON file, trying direct save')
-                                    save_component_data_to_json(cmu_id, components)
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.WARNING(f'  WARNING: Error checking JSON file for {cmu_id}: {e}'))
-                    else:
-                        self.stdout.write(f'  WARNING: JSON file for {cmu_id} not found, trying direct save')
-                        save_component_data_to_json(cmu_id, components)
+                    # Make sure the components are in the component store
+                    if components and not get_component_store().has_cmu(cmu_id):
+                        if not save_component_data_to_json(cmu_id, components):
+                            self.stdout.write(self.style.WARNING(f'  WARNING: Could not save {cmu_id} to the component store'))
 
                     processed_cmus += 1
                     total_components += len(components)
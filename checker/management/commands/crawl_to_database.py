@@ -1,13 +1,22 @@
 import time
 import requests
+import threading
 import traceback
 import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from django.conf import settings
 from checker.models import Component
-from checker.models import CMURegistry
+from checker.services.bulk_ingest import ingest_components, upsert_cmu_registry
+from checker.services.crawler import (
+    CMU_RESOURCE_ID,
+    COMPONENT_RESOURCE_ID,
+    DATASTORE_SEARCH_URL,
+    CrawlError,
+    DatastoreClient,
+)
+from checker.services.statistics_snapshot import rebuild_statistics_snapshot
 
 class Command(BaseCommand):
     help = 'Crawl component data directly into the database with resume capabilities'
@@ -21,6 +30,19 @@ class Command(BaseCommand):
         parser.add_argument('--force', action='store_true', help='Process all CMUs even if they already have components')
         parser.add_argument('--company', type=str, help='Process only CMUs for this company')
         parser.add_argument('--sleep', type=float, default=1.0, help='Sleep time between batches to avoid rate limiting')
+        # Concurrent mode (see services/crawler.py)
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Crawl with this many worker threads (0 = the serial crawl)')
+        parser.add_argument('--rate', type=float, default=5.0,
+                            help='Concurrent mode: API requests per second across all workers (0 = unlimited)')
+        parser.add_argument('--burst', type=int, default=None,
+                            help='Concurrent mode: requests allowed at once after an idle spell (default: --rate)')
+        parser.add_argument('--max-in-flight', type=int, default=None,
+                            help='Concurrent mode: maximum simultaneous API requests (default: --workers)')
+        parser.add_argument('--retries', type=int, default=4,
+                            help='Concurrent mode: retries per request on timeouts, 429 and 5xx responses')
+        parser.add_argument('--api-url', type=str, default=DATASTORE_SEARCH_URL,
+                            help='datastore_search endpoint (e.g. a local crawler_standin_server)')
 
     def handle(self, *args, **options):
         # Start the crawl
@@ -36,6 +58,16 @@ class Command(BaseCommand):
         self.force_update = options['force']
         self.company_filter = options['company']
         self.sleep_time = options['sleep']
+        self.workers = options['workers']
+        self.rate = options['rate']
+        self.burst = options['burst']
+        self.max_in_flight = options['max_in_flight'] or max(self.workers, 1)
+        self.retries = options['retries']
+        self.api_url = options['api_url']
+        # Concurrent mode checkpoint state: pages saved beyond the resume offset, and the
+        # page each worker is on
+        self.completed_offsets = []
+        self.worker_pages = {}
         
         # Setup checkpoint directory
         self.checkpoint_dir = os.path.join(settings.BASE_DIR, 'checkpoints')
@@ -67,6 +99,8 @@ class Command(BaseCommand):
         # Process specific CMU if requested
         if self.specific_cmu:
             self.crawl_single_cmu(self.specific_cmu, self.stats)
+        elif self.workers > 0:
+            self.crawl_all_cmus_concurrent()
         else:
             # Process all CMUs in batches
             self.crawl_all_cmus()
@@ -78,8 +112,17 @@ class Command(BaseCommand):
         self.stdout.write(f"  CMU IDs with components: {self.stats['cmu_ids_with_components']}")
         self.stdout.write(f"  Components found: {self.stats['components_found']}")
         self.stdout.write(f"  Components added to database: {self.stats['components_added']}")
+        self.stdout.write(f"  Components updated (--force): {self.stats.get('components_updated', 0)}")
         self.stdout.write(f"  Components skipped: {self.stats.get('components_skipped', 0)}")
         self.stdout.write(f"  Errors encountered: {self.stats['errors']}")
+
+        # Refresh the statistics page snapshot with the new components
+        if self.stats['components_added'] or self.stats.get('components_updated'):
+            try:
+                snapshot = rebuild_statistics_snapshot()
+                self.stdout.write(f"  Rebuilt statistics snapshot v{snapshot.version}")
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Error rebuilding statistics snapshot: {e}"))
     
     def load_checkpoint(self):
         """Load the most recent checkpoint if available."""
@@ -91,6 +134,8 @@ class Command(BaseCommand):
                 # Restore state from checkpoint
                 self.stats = checkpoint.get('stats', self.stats)
                 self.offset = checkpoint.get('offset', self.offset)
+                # Only written by concurrent crawls; a serial resume just redoes those pages
+                self.completed_offsets = checkpoint.get('completed_offsets', [])
                 
                 # Mark as resumed for ETA calculation
                 self.stats['resumed_at'] = time.time()
@@ -114,9 +159,15 @@ class Command(BaseCommand):
                 'offset': self.stats['last_offset'],
                 'timestamp': time.time()
             }
+            if self.workers > 0:
+                checkpoint['completed_offsets'] = sorted(self.completed_offsets)
+                checkpoint['workers'] = dict(self.worker_pages)
             
-            with open(self.checkpoint_file, 'w') as f:
+            # Write then rename, so an interrupted save can't leave a truncated checkpoint
+            temp_file = f"{self.checkpoint_file}.tmp"
+            with open(temp_file, 'w') as f:
                 json.dump(checkpoint, f, indent=2)
+            os.replace(temp_file, self.checkpoint_file)
                 
             self.stdout.write(f"Saved checkpoint at offset {self.stats['last_offset']}")
         except Exception as e:
@@ -124,8 +175,8 @@ class Command(BaseCommand):
     
     def get_total_cmus(self):
         """Get total number of CMUs available."""
-        cmu_api_url = "https://api.neso.energy/api/3/action/datastore_search"
-        cmu_resource_id = "25a5fa2e-873d-41c5-8aaf-fbc2b06d79e6"
+        cmu_api_url = self.api_url
+        cmu_resource_id = CMU_RESOURCE_ID
         
         try:
             # Make a request with limit=0 to get total
@@ -153,8 +204,8 @@ class Command(BaseCommand):
     def crawl_all_cmus(self):
         """Crawl all CMU IDs from the API with a simple spinner animation."""
         # CMU API endpoint
-        cmu_api_url = "https://api.neso.energy/api/3/action/datastore_search"
-        cmu_resource_id = "25a5fa2e-873d-41c5-8aaf-fbc2b06d79e6"
+        cmu_api_url = self.api_url
+        cmu_resource_id = CMU_RESOURCE_ID
         
         # Process CMUs in batches
         continue_crawl = True
@@ -223,9 +274,7 @@ class Command(BaseCommand):
                         cmu_id = record.get("CMU ID")
                         if cmu_id:
                             # Prepare data for update_or_create for CMURegistry
-                            cmus_to_update_or_create.append(
-                                CMURegistry(cmu_id=cmu_id, raw_data=record)
-                            )
+                            cmus_to_update_or_create.append((cmu_id, record))
                             
                             # --- Original component processing logic --- 
                             self.stats['last_cmu_id'] = cmu_id
@@ -239,22 +288,7 @@ class Command(BaseCommand):
                     
                     # Bulk update or create CMURegistry entries for the batch
                     if cmus_to_update_or_create:
-                        try:
-                            # Note: Django's bulk_update_or_create requires Django 4.1+
-                            # Using a loop with update_or_create for broader compatibility,
-                            # though less efficient than bulk operations.
-                            # If using Django 4.1+, consider:
-                            # CMURegistry.objects.bulk_update_or_create(cmus_to_update_or_create, ['raw_data'], match_field='cmu_id')
-                            with transaction.atomic():
-                                for cmu_obj in cmus_to_update_or_create:
-                                    CMURegistry.objects.update_or_create(
-                                        cmu_id=cmu_obj.cmu_id,
-                                        defaults={'raw_data': cmu_obj.raw_data}
-                                    )
-                            self.stdout.write(f"\nUpdated/Created {len(cmus_to_update_or_create)} CMU registry entries for batch.", ending='')
-                        except Exception as bulk_err:
-                            self.stderr.write(f"\nError updating/creating CMURegistry entries: {bulk_err}")
-                            # Optionally log this error without stopping the crawl
+                        self.save_registry_entries(cmus_to_update_or_create)
 
                     if not continue_crawl:
                         break # Exit outer loop (while continue_crawl)
@@ -289,11 +323,197 @@ class Command(BaseCommand):
         self.stats['last_offset'] = current_offset
         self.save_checkpoint(forced=True)
     
+    def save_registry_entries(self, cmus):
+        """Create or update CMURegistry rows for a batch of (cmu_id, raw_data) pairs."""
+        try:
+            count = upsert_cmu_registry(cmus)
+            self.stdout.write(f"\nUpdated/Created {count} CMU registry entries for batch.", ending='')
+        except Exception as bulk_err:
+            self.stderr.write(f"\nError updating/creating CMURegistry entries: {bulk_err}")
+            # Optionally log this error without stopping the crawl
+
+    def crawl_all_cmus_concurrent(self):
+        """
+        Concurrent crawl: worker threads fetch CMU pages and each CMU's components through
+        one rate-limited DatastoreClient, and this thread saves the results, so every
+        database write stays on one connection. Pages finish out of order, so the
+        checkpoint 'offset' is the lowest page not yet saved (what a serial --resume
+        expects); pages saved beyond it are listed in 'completed_offsets' and skipped by a
+        concurrent --resume, and 'workers' shows the page each worker is on. A page where
+        any CMU's component fetch failed is never marked complete, so --resume retries it.
+        """
+        client = DatastoreClient(
+            self.api_url,
+            rate=self.rate,
+            burst=self.burst,
+            max_in_flight=self.max_in_flight,
+            retries=self.retries,
+        )
+        total = self.stats['total_cmus']
+        if not total:
+            self.stderr.write("Could not determine the number of CMUs; nothing to crawl.")
+            return
+
+        # CMUs that already have components are skipped without a request, as in the serial crawl
+        known_cmu_ids = frozenset() if self.force_update else frozenset(
+            Component.objects.values_list('cmu_id', flat=True).distinct()
+        )
+        all_offsets = list(range(self.offset, total, self.batch_size))
+        completed = set(self.completed_offsets)
+        pending = iter([offset for offset in all_offsets if offset not in completed])
+        pages_lock = threading.Lock()
+        stop = False
+
+        def fetch_page(offset):
+            worker = threading.current_thread().name
+            with pages_lock:
+                self.worker_pages[worker] = offset
+            try:
+                page = client.cmu_page(offset, self.batch_size, self.company_filter)
+                results = []
+                for record in page.get('records', []):
+                    cmu_id = record.get("CMU ID")
+                    if not cmu_id:
+                        continue
+                    if cmu_id in known_cmu_ids:
+                        results.append((cmu_id, record, None))
+                        continue
+                    try:
+                        results.append((cmu_id, record, client.components_for_cmu(cmu_id)))
+                    except CrawlError as e:
+                        results.append((cmu_id, record, e))
+                return results
+            finally:
+                with pages_lock:
+                    self.worker_pages.pop(worker, None)
+
+        self.stdout.write(
+            f"\nStarting concurrent crawl from offset {self.offset}: {len(all_offsets) - len(completed)} pages, "
+            f"{self.workers} workers, {self.rate or 'unlimited'} requests/s, {self.max_in_flight} in flight"
+        )
+        start_time = time.time()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawl') as executor:
+            def submit_next():
+                offset = next(pending, None)
+                if offset is not None:
+                    in_flight[executor.submit(fetch_page, offset)] = offset
+
+            # Keep a page queued per worker so none idles while this thread saves
+            for _ in range(self.workers * 2):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offset = in_flight.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # Left out of completed_offsets, so --resume fetches the page again
+                        self.stderr.write(f"\nError fetching CMU page at offset {offset}: {e}")
+                        self.stats['errors'] = self.stats.get('errors', 0) + 1
+                    else:
+                        complete, failed_cmu_ids = self._save_page(results)
+                        if failed_cmu_ids:
+                            # Left out of completed_offsets, so --resume fetches the page again
+                            self.stderr.write(
+                                f"\nComponent fetch or save failed for {len(failed_cmu_ids)} CMUs on the page at offset "
+                                f"{offset}: {', '.join(failed_cmu_ids)}"
+                            )
+                        elif complete:
+                            completed.add(offset)
+                        if not complete:
+                            stop = True
+
+                    # Checkpoint: everything below the first unsaved page is done
+                    next_offset = next((o for o in all_offsets if o not in completed), total)
+                    self.completed_offsets = [o for o in completed if o > next_offset]
+                    self.stats['last_offset'] = next_offset
+                    self.stats['batches_processed'] = self.stats.get('batches_processed', 0) + 1
+                    self.save_checkpoint()
+
+                    elapsed_time = time.time() - start_time
+                    self.stdout.write(
+                        f"\rPages: {len(completed)}/{len(all_offsets)} | CMUs: {self.stats['cmu_ids_processed']} | "
+                        f"Components: {self.stats['components_found']} found, {self.stats['components_added']} added, "
+                        f"{self.stats.get('components_skipped', 0)} skipped | "
+                        f"{client.stats['requests'] / elapsed_time if elapsed_time else 0:.1f} req/s",
+                        ending=''
+                    )
+                    self.stdout.flush()
+
+                    if stop:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        in_flight = {f: o for f, o in in_flight.items() if not f.cancelled()}
+                    else:
+                        submit_next()
+
+        self.stdout.write("\nCrawl completed!")
+        self.stdout.write(
+            f"Final stats: {self.stats['components_found']} components found, "
+            f"{self.stats['components_added']} added, "
+            f"{self.stats.get('components_skipped', 0)} skipped, "
+            f"{self.stats.get('errors', 0)} errors"
+        )
+        self.stdout.write(
+            f"API: {client.stats['requests']} requests, {client.stats['retries']} retries, "
+            f"{client.stats['failures']} failures, {client.stats['throttled_seconds']:.1f}s waiting on the rate limit"
+        )
+        self.worker_pages = {}
+        self.save_checkpoint(forced=True)
+
+    def _save_page(self, results):
+        """
+        Save one fetched page of (cmu_id, record, components) on this thread. components is
+        None for CMUs skipped as already present, or the CrawlError that stopped their fetch.
+        Returns (complete, failed_cmu_ids): complete is False if --limit was reached part
+        way, and failed_cmu_ids are the CMUs whose fetch or save failed, so the page has to
+        be crawled again.
+        """
+        registry_entries = []
+        component_records = []
+        company_names = {}
+        failed_cmu_ids = []
+        complete = True
+        for cmu_id, record, components in results:
+            if self.limit > 0 and self.stats['cmu_ids_processed'] >= self.limit:
+                self.stdout.write(f"\nReached limit of {self.limit} CMU IDs. Stopping crawl.")
+                complete = False
+                break
+
+            if isinstance(components, Exception):
+                failed_cmu_ids.append(cmu_id)
+                self.stats['errors'] = self.stats.get('errors', 0) + 1
+                continue
+
+            self.stats['cmu_ids_processed'] = self.stats.get('cmu_ids_processed', 0) + 1
+            self.stats['last_cmu_id'] = cmu_id
+            registry_entries.append((cmu_id, record))
+
+            if components is None:
+                db_count = Component.objects.filter(cmu_id=cmu_id).count()
+                self.stats['components_skipped'] = self.stats.get('components_skipped', 0) + db_count
+            else:
+                self.stats['components_found'] = self.stats.get('components_found', 0) + len(components)
+                if components:
+                    self.stats['cmu_ids_with_components'] = self.stats.get('cmu_ids_with_components', 0) + 1
+                    company_names[cmu_id] = record.get("Name of Applicant") or record.get("Parent Company")
+                    component_records.extend((cmu_id, component) for component in components)
+
+        # One set of bulk writes for the whole page
+        if component_records and not self.save_component_batch(component_records, company_names):
+            # Nothing from the page reached the database, so it has to be crawled again
+            failed_cmu_ids.extend(company_names)
+        if registry_entries:
+            self.save_registry_entries(registry_entries)
+        return complete, failed_cmu_ids
+
     def crawl_single_cmu(self, cmu_id, cmu_record=None):
         """Crawl components for a single CMU ID (silent version)."""
         # Components API endpoint
-        component_api_url = "https://api.neso.energy/api/3/action/datastore_search"
-        component_resource_id = "790f5fa0-f8eb-4d82-b98d-0d34d3e404e8"
+        component_api_url = self.api_url
+        component_resource_id = COMPONENT_RESOURCE_ID
         
         self.stats['cmu_ids_processed'] = self.stats.get('cmu_ids_processed', 0) + 1
         
@@ -338,65 +558,22 @@ class Command(BaseCommand):
             
     def save_components_to_db(self, cmu_id, component_records, company_name):
         """Save component records to the database (silent version)."""
-        # Use a transaction for better performance and atomicity
-        with transaction.atomic():
-            components_added = 0
-            components_skipped = 0
-            
-            for component in component_records:
-                # Get component ID if available
-                component_id = component.get("_id", "")
-                
-                # Skip if we already have this component in the database
-                if component_id and Component.objects.filter(component_id=component_id).exists():
-                    components_skipped += 1
-                    continue
-                
-                try:
-                    # Extract standard fields
-                    location = component.get("Location and Post Code", "")
-                    description = component.get("Description of CMU Components", "")
-                    technology = component.get("Generating Technology Class", "")
-                    auction_name = component.get("Auction Name", "")
-                    delivery_year = component.get("Delivery Year", "")
-                    status = component.get("Status", "")
-                    type_value = component.get("Type", "")
-                    
-                    # Use company name from component if available, otherwise use CMU record
-                    comp_company = component.get("Company Name", "")
-                    if comp_company:
-                        company_name = comp_company
-                    
-                    # --- Calculate derated_capacity_mw --- 
-                    derated_capacity_mw = None
-                    capacity_str = component.get("De-Rated Capacity")
-                    if capacity_str is not None:
-                        try:
-                            derated_capacity_mw = float(capacity_str)
-                        except (ValueError, TypeError):
-                            pass # Keep as None if conversion fails
-                    # --- End calculation ---
-                    
-                    # Create new component in database
-                    Component.objects.create(
-                        component_id=component_id,
-                        cmu_id=cmu_id,
-                        location=location,
-                        description=description,
-                        technology=technology,
-                        company_name=company_name,
-                        auction_name=auction_name,
-                        delivery_year=delivery_year,
-                        status=status,
-                        type=type_value,
-                        additional_data=component,  # Store all data as JSON
-                        derated_capacity_mw=derated_capacity_mw # Set the new field
-                    )
-                    components_added += 1
-                    
-                except Exception as e:
-                    self.stats['errors'] = self.stats.get('errors', 0) + 1
-            
-            # Update global statistics safely
-            self.stats['components_added'] = self.stats.get('components_added', 0) + components_added
-            self.stats['components_skipped'] = self.stats.get('components_skipped', 0) + components_skipped
\ No newline at end of file
+        self.save_component_batch([(cmu_id, record) for record in component_records], {cmu_id: company_name})
+
+    def save_component_batch(self, records, company_names):
+        """
+        Save (cmu_id, record) pairs in set-based batches (services/bulk_ingest.py).
+        Components already stored are skipped, or refreshed from the API with --force.
+        Returns False if the write failed.
+        """
+        try:
+            result = ingest_components(records, company_names=company_names, update_existing=self.force_update)
+        except Exception as e:
+            self.stats['errors'] = self.stats.get('errors', 0) + 1
+            self.stderr.write(f"\nError saving components: {e}")
+            return False
+        self.stats['components_added'] = self.stats.get('components_added', 0) + result['added']
+        self.stats['components_updated'] = self.stats.get('components_updated', 0) + result['updated']
+        self.stats['components_skipped'] = self.stats.get('components_skipped', 0) + result['skipped']
+        self.stats['errors'] = self.stats.get('errors', 0) + result['errors']
+        return True
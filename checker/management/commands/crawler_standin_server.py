@@ -0,0 +1,211 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.models import CMURegistry, Component
+from checker.services.crawler import CMU_RESOURCE_ID, COMPONENT_RESOURCE_ID
+
+# Synthetic record _ids start here, far above the datastore's own (which count up from 1),
+# so crawling them can never overwrite a real component
+SYNTHETIC_ID_START = 1_000_000_000
+
+
+class DatastoreStandIn:
+    """In-memory stand-in for the CKAN datastore_search action (the two resources the crawlers read)."""
+
+    def __init__(self, cmu_records, component_records, latency=0.0, error_rate=0.0, rate_limit=0.0, seed=None):
+        self.resources = {CMU_RESOURCE_ID: cmu_records, COMPONENT_RESOURCE_ID: component_records}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.stats = {"requests": 0, "errors_injected": 0, "throttled": 0}
+
+    def _throttled(self):
+        """Fixed one-second window: more than rate_limit requests in it get a 429."""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_requests = 0
+            self.window_requests += 1
+            return self.window_requests > self.rate_limit
+
+    def handle(self, params):
+        """(status, headers, body dict) for a datastore_search query string dict."""
+        with self.lock:
+            self.stats["requests"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._throttled():
+            with self.lock:
+                self.stats["throttled"] += 1
+            return 429, {"Retry-After": "1"}, {"success": False, "error": {"message": "Rate limit exceeded"}}
+        with self.lock:
+            inject_error = self.random.random() < self.error_rate
+            if inject_error:
+                self.stats["errors_injected"] += 1
+        if inject_error:
+            return 503, {}, {"success": False, "error": {"message": "Injected failure"}}
+
+        records = self.resources.get(params.get("resource_id"))
+        if records is None:
+            return 404, {}, {"success": False, "error": {"message": "Resource not found"}}
+
+        query = (params.get("q") or "").lower()
+        if query:
+            # datastore_search q is a full-text match over every field
+            records = [r for r in records if any(query in str(value).lower() for value in r.values())]
+        sort = (params.get("sort") or "").split()
+        if sort:
+            # "<field> [asc|desc]", as used with _id by delta_sync
+            records = sorted(
+                records,
+                key=lambda r: (r.get(sort[0]) is None, r.get(sort[0])),
+                reverse=len(sort) > 1 and sort[1].lower() == "desc",
+            )
+        try:
+            offset = int(params.get("offset") or 0)
+            limit = int(params.get("limit") or 100)
+        except ValueError:
+            return 409, {}, {"success": False, "error": {"message": "Invalid offset/limit"}}
+        return 200, {}, {
+            "success": True,
+            "result": {
+                "resource_id": params.get("resource_id"),
+                "records": records[offset:offset + limit] if limit else [],
+                "total": len(records),
+                "offset": offset,
+                "limit": limit,
+            },
+        }
+
+
+def _handler_for(standin, verbose):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.rstrip('/').endswith('datastore_search'):
+                status, headers, body = 404, {}, {"success": False, "error": {"message": "Not found"}}
+            else:
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, headers, body = standin.handle(params)
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the NESO datastore_search API, for testing crawl_to_database and delta_sync '
+        '(e.g. --api-url http://127.0.0.1:8765/api/3/action/datastore_search) without touching the real API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Serve this many generated CMUs (1-3 components each) instead of the database contents')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fraction of requests answered with a 503 (exercises retries)')
+        parser.add_argument('--rate-limit', type=float, default=0.0,
+                            help='Requests per second before answering 429 with Retry-After (0 = none)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for data and injected errors')
+        parser.add_argument('--allow-existing-data', action='store_true',
+                            help='Serve --synthetic data even though the Component table is not empty')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] < 1:
+            raise CommandError('--error-rate must be in [0, 1)')
+
+        if options['synthetic'] and not options['allow_existing_data'] and Component.objects.exists():
+            raise CommandError(
+                'The Component table is not empty; crawling synthetic records would mix them into real data. '
+                'Use an empty database, or pass --allow-existing-data'
+            )
+
+        if options['synthetic']:
+            cmu_records, component_records = self.synthetic_records(options['synthetic'], options['seed'])
+        else:
+            cmu_records, component_records = self.database_records()
+
+        standin = DatastoreStandIn(
+            cmu_records,
+            component_records,
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+            seed=options['seed'],
+        )
+        server = ThreadingHTTPServer((options['host'], options['port']), _handler_for(standin, options['verbose']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving {len(cmu_records)} CMUs / {len(component_records)} components at "
+            f"http://{options['host']}:{server.server_port}/api/3/action/datastore_search (Ctrl+C to stop)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stand-in stats: {standin.stats}")
+
+    def database_records(self):
+        """CMU and component records as stored from earlier crawls."""
+        cmu_records = [
+            {"CMU ID": cmu_id, **(raw_data or {})}
+            for cmu_id, raw_data in CMURegistry.objects.order_by('cmu_id').values_list('cmu_id', 'raw_data')
+        ]
+        component_records = [
+            {"CMU ID": cmu_id, **(additional_data or {})}
+            for cmu_id, additional_data in Component.objects.order_by('id').values_list('cmu_id', 'additional_data')
+        ]
+        return cmu_records, component_records
+
+    def synthetic_records(self, count, seed):
+        """Generated CMU and component records, with _ids from SYNTHETIC_ID_START."""
+        rng = random.Random(seed)
+        technologies = ['Combined Heat and Power (CHP)', 'DSR', 'Battery Storage', 'Reciprocating engines']
+        cmu_records, component_records = [], []
+        for index in range(count):
+            cmu_id = f"STANDIN{index:05d}"
+            company = f"Stand-in Energy {index % 25} Ltd"
+            cmu_records.append({"_id": SYNTHETIC_ID_START + index, "CMU ID": cmu_id, "Name of Applicant": company})
+            for component_index in range(rng.randint(1, 3)):
+                component_records.append({
+                    "_id": SYNTHETIC_ID_START + len(component_records),
+                    "CMU ID": cmu_id,
+                    "Company Name": company,
+                    "Location and Post Code": f"Site {component_index}, Standin Road, AB{index % 50} {rng.randint(1, 9)}XY",
+                    "Description of CMU Components": f"Stand-in component {component_index}",
+                    "Generating Technology Class": rng.choice(technologies),
+                    "Auction Name": "2026-27 (T-4) Four Year Ahead Capacity Auction",
+                    "Delivery Year": "2026",
+                    "Status": "Awarded",
+                    "Type": "New Build",
+                    "De-Rated Capacity": f"{rng.uniform(0.1, 50):.3f}",
+                })
+        return cmu_records, component_records
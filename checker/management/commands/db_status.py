@@ -1,17 +1,15 @@
-import os
-import json
 import time
-import glob
 from django.core.management.base import BaseCommand
 from django.db import connection
 from django.db.models import Count
 from ...models import Component
+from ...services.component_store import get_component_store
 
 class Command(BaseCommand):
     help = 'Show database status and statistics'
 
     def add_arguments(self, parser):
-        parser.add_argument('--json-stats', action='store_true', help='Show JSON file statistics for comparison')
+        parser.add_argument('--json-stats', action='store_true', help='Show JSON component store statistics for comparison')
         parser.add_argument('--top', type=int, default=10, help='Number of top companies to show')
         parser.add_argument('--benchmark', action='store_true', help='Run query performance benchmarks')
 
@@ -104,66 +102,41 @@ class Command(BaseCommand):
         # Show JSON statistics if requested
         if show_json_stats:
             self.stdout.write("\n" + "=" * 50)
-            self.stdout.write(self.style.SUCCESS("JSON File Statistics (for comparison)"))
+            self.stdout.write(self.style.SUCCESS("JSON Component Store Statistics (for comparison)"))
             self.stdout.write("=" * 50)
             
             try:
-                json_dir = os.path.join(settings.BASE_DIR, 'json_data')
-                if not os.path.exists(json_dir):
-                    self.stdout.write(self.style.WARNING(f"JSON directory not found: {json_dir}"))
+                store = get_component_store()
+                store_stats = store.stats()
+                if not store_stats['cmu_ids']:
+                    self.stdout.write(self.style.WARNING(f"Component store is empty: {store.directory}"))
                     return
                 
-                # Get list of JSON files
-                json_pattern = os.path.join(json_dir, 'components_*.json')
-                json_files = glob.glob(json_pattern)
-                
-                total_size = 0
-                total_cmu_ids = 0
-                total_components = 0
+                total_size = store_stats['segment_bytes']
+                total_cmu_ids = store_stats['cmu_ids']
+                total_components = store_stats['components']
                 companies = {}
                 technologies = {}
                 
-                self.stdout.write(f"Found {len(json_files)} JSON files")
+                self.stdout.write(f"Found {store_stats['segments']} component store segments")
                 
-                for json_file in json_files:
-                    try:
-                        # Get file size
-                        file_size = os.path.getsize(json_file)
-                        total_size += file_size
-                        
-                        # Load and parse JSON
-                        with open(json_file, 'r') as f:
-                            json_data = json.load(f)
-                            
-                        # Count CMU IDs and components
-                        cmu_count = len(json_data)
-                        total_cmu_ids += cmu_count
-                        
-                        comp_count = 0
-                        for cmu_id, components in json_data.items():
-                            comp_count += len(components)
-                            
-                            # Count companies
-                            company_name = None
-                            for comp in components:
-                                if isinstance(comp, dict) and "Company Name" in comp:
-                                    company_name = comp["Company Name"]
-                                    break
-                                    
-                            if company_name:
-                                companies[company_name] = companies.get(company_name, 0) + len(components)
-                                
-                            # Count technologies
-                            for comp in components:
-                                if isinstance(comp, dict) and "Generating Technology Class" in comp:
-                                    tech = comp["Generating Technology Class"]
-                                    if tech:
-                                        technologies[tech] = technologies.get(tech, 0) + 1
+                for cmu_id, components in store.items():
+                    # Count companies
+                    company_name = None
+                    for comp in components:
+                        if isinstance(comp, dict) and "Company Name" in comp:
+                            company_name = comp["Company Name"]
+                            break
                             
-                        total_components += comp_count
+                    if company_name:
+                        companies[company_name] = companies.get(company_name, 0) + len(components)
                         
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f"Error processing {json_file}: {e}"))
+                    # Count technologies
+                    for comp in components:
+                        if isinstance(comp, dict) and "Generating Technology Class" in comp:
+                            tech = comp["Generating Technology Class"]
+                            if tech:
+                                technologies[tech] = technologies.get(tech, 0) + 1
                 
                 # Display statistics
                 if total_size > 1024 * 1024 * 1024:
@@ -0,0 +1,124 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.models import SyncWatermark
+from checker.services.crawler import DATASTORE_SEARCH_URL, CrawlError, DatastoreClient
+from checker.services.delta_sync import (
+    MAX_DELETE_FRACTION,
+    SYNC_PAGE_SIZE,
+    sync_cmu_registry,
+    sync_components,
+)
+from checker.services.statistics_snapshot import rebuild_statistics_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Incrementally sync the CMU registry and components with the NESO datastore: only new, '
+        'changed and removed records are written (see services/delta_sync.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resource', choices=['all', 'cmus', 'components'], default='all',
+                            help='Which datastore resource(s) to sync')
+        parser.add_argument('--new-only', action='store_true',
+                            help='Only fetch records appended since the last sync (no updates or deletes)')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+        parser.add_argument('--no-deletes', action='store_true', help='Never delete rows missing from the API')
+        parser.add_argument('--allow-mass-delete', action='store_true',
+                            help='Delete even when more than --max-delete-fraction of a table would go')
+        parser.add_argument('--max-delete-fraction', type=float, default=MAX_DELETE_FRACTION,
+                            help='Share of a table above which deletes are held back')
+        parser.add_argument('--page-size', type=int, default=SYNC_PAGE_SIZE, help='Records per API request')
+        parser.add_argument('--rate', type=float, default=5.0, help='API requests per second (0 = unlimited)')
+        parser.add_argument('--retries', type=int, default=4, help='Retries per request on timeouts, 429 and 5xx')
+        parser.add_argument('--timeout', type=int, default=60, help='Seconds per API request')
+        parser.add_argument('--api-url', type=str, default=DATASTORE_SEARCH_URL,
+                            help='datastore_search endpoint (e.g. a local crawler_standin_server)')
+        parser.add_argument('--status', action='store_true', help='Show the stored watermarks and exit')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+
+        client = DatastoreClient(
+            options['api_url'],
+            rate=options['rate'],
+            max_in_flight=1,
+            retries=options['retries'],
+            timeout=options['timeout'],
+        )
+        sync_options = {
+            'new_only': options['new_only'],
+            'page_size': options['page_size'],
+            'dry_run': options['dry_run'],
+            'allow_deletes': not options['no_deletes'],
+            'allow_mass_delete': options['allow_mass_delete'],
+            'max_delete_fraction': options['max_delete_fraction'],
+            'progress': self.show_progress,
+        }
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("DRY RUN - no changes will be written"))
+
+        start_time = time.time()
+        summaries = []
+        applicants = {}
+        try:
+            if options['resource'] in ('all', 'cmus'):
+                self.stdout.write("Syncing CMU registry...")
+                summary, applicants = sync_cmu_registry(client, **sync_options)
+                summaries.append(('CMU registry', summary))
+            if options['resource'] in ('all', 'components'):
+                self.stdout.write("\nSyncing components...")
+                summaries.append(('Components', sync_components(client, applicants=applicants, **sync_options)))
+        except CrawlError as e:
+            raise CommandError(f"Sync stopped: {e}")
+
+        self.stdout.write("")
+        for label, summary in summaries:
+            self.stdout.write(self.style.SUCCESS(
+                f"{label} ({summary['mode']}{', complete' if summary['complete'] else ', partial'}): "
+                f"{summary['fetched']} fetched, {summary['inserted']} new, {summary['updated']} changed, "
+                f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, "
+                f"{summary['errors']} errors in {summary['seconds']}s"
+            ))
+            if summary['deletes_held_back']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {summary['deletes_held_back']} rows missing from the API were not deleted "
+                    f"(incomplete scan, or over --max-delete-fraction; see --allow-mass-delete)"
+                ))
+        stats = client.stats
+        self.stdout.write(
+            f"API: {stats['requests']} requests, {stats['retries']} retries | "
+            f"total {time.time() - start_time:.1f}s"
+        )
+
+        component_changes = [
+            s for label, s in summaries if label == 'Components' and (s['inserted'] or s['updated'] or s['deleted'])
+        ]
+        if component_changes and not options['dry_run']:
+            snapshot = rebuild_statistics_snapshot()
+            self.stdout.write(f"Rebuilt statistics snapshot v{snapshot.version}")
+
+    def show_progress(self, summary):
+        self.stdout.write(
+            f"\r  {summary['fetched']} records | {summary['inserted']} new, {summary['updated']} changed, "
+            f"{summary['unchanged']} unchanged",
+            ending='',
+        )
+        self.stdout.flush()
+
+    def show_status(self):
+        watermarks = SyncWatermark.objects.order_by('resource_id')
+        if not watermarks:
+            self.stdout.write("No delta sync has run yet.")
+        for watermark in watermarks:
+            summary = watermark.last_summary or {}
+            self.stdout.write(
+                f"{watermark.resource_id}: _id <= {watermark.max_record_id} ({watermark.record_count} records), "
+                f"last sync {watermark.last_synced_at}, last full sync {watermark.last_full_sync_at}, "
+                f"last run: {summary.get('inserted', 0)} new, {summary.get('updated', 0)} changed, "
+                f"{summary.get('deleted', 0)} deleted"
+            )
@@ -7,7 +7,10 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 
 class Command(BaseCommand):
-    help = 'Detect and optionally clean duplicate component records'
+    help = (
+        'Detect and optionally clean duplicate component records in the legacy json_data/components_*.json '
+        'shards (run `compact_component_store --export-shards` first to include the component store)'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--clean', action='store_true', help='Remove duplicates from JSON files')
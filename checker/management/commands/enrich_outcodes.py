@@ -0,0 +1,108 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from checker.models import Outcode
+from checker.services.outcode_data import (
+    SAMPLES_PER_OUTCODE,
+    enrich_outcodes,
+    locations_in_components,
+    outcodes_from_locations,
+    postcodes_in_components,
+    save_outcodes,
+    write_outcodes_csv,
+)
+from checker.services.postcode_helpers import POSTCODES_IO_TIMEOUT, split_postcode
+
+
+class Command(BaseCommand):
+    help = (
+        'Resolve the outcodes found in component locations (or given with --outcode) through '
+        'postcodes.io bulk lookups and store them in the outcode table. Run offline, not per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outcode', action='append', default=[],
+                            help='Outcode to resolve (repeatable); default: every outcode in component locations')
+        parser.add_argument('--all', action='store_true',
+                            help='Re-resolve outcodes already in the table (default: only missing ones)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent requests (default: 4)')
+        parser.add_argument('--timeout', type=float, default=POSTCODES_IO_TIMEOUT,
+                            help=f'Seconds per request (default: {POSTCODES_IO_TIMEOUT})')
+        parser.add_argument('--export', type=str, metavar='PATH',
+                            help='Also write the whole outcode table to PATH as CSV afterwards')
+        parser.add_argument('--dry-run', action='store_true', help='Resolve but do not save')
+        parser.add_argument('--offline', action='store_true',
+                            help='Build the rows from component locations and OS grid references instead of '
+                                 'postcodes.io (how the bundled data_storage/outcodes.csv is made)')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+
+        if options['offline']:
+            self.handle_offline(options, start_time)
+            return
+
+        samples = postcodes_in_components()
+        if options['outcode']:
+            wanted = {split_postcode(outcode)[0] for outcode in options['outcode']} - {None}
+            samples = {outcode: samples.get(outcode, []) for outcode in wanted}
+        if not options['all']:
+            existing = set(Outcode.objects.filter(outcode__in=list(samples)).values_list('outcode', flat=True))
+            samples = {outcode: postcodes for outcode, postcodes in samples.items() if outcode not in existing}
+
+        if not samples:
+            self.stdout.write(self.style.SUCCESS('No outcodes to resolve'))
+            return
+        self.stdout.write(
+            f'Resolving {len(samples)} outcodes ({sum(len(p) for p in samples.values())} sample postcodes, '
+            f'up to {SAMPLES_PER_OUTCODE} each) with {options["workers"]} workers...'
+        )
+
+        def progress(done, total):
+            if done == total or done % 10 == 0:
+                self.stdout.write(f'  {done}/{total} requests')
+
+        rows, unresolved = enrich_outcodes(
+            samples, workers=options['workers'], timeout=options['timeout'], progress=progress
+        )
+        if unresolved:
+            self.stdout.write(self.style.WARNING(
+                f'{len(unresolved)} outcodes unresolved: {", ".join(unresolved[:20])}'
+                f'{" ..." if len(unresolved) > 20 else ""}'
+            ))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {len(rows)} outcodes resolved, nothing saved'))
+            return
+
+        save_outcodes(rows)
+        if options['export']:
+            count = write_outcodes_csv(options['export'])
+            self.stdout.write(f'Exported {count} outcodes to {options["export"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {len(rows)} outcodes in {time.time() - start_time:.2f}s'
+        ))
+
+    def handle_offline(self, options, start_time):
+        rows = outcodes_from_locations(locations_in_components())
+        if options['outcode']:
+            wanted = {split_postcode(outcode)[0] for outcode in options['outcode']} - {None}
+            rows = [row for row in rows if row['outcode'] in wanted]
+        if not options['all']:
+            existing = set(Outcode.objects.values_list('outcode', flat=True))
+            rows = [row for row in rows if row['outcode'] not in existing]
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {len(rows)} outcodes built, nothing saved'))
+            return
+
+        save_outcodes(rows)
+        if options['export']:
+            count = write_outcodes_csv(options['export'])
+            self.stdout.write(f'Exported {count} outcodes to {options["export"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved {len(rows)} outcodes built from component data in {time.time() - start_time:.2f}s'
+        ))
@@ -3,6 +3,7 @@ import requests
 import time
 from django.conf import settings
 from checker.models import Component
+from checker.services.data_version import bump_data_version
 
 class Command(BaseCommand):
     help = 'Geocode component locations using Google Maps API'
@@ -83,6 +84,10 @@ class Command(BaseCommand):
                 errors += 1
                 
             processed += 1
+
+        # The map endpoints serve the new coordinates from here on (new ETag)
+        if success:
+            bump_data_version()
                 
         self.stdout.write(self.style.SUCCESS(
             f'Geocoding completed: {processed} processed, {success} successful, {errors} errors'
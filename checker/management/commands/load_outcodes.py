@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.services.outcode_data import OUTCODE_CSV_PATH, read_outcodes_csv, save_outcodes, write_outcodes_csv
+
+
+class Command(BaseCommand):
+    help = 'Load the outcode -> admin district / region table used by the postcode helpers from a CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default=OUTCODE_CSV_PATH,
+                            help=f'Outcode CSV to load (default: {OUTCODE_CSV_PATH})')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete outcodes that are not in the file')
+        parser.add_argument('--export', type=str, metavar='PATH',
+                            help='Write the current outcode table to PATH as CSV instead of loading')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+
+        if options['export']:
+            count = write_outcodes_csv(options['export'])
+            self.stdout.write(self.style.SUCCESS(f'Exported {count} outcodes to {options["export"]}'))
+            return
+
+        try:
+            rows = read_outcodes_csv(options['file'])
+        except FileNotFoundError:
+            raise CommandError(
+                f'{options["file"]} not found. Pass --file, or build the table from postcodes.io '
+                f'with `manage.py enrich_outcodes` (and export it with --export).'
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not rows:
+            raise CommandError(f'No outcodes found in {options["file"]}')
+
+        count = save_outcodes(rows, replace=options['replace'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {count} outcodes from {options["file"]} in {time.time() - start_time:.2f}s'
+        ))
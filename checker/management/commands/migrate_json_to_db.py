@@ -1,11 +1,37 @@
 import os
-import json
 import glob
+import queue
 import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.db import transaction
-from ...models import Component
+from django.db import connection, connections
+from ...services.capacity_totals import rebuild_capacity_totals
+from ...services.company_directory import refresh_company_directory
+from ...services.component_store import get_component_store
+from ...services.json_shards import ingest_pairs, ingest_shard
+from ...services.statistics_snapshot import rebuild_statistics_snapshot
+
+
+def _init_worker():
+    # Spawned (non-forked) workers start without Django set up
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _migrate_shard(json_file, batch_size, update_existing, dry_run, progress_queue):
+    """Worker process: stream one shard into the database, reporting each batch on progress_queue."""
+    def progress(file_stats):
+        progress_queue.put({k: v for k, v in file_stats.items() if k != 'companies'})
+
+    try:
+        return ingest_shard(json_file, batch_size, update_existing=update_existing, dry_run=dry_run, progress=progress)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = 'Migrate all component data from JSON files to the database'
@@ -13,9 +39,13 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--batch-size', type=int, default=500, help='Number of components to commit in each transaction')
         parser.add_argument('--file', type=str, help='Specific JSON file to migrate (defaults to all)')
-        parser.add_argument('--skip-existing', action='store_true', help='Skip components already in the database')
+        parser.add_argument('--skip-existing', action='store_true', help='Skip components already in the database (default: update them from the file)')
         parser.add_argument('--letter', type=str, help='Migrate only files starting with this letter (e.g., A)')
         parser.add_argument('--dry-run', action='store_true', help='Show what would be migrated without making changes')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Migrate this many shard files at once in separate processes (PostgreSQL only)')
+        parser.add_argument('--from-store', action='store_true',
+                            help='Migrate only the json_data/component_store entries, not the components_*.json shards')
 
     def handle(self, *args, **options):
         self.batch_size = options['batch_size']
@@ -23,6 +53,8 @@ class Command(BaseCommand):
         self.skip_existing = options['skip_existing']
         self.letter_filter = options['letter'].upper() if options['letter'] else None
         self.dry_run = options['dry_run']
+        self.workers = max(1, options['workers'])
+        self.from_store = options['from_store']
         
         self.stdout.write(self.style.SUCCESS(f"Starting JSON to database migration"))
         if self.dry_run:
@@ -36,7 +68,12 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"JSON directory not found: {json_dir}"))
             return
         
-        if self.specific_file:
+        # New crawls are saved to the component store, so it is migrated (after the older
+        # shards, so its entries win) unless --file/--letter pick particular shards
+        include_store = self.from_store or not (self.specific_file or self.letter_filter)
+        if self.from_store:
+            json_files = []
+        elif self.specific_file:
             if os.path.exists(os.path.join(json_dir, self.specific_file)):
                 json_files = [os.path.join(json_dir, self.specific_file)]
             else:
@@ -50,7 +87,10 @@ class Command(BaseCommand):
                 json_pattern = os.path.join(json_dir, 'components_*.json')
             json_files = glob.glob(json_pattern)
         
-        self.stdout.write(f"Found {len(json_files)} JSON files to process")
+        source_count = len(json_files) + (1 if include_store else 0)
+        self.stdout.write(
+            f"Found {len(json_files)} JSON files to process" + (" plus the component store" if include_store else "")
+        )
         
         # Statistics
         stats = {
@@ -58,30 +98,44 @@ class Command(BaseCommand):
             'cmu_ids_processed': 0,
             'components_found': 0,
             'components_added': 0,
+            'components_updated': 0,
             'components_skipped': 0,
             'errors': 0
         }
-        
+        companies_touched = set()
+
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; migrating with 1 worker"))
+            self.workers = 1
+
+        def migrate_sources():
+            if self.workers > 1 and json_files:
+                yield from self.migrate_parallel(json_files, start_time)
+            else:
+                for json_file in json_files:
+                    yield self.process_json_file(json_file)
+            if include_store:
+                yield self.process_store()
+
+        file_results = migrate_sources()
+
         # Process each file
-        for json_file in json_files:
-            file_stats = self.process_json_file(json_file)
-            
+        for file_stats in file_results:
             # Update overall stats
             stats['files_processed'] += 1
-            stats['cmu_ids_processed'] += file_stats['cmu_ids_processed']
-            stats['components_found'] += file_stats['components_found']
-            stats['components_added'] += file_stats['components_added']
-            stats['components_skipped'] += file_stats['components_skipped']
-            stats['errors'] += file_stats['errors']
+            for key in ('cmu_ids_processed', 'components_found', 'components_added',
+                        'components_updated', 'components_skipped', 'errors'):
+                stats[key] += file_stats[key]
+            companies_touched.update(file_stats.get('companies', ()))
             
             # Show progress
             elapsed = time.time() - start_time
-            progress = stats['files_processed'] / len(json_files) * 100
-            self.stdout.write(f"Progress: {progress:.1f}% - {stats['files_processed']}/{len(json_files)} files")
+            progress = stats['files_processed'] / source_count * 100
+            self.stdout.write(f"Progress: {progress:.1f}% - {stats['files_processed']}/{source_count} files")
             self.stdout.write(f"Components added so far: {stats['components_added']}")
             
-            rate = stats['components_added'] / elapsed if elapsed > 0 else 0
-            eta = (len(json_files) - stats['files_processed']) * (elapsed / stats['files_processed']) if stats['files_processed'] > 0 else 0
+            rate = stats['components_found'] / elapsed if elapsed > 0 else 0
+            eta = (source_count - stats['files_processed']) * (elapsed / stats['files_processed']) if stats['files_processed'] > 0 else 0
             
             # Format as minutes:seconds
             eta_minutes = int(eta // 60)
@@ -89,6 +143,17 @@ class Command(BaseCommand):
             eta_str = f"{eta_minutes:02d}:{eta_seconds:02d}"
             
             self.stdout.write(f"Processing rate: {rate:.1f} components/second | ETA: {eta_str}")
+
+        # Keep the company directory in step with the migrated components (once, after all workers)
+        if companies_touched and not self.dry_run:
+            refresh_company_directory(companies_touched)
+
+        # The existing-id prefetch and the upsert aren't atomic across workers: a component_id
+        # in two shards can be inserted by both and counted as added twice, so the incremental
+        # capacity totals are recomputed after a parallel run
+        if self.workers > 1 and json_files and not self.dry_run:
+            written = rebuild_capacity_totals()
+            self.stdout.write(f"Rebuilt capacity totals after the parallel run: {written}")
         
         # Print summary
         total_time = time.time() - start_time
@@ -103,118 +168,128 @@ class Command(BaseCommand):
 ║ CMU IDs processed:      {stats['cmu_ids_processed']}                     ║
 ║ Components found:       {stats['components_found']}                   ║
 ║ Components added:       {stats['components_added']}                   ║
+║ Components updated:     {stats['components_updated']}                   ║
 ║ Components skipped:     {stats['components_skipped']}                   ║
 ║ Errors encountered:     {stats['errors']}                       ║
 ╚══════════════════════════════════════════════════╝
 """
         
         self.stdout.write(self.style.SUCCESS(summary))
+
+        # Refresh the statistics page snapshot with the new components
+        if (stats['components_added'] or stats['components_updated']) and not self.dry_run:
+            snapshot = rebuild_statistics_snapshot()
+            self.stdout.write(f"Rebuilt statistics snapshot v{snapshot.version}")
         
         if self.dry_run:
             self.stdout.write(self.style.WARNING("DRY RUN COMPLETE - No changes were made to the database"))
             self.stdout.write(self.style.WARNING("Run again without --dry-run to perform the actual migration"))
     
+    def report_file(self, file_stats):
+        if file_stats.get('error'):
+            self.stdout.write(self.style.ERROR(f"Error processing {file_stats['file']}: {file_stats['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"  {file_stats['file']}: processed {file_stats['cmu_ids_processed']} CMU IDs with "
+            f"{file_stats['components_found']} components "
+            f"(added: {file_stats['components_added']}, updated: {file_stats['components_updated']}, "
+            f"skipped: {file_stats['components_skipped']})"
+        ))
+
     def process_json_file(self, json_file):
-        """Process a single JSON file."""
-        filename = os.path.basename(json_file)
-        self.stdout.write(f"Processing {filename}...")
-        
-        # Stats for this file
-        file_stats = {
-            'cmu_ids_processed': 0,
-            'components_found': 0,
-            'components_added': 0,
-            'components_skipped': 0,
-            'errors': 0
-        }
-        
-        try:
-            # Load JSON data
-            with open(json_file, 'r') as f:
-                all_components = json.load(f)
-            
-            self.stdout.write(f"  File contains {len(all_components)} CMU IDs")
-            
-            # Process in batches
-            current_batch = []
-            
-            for cmu_id, components in all_components.items():
-                file_stats['cmu_ids_processed'] += 1
-                
-                if not components:
-                    continue
-                
-                file_stats['components_found'] += len(components)
-                
-                # Process each component
-                for component in components:
-                    # Get component ID
-                    component_id = component.get("_id", "")
-                    
-                    # Skip if we would skip in the actual migration
-                    if self.skip_existing and component_id and Component.objects.filter(component_id=component_id).exists():
-                        file_stats['components_skipped'] += 1
-                        continue
-                    
-                    # Extract standard fields
-                    location = component.get("Location and Post Code", "")
-                    description = component.get("Description of CMU Components", "")
-                    technology = component.get("Generating Technology Class", "")
-                    company_name = component.get("Company Name", "")
-                    auction_name = component.get("Auction Name", "")
-                    delivery_year = component.get("Delivery Year", "")
-                    status = component.get("Status", "")
-                    type_value = component.get("Type", "")
-                    
-                    # Create the model instance but don't save it yet
-                    if not self.dry_run:
-                        component_obj = Component(
-                            component_id=component_id,
-                            cmu_id=cmu_id,
-                            location=location,
-                            description=description,
-                            technology=technology,
-                            company_name=company_name,
-                            auction_name=auction_name,
-                            delivery_year=delivery_year,
-                            status=status,
-                            type=type_value,
-                            additional_data=component
-                        )
-                        current_batch.append(component_obj)
-                    
-                    file_stats['components_added'] += 1
-                    
-                    # If batch is full, save to database
-                    if len(current_batch) >= self.batch_size:
-                        if not self.dry_run:
-                            with transaction.atomic():
-                                Component.objects.bulk_create(
-                                    current_batch, 
-                                    ignore_conflicts=self.skip_existing
-                                )
-                            self.stdout.write(f"  Saved batch of {len(current_batch)} components")
-                        current_batch = []
-            
-            # Save any remaining items in the batch
-            if current_batch and not self.dry_run:
-                with transaction.atomic():
-                    Component.objects.bulk_create(
-                        current_batch, 
-                        ignore_conflicts=self.skip_existing
-                    )
-                self.stdout.write(f"  Saved final batch of {len(current_batch)} components")
-            
-            self.stdout.write(self.style.SUCCESS(
-                f"  Processed {file_stats['cmu_ids_processed']} CMU IDs with "
-                f"{file_stats['components_found']} components "
-                f"(added: {file_stats['components_added']}, skipped: {file_stats['components_skipped']})"
-            ))
-            
-        except Exception as e:
-            import traceback
-            self.stdout.write(self.style.ERROR(f"Error processing {filename}: {str(e)}"))
-            self.stdout.write(traceback.format_exc())
-            file_stats['errors'] += 1
-        
-        return file_stats
\ No newline at end of file
+        """
+        Process a single JSON file, streaming it in --batch-size batches of components
+        (services/json_shards.py): existing components are skipped with --skip-existing
+        and updated from the file otherwise.
+        """
+        self.stdout.write(f"Processing {os.path.basename(json_file)}...")
+
+        def progress(file_stats):
+            self.stdout.write(f"  Saved batch {file_stats['batches']} ({file_stats['components_found']} components read)")
+
+        file_stats = ingest_shard(
+            json_file,
+            self.batch_size,
+            update_existing=not self.skip_existing,
+            dry_run=self.dry_run,
+            progress=progress,
+        )
+        self.report_file(file_stats)
+        return file_stats
+
+    def process_store(self):
+        """Stream the component store's entries into the database, like a shard file."""
+        store = get_component_store()
+        self.stdout.write(f"Processing the component store ({len(store)} CMU IDs)...")
+
+        def progress(file_stats):
+            self.stdout.write(f"  Saved batch {file_stats['batches']} ({file_stats['components_found']} components read)")
+
+        file_stats = ingest_pairs(
+            store.iter_components(),
+            'component_store',
+            self.batch_size,
+            update_existing=not self.skip_existing,
+            dry_run=self.dry_run,
+            progress=progress,
+        )
+        self.report_file(file_stats)
+        return file_stats
+
+    def migrate_parallel(self, json_files, start_time):
+        """
+        Stream shard files in --workers processes, yielding each file's stats as it
+        finishes and printing one merged progress line from the workers' batch reports.
+        """
+        self.stdout.write(f"Migrating with {self.workers} worker processes")
+        # Forked workers must open their own database connections, not share this one
+        connections.close_all()
+
+        with Manager() as manager, ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            progress_queue = manager.Queue()
+            pending = {
+                executor.submit(
+                    _migrate_shard, json_file, self.batch_size, not self.skip_existing, self.dry_run, progress_queue
+                ): json_file
+                for json_file in json_files
+            }
+            running = {}  # file -> latest batch report
+            finished = {'components_found': 0, 'components_added': 0, 'components_updated': 0, 'components_skipped': 0}
+
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                while True:
+                    try:
+                        report = progress_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    running[report['file']] = report
+
+                for future in done:
+                    json_file = pending.pop(future)
+                    running.pop(os.path.basename(json_file), None)
+                    try:
+                        file_stats = future.result()
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f"\nError processing {os.path.basename(json_file)}: {e}"))
+                        file_stats = {
+                            'file': os.path.basename(json_file), 'cmu_ids_processed': 0, 'components_found': 0,
+                            'components_added': 0, 'components_updated': 0, 'components_skipped': 0, 'errors': 1,
+                        }
+                    for key in finished:
+                        finished[key] += file_stats[key]
+                    self.stdout.write("")
+                    self.report_file(file_stats)
+                    yield file_stats
+
+                # Merged progress: finished files plus the latest report from each running one
+                totals = {key: value + sum(r[key] for r in running.values()) for key, value in finished.items()}
+                elapsed = time.time() - start_time
+                self.stdout.write(
+                    f"\r{len(json_files) - len(pending)}/{len(json_files)} files done, {len(running)} in progress | "
+                    f"{totals['components_found']} components read: {totals['components_added']} added, "
+                    f"{totals['components_updated']} updated, {totals['components_skipped']} skipped | "
+                    f"{totals['components_found'] / elapsed if elapsed else 0:.0f}/s",
+                    ending='',
+                )
+                self.stdout.flush()
+        self.stdout.write("")
@@ -2,6 +2,9 @@ import logging
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from checker.models import Component
+from checker.services.capacity_totals import record_capacity_changes
+from checker.services.data_version import bump_data_version
+from checker.services.statistics_snapshot import rebuild_statistics_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -17,13 +20,17 @@ class Command(BaseCommand):
         total_count = Component.objects.count()
         batch_size = 500 # Process in batches to manage memory
 
-        # Use iterator to process components in batches
-        component_iterator = Component.objects.only('id', 'additional_data').iterator(chunk_size=batch_size)
+        # Use iterator to process components in batches (grouping fields are loaded for the capacity totals)
+        component_iterator = Component.objects.only(
+            'id', 'additional_data', 'derated_capacity_mw', 'company_name', 'technology', 'delivery_year'
+        ).iterator(chunk_size=batch_size)
 
         components_to_update = []
+        capacity_changes = [] # (component, old capacity) for the capacity totals
 
         try:
             for i, component in enumerate(component_iterator):
+                old_capacity = component.derated_capacity_mw
                 if component.additional_data and isinstance(component.additional_data, dict):
                     capacity_str = component.additional_data.get("De-Rated Capacity")
                     
@@ -64,23 +71,36 @@ class Command(BaseCommand):
                     else:
                          skipped_count += 1 # No data and field already null
 
+                if components_to_update and components_to_update[-1] is component:
+                    capacity_changes.append((component, old_capacity))
+
                 # Update in batches
                 if len(components_to_update) >= batch_size:
                     with transaction.atomic():
                         Component.objects.bulk_update(components_to_update, ['derated_capacity_mw'])
+                        record_capacity_changes(capacity_changes)
+                        bump_data_version()
                     self.stdout.write(f'Processed {i + 1}/{total_count} components...')
                     components_to_update = [] # Reset batch
+                    capacity_changes = []
 
             # Update any remaining components
             if components_to_update:
                 with transaction.atomic():
                     Component.objects.bulk_update(components_to_update, ['derated_capacity_mw'])
+                    record_capacity_changes(capacity_changes)
+                    bump_data_version()
             
             self.stdout.write(self.style.SUCCESS(
                 f'Successfully processed {total_count} components. '
                 f'Updated: {updated_count}, Skipped (no change needed): {skipped_count}, Errors (set to null): {error_count}'
             ))
 
+            # Capacity totals on the statistics page come from the snapshot
+            if updated_count or error_count:
+                snapshot = rebuild_statistics_snapshot()
+                self.stdout.write(f'Rebuilt statistics snapshot v{snapshot.version}')
+
         except Exception as e:
             logger.exception("An error occurred during population.")
             self.stdout.write(self.style.ERROR(f'An error occurred: {e}')) 
\ No newline at end of file
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+
+from checker.models import Company
+from checker.services.company_directory import refresh_company_directory
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Company directory (normalized id -> company name variants, counts and capacity) from the components table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=str, action='append',
+                            help='Only refresh the company this raw name belongs to (can be repeated)')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        company_names = options['company']
+
+        if company_names:
+            self.stdout.write(f"Refreshing directory entries for: {', '.join(company_names)}")
+        else:
+            self.stdout.write("Rebuilding the full company directory...")
+
+        stats = refresh_company_directory(company_names)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Company directory updated in {time.time() - start_time:.2f}s: "
+            f"{stats['companies_updated']} companies updated, {stats['companies_removed']} removed, "
+            f"{Company.objects.count()} in directory"
+        ))
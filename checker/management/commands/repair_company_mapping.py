@@ -5,7 +5,8 @@ import os
 import json
 from django.conf import settings
 from django.core.cache import cache
-import glob
+
+from checker.services.component_store import get_component_store
 
 
 class Command(BaseCommand):
@@ -55,35 +56,26 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error processing CMU data: {e}'))
 
-        # Process all component JSON files to get company names
-        json_dir = os.path.join(settings.BASE_DIR, 'json_data')
-        if os.path.exists(json_dir):
-            self.stdout.write('Processing component JSON files...')
-            json_files = glob.glob(os.path.join(json_dir, 'components_*.json'))
-
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r') as f:
-                        all_components = json.load(f)
-
-                    self.stdout.write(f'Processing {json_file} with {len(all_components)} CMU entries')
-
-                    for cmu_id, components in all_components.items():
-                        if not isinstance(components, list) or not components:
-                            continue
-
-                        # Check if any component has Company Name field
-                        company_name = None
-                        for comp in components:
-                            if isinstance(comp, dict) and "Company Name" in comp and comp["Company Name"]:
-                                company_name = comp["Company Name"]
-                                break
-
-                        if company_name and cmu_id:
-                            self.stdout.write(f'  Found company {company_name} for CMU ID {cmu_id}')
-                            cmu_to_company_mapping[cmu_id] = company_name
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error processing {json_file}: {e}'))
+        # Process the component store to get company names
+        store = get_component_store()
+        self.stdout.write(f'Processing {len(store)} CMU entries in the component store...')
+        try:
+            for cmu_id, components in store.items():
+                if not isinstance(components, list) or not components:
+                    continue
+
+                # Check if any component has Company Name field
+                company_name = None
+                for comp in components:
+                    if isinstance(comp, dict) and "Company Name" in comp and comp["Company Name"]:
+                        company_name = comp["Company Name"]
+                        break
+
+                if company_name and cmu_id:
+                    self.stdout.write(f'  Found company {company_name} for CMU ID {cmu_id}')
+                    cmu_to_company_mapping[cmu_id] = company_name
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error reading the component store: {e}'))
 
         # Store the updated mapping back to cache
         cache.set("cmu_to_company_mapping", cmu_to_company_mapping, 24 * 3600)  # Cache for 24 hours
@@ -1,15 +1,14 @@
 import os
-import json
 import glob
-import logging
 from django.core.management.base import BaseCommand
 from django.core.cache import cache
 from django.conf import settings
-from ...services.data_access import get_component_data_from_json, save_component_data_to_json, get_json_path
+from ...services.component_store import get_component_store
+from ...services.data_access import save_component_data_to_json
 
 
 class Command(BaseCommand):
-    help = 'Finds and fixes missing components by scanning all JSON files'
+    help = 'Finds and fixes missing components by scanning the JSON component store'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -39,7 +38,7 @@ class Command(BaseCommand):
         company_cmu_ids = []
         if company_name:
             # Get CMU dataframe
-            from ...services.company_search import get_cmu_dataframe
+            from ...services.data_access import get_cmu_dataframe
             cmu_df, _ = get_cmu_dataframe()
             
             if cmu_df is None:
@@ -57,14 +56,14 @@ class Command(BaseCommand):
             company_cmu_ids = company_records["CMU ID"].unique().tolist()
             self.stdout.write(f'Found {len(company_cmu_ids)} CMU IDs for company: {company_name}')
         
-        # Scan all JSON files for components
-        json_dir = os.path.join(settings.BASE_DIR, 'json_data')
-        if not os.path.exists(json_dir):
-            self.stdout.write(self.style.ERROR(f'JSON directory not found: {json_dir}'))
-            return
-            
-        json_files = glob.glob(os.path.join(json_dir, 'components_*.json'))
-        self.stdout.write(f'Found {len(json_files)} JSON files to scan')
+        # Scan the component store (where crawls save components) for components
+        store = get_component_store()
+        self.stdout.write(f'Scanning {len(store)} CMU IDs in the component store')
+        if glob.glob(os.path.join(settings.BASE_DIR, 'json_data', 'components_*.json')):
+            self.stdout.write(self.style.WARNING(
+                'components_*.json shards are not scanned; append them to the store first with '
+                '`manage.py compact_component_store --import-shards`'
+            ))
 
         # Counters for reporting
         total_cmu_ids = 0
@@ -74,94 +73,77 @@ class Command(BaseCommand):
         
         # Track all CMU IDs that have been processed
         processed_cmu_ids = set()
+
+        # Updated component lists, written back to the store in one append
+        updated_entries = []
         
-        # Process each JSON file
-        for json_file in sorted(json_files):
-            try:
-                self.stdout.write(f'Processing {os.path.basename(json_file)}...')
-                
-                with open(json_file, 'r') as f:
-                    all_components = json.load(f)
-                
-                file_cmu_ids = len(all_components)
-                file_components = sum(len(components) for components in all_components.values())
-                self.stdout.write(f'  Contains {file_cmu_ids} CMU IDs with {file_components} total components')
-                
-                total_cmu_ids += file_cmu_ids
-                total_components += file_components
+        try:
+            for cmu_id, components in store.items():
+                # Add to processed set
+                processed_cmu_ids.add(cmu_id)
+                total_cmu_ids += 1
+                total_components += len(components)
                 
-                # Track if we need to update this file
-                file_updated = False
-                
-                # Process each CMU ID in the file
-                for cmu_id, components in list(all_components.items()):
-                    # Add to processed set
-                    processed_cmu_ids.add(cmu_id)
+                # Skip if not for our target company (if specified)
+                if company_name:
+                    if cmu_id not in company_cmu_ids:
+                        continue
+            
+                # Skip if no components
+                if not components:
+                    self.stdout.write(f'  {cmu_id}: Empty component list')
+                    continue
                     
-                    # Skip if not for our target company (if specified)
-                    if company_name:
-                        if cmu_id not in company_cmu_ids:
-                            continue
+                # Check if components have Company Name field
+                company_name_value = None
                 
-                    # Skip if no components
-                    if not components:
-                        self.stdout.write(f'  {cmu_id}: Empty component list')
-                        continue
+                # First check if any component has Company Name
+                for component in components:
+                    if isinstance(component, dict) and component.get("Company Name"):
+                        company_name_value = component["Company Name"]
+                        break
                         
-                    # Check if components have Company Name field
-                    missing_company_name = False
-                    company_name_value = None
-                    
-                    # First check if any component has Company Name
+                # If we found a company name, make sure all components have it
+                if company_name_value:
+                    updates_needed = 0
                     for component in components:
-                        if isinstance(component, dict) and component.get("Company Name"):
-                            company_name_value = component["Company Name"]
-                            break
-                            
-                    # If we found a company name, make sure all components have it
+                        if isinstance(component, dict) and not component.get("Company Name"):
+                            updates_needed += 1
+                            component["Company Name"] = company_name_value
+                    
+                    if updates_needed > 0:
+                        self.stdout.write(f'  {cmu_id}: Adding Company Name "{company_name_value}" to {updates_needed} components')
+                        fixed_components += updates_needed
+                        fixed_cmu_ids += 1
+                        updated_entries.append((cmu_id, components))
+                else:
+                    # Try to get company name from mapping
+                    company_name_value = cmu_to_company_mapping.get(cmu_id)
+                    
+                    # Try case-insensitive match if needed
+                    if not company_name_value:
+                        for mapping_cmu_id, mapping_company in cmu_to_company_mapping.items():
+                            if mapping_cmu_id.lower() == cmu_id.lower():
+                                company_name_value = mapping_company
+                                break
+                                
                     if company_name_value:
-                        updates_needed = 0
+                        self.stdout.write(f'  {cmu_id}: Adding Company Name "{company_name_value}" to all {len(components)} components from mapping')
                         for component in components:
-                            if isinstance(component, dict) and not component.get("Company Name"):
-                                updates_needed += 1
-                                if not dry_run:
-                                    component["Company Name"] = company_name_value
-                        
-                        if updates_needed > 0:
-                            self.stdout.write(f'  {cmu_id}: Adding Company Name "{company_name_value}" to {updates_needed} components')
-                            fixed_components += updates_needed
-                            file_updated = True
+                            if isinstance(component, dict):
+                                component["Company Name"] = company_name_value
+                        fixed_components += len(components)
+                        fixed_cmu_ids += 1
+                        updated_entries.append((cmu_id, components))
                     else:
-                        # Try to get company name from mapping
-                        company_name_value = cmu_to_company_mapping.get(cmu_id)
-                        
-                        # Try case-insensitive match if needed
-                        if not company_name_value:
-                            for mapping_cmu_id, mapping_company in cmu_to_company_mapping.items():
-                                if mapping_cmu_id.lower() == cmu_id.lower():
-                                    company_name_value = mapping_company
-                                    break
-                                    
-                        if company_name_value:
-                            self.stdout.write(f'  {cmu_id}: Adding Company Name "{company_name_value}" to all {len(components)} components from mapping')
-                            if not dry_run:
-                                for component in components:
-                                    if isinstance(component, dict):
-                                        component["Company Name"] = company_name_value
-                            fixed_components += len(components)
-                            file_updated = True
-                        else:
-                            self.stdout.write(self.style.WARNING(f'  {cmu_id}: No Company Name found in components or mapping'))
-                
-                # Save the file if it was updated
-                if file_updated and not dry_run:
-                    self.stdout.write(f'  Saving updated components to {json_file}')
-                    with open(json_file, 'w') as f:
-                        json.dump(all_components, f, indent=2)
-                    fixed_cmu_ids += 1
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Error processing {json_file}: {e}'))
+                        self.stdout.write(self.style.WARNING(f'  {cmu_id}: No Company Name found in components or mapping'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error reading the component store: {e}'))
+
+        # Save the updated CMUs (the lists read from the store are only modified in memory)
+        if updated_entries and not dry_run:
+            self.stdout.write(f'  Saving updated components for {len(updated_entries)} CMU IDs to the component store')
+            store.put_many(updated_entries)
                 
         # Now check if any CMU IDs for the target company are missing
         if company_name and company_cmu_ids:
@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.services.capacity_totals import (
+    compute_capacity_totals,
+    diff_capacity_totals,
+    rebuild_capacity_totals,
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the company / technology / year x technology capacity totals from the components table and compare them with the summary tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Rewrite the summary tables from the recomputed totals when they differ')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rewrite the summary tables without comparing first')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Number of differences to print (default 20)')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        expected = compute_capacity_totals()
+
+        if options['rebuild']:
+            written = rebuild_capacity_totals(expected)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt capacity totals in {time.time() - start_time:.2f}s: "
+                + ", ".join(f"{table}: {rows} rows" for table, rows in written.items())
+            ))
+            return
+
+        differences = diff_capacity_totals(expected)
+        if not differences:
+            self.stdout.write(self.style.SUCCESS(
+                f"Capacity totals match the components table ({time.time() - start_time:.2f}s)"
+            ))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{len(differences)} capacity total(s) differ from the components table:"))
+        for difference in differences[:options['show']]:
+            self.stdout.write(
+                f"  {difference['table']} {difference['key']}: stored {difference['stored']}, "
+                f"expected {difference['expected']}"
+            )
+        if len(differences) > options['show']:
+            self.stdout.write(f"  ... and {len(differences) - options['show']} more")
+
+        if options['fix']:
+            rebuild_capacity_totals(expected)
+            self.stdout.write(self.style.SUCCESS("Summary tables rewritten from the components table"))
+        else:
+            raise CommandError("Capacity totals are out of date; run with --fix to rewrite them")
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.6 on 2025-05-02 10:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Rows updated per backfill statement - keeps each transaction (and lock) short
+BACKFILL_BATCH_SIZE = 5000
+
+# Must match the SearchVector() the ranking code used to build on the fly
+SEARCH_VECTOR_SQL = (
+    "to_tsvector('english', "
+    "COALESCE(company_name, '') || ' ' || COALESCE(location, '') || ' ' || "
+    "COALESCE(description, '') || ' ' || COALESCE(cmu_id, ''))"
+)
+
+
+def create_search_vector_support(apps, schema_editor):
+    """
+    PostgreSQL only: GIN index, maintenance trigger and a batched backfill.
+    Other databases keep the column NULL and search without it.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS checker_component_search_vector_gin "
+            "ON checker_component USING gin(search_vector);"
+        )
+
+        # Keep the vector current on every insert/update, including bulk_create and raw updates
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION checker_component_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {SEARCH_VECTOR_SQL.replace('COALESCE(', 'COALESCE(NEW.')};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS checker_component_search_vector_trigger ON checker_component;")
+        cursor.execute("""
+            CREATE TRIGGER checker_component_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF company_name, location, description, cmu_id
+            ON checker_component
+            FOR EACH ROW EXECUTE PROCEDURE checker_component_search_vector_update();
+        """)
+
+        # Backfill existing rows in id ranges so no single statement rewrites the whole table
+        cursor.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM checker_component;")
+        min_id, max_id = cursor.fetchone()
+        for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                f"UPDATE checker_component SET search_vector = {SEARCH_VECTOR_SQL} "
+                f"WHERE id >= %s AND id < %s AND search_vector IS NULL;",
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+def drop_search_vector_support(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS checker_component_search_vector_trigger ON checker_component;")
+        cursor.execute("DROP FUNCTION IF EXISTS checker_component_search_vector_update();")
+        cursor.execute("DROP INDEX IF EXISTS checker_component_search_vector_gin;")
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch instead of holding one huge transaction
+    atomic = False
+
+    dependencies = [
+        ("checker", "0006_component_geocoded_component_latitude_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="component",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vector_support, drop_search_vector_support),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.6 on 2025-05-02 14:40
+
+from django.db import migrations, transaction
+
+# Trigram indexes are built on UPPER(col::text) because that is the expression
+# Django's icontains/istartswith lookups compile to on PostgreSQL
+TRIGRAM_INDEXES = {
+    'location': 'checker_component_location_trgm',
+    'company_name': 'checker_component_company_name_trgm',
+    'description': 'checker_component_description_trgm',
+}
+
+FTS_TABLE = 'checker_component_fts'
+FTS_COLUMNS = 'company_name, location, description, cmu_id, technology'
+
+
+def _fts_values(prefix):
+    return ', '.join(f"{prefix}.{column.strip()}" for column in FTS_COLUMNS.split(','))
+
+
+def create_text_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            # The extension may not be installable with our privileges - in that
+            # case skip the indexes and let the search code fall back to icontains
+            try:
+                with transaction.atomic(using=schema_editor.connection.alias):
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            except Exception as e:
+                print(f"pg_trgm not available, skipping trigram indexes: {e}")
+                return
+
+            for field, index_name in TRIGRAM_INDEXES.items():
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON checker_component "
+                    f"USING gin (UPPER({field}::text) gin_trgm_ops);"
+                )
+
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            # Needs FTS5 with the trigram tokenizer (SQLite 3.34+)
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"{FTS_COLUMNS}, content='checker_component', content_rowid='id', tokenize='trigram');"
+                )
+            except Exception as e:
+                print(f"SQLite FTS5 trigram tokenizer not available, skipping {FTS_TABLE}: {e}")
+                return
+
+            # Keep the external-content table in sync with checker_component
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON checker_component BEGIN
+                    INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS}) VALUES (new.id, {_fts_values('new')});
+                END;
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON checker_component BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {_fts_values('old')});
+                END;
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON checker_component BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {_fts_values('old')});
+                    INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS}) VALUES (new.id, {_fts_values('new')});
+                END;
+            """)
+
+            # Index the existing rows
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild');")
+
+
+def drop_text_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            for index_name in TRIGRAM_INDEXES.values():
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+        elif vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix};")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE};")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0007_component_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_text_search_indexes, drop_text_search_indexes),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.6 on 2025-05-03 09:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def build_company_directory(apps, schema_editor):
+    """Populate the directory from the components already in the database."""
+    from checker.utils import normalize
+
+    Component = apps.get_model("checker", "Component")
+    Company = apps.get_model("checker", "Company")
+
+    companies = {}
+    rows = (
+        Component.objects.exclude(company_name__isnull=True).exclude(company_name="")
+        .values("company_name")
+        .annotate(count=models.Count("id"), capacity=models.Sum("derated_capacity_mw"))
+        .order_by()
+    )
+    for row in rows:
+        company_id = normalize(row["company_name"])
+        if company_id:
+            companies.setdefault(company_id, []).append({
+                "name": row["company_name"],
+                "component_count": row["count"],
+                "total_derated_capacity_mw": row["capacity"] or 0,
+            })
+
+    directory = []
+    for company_id, variants in companies.items():
+        variants.sort(key=lambda variant: variant["component_count"], reverse=True)
+        directory.append(Company(
+            company_id=company_id,
+            primary_name=variants[0]["name"],
+            name_variants=variants,
+            component_count=sum(v["component_count"] for v in variants),
+            total_derated_capacity_mw=sum(v["total_derated_capacity_mw"] for v in variants),
+        ))
+    Company.objects.bulk_create(directory, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0008_component_text_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Company",
+            fields=[
+                (
+                    "company_id",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("primary_name", models.CharField(max_length=255)),
+                (
+                    "name_variants",
+                    models.JSONField(
+                        default=list,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("component_count", models.IntegerField(default=0)),
+                ("total_derated_capacity_mw", models.FloatField(default=0)),
+                ("last_updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "companies",
+            },
+        ),
+        migrations.RunPython(build_company_directory, migrations.RunPython.noop),
+    ]
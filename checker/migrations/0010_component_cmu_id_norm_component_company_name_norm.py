@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2025-05-03 16:02
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Same batched backfill as `manage.py backfill_normalized_fields`
+    from checker.services.normalized_fields import backfill_normalized_fields
+
+    backfill_normalized_fields(apps.get_model("checker", "Component"))
+
+
+class Migration(migrations.Migration):
+    # Commit each backfill batch separately on large tables
+    atomic = False
+
+    dependencies = [
+        ("checker", "0009_company"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="component",
+            name="cmu_id_norm",
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="component",
+            name="company_name_norm",
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
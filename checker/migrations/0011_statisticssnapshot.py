@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2025-05-04 10:12
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0010_component_cmu_id_norm_component_company_name_norm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(unique=True)),
+                ("schema_version", models.PositiveSmallIntegerField()),
+                (
+                    "data",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("component_count", models.IntegerField(default=0)),
+                ("max_component_id", models.BigIntegerField(blank=True, null=True)),
+                ("build_seconds", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-version"],
+                "get_latest_by": "version",
+            },
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.1.6 on 2025-05-04 15:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+SUMMARY_TABLES = (
+    ("CompanyCapacityTotal", ("company_name",)),
+    ("TechnologyCapacityTotal", ("technology",)),
+    ("YearTechnologyCapacityTotal", ("delivery_year", "technology")),
+)
+
+
+def build_capacity_totals(apps, schema_editor):
+    """Populate the summary tables from the components already in the database."""
+    Component = apps.get_model("checker", "Component")
+
+    for model_name, fields in SUMMARY_TABLES:
+        model = apps.get_model("checker", model_name)
+        groups = defaultdict(lambda: [0, 0, 0.0])
+        rows = (
+            Component.objects.values(*fields)
+            .annotate(
+                count=models.Count("id"),
+                capacity_count=models.Count("derated_capacity_mw"),
+                capacity=models.Sum("derated_capacity_mw"),
+            )
+            .order_by()
+        )
+        for row in rows:
+            group = groups[tuple(row[field] or "" for field in fields)]
+            group[0] += row["count"]
+            group[1] += row["capacity_count"]
+            group[2] += row["capacity"] or 0.0
+
+        model.objects.bulk_create(
+            [
+                model(
+                    component_count=count,
+                    capacity_component_count=capacity_count,
+                    total_capacity_mw=capacity,
+                    **dict(zip(fields, key)),
+                )
+                for key, (count, capacity_count, capacity) in groups.items()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0011_statisticssnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompanyCapacityTotal",
+            fields=[
+                ("component_count", models.IntegerField(default=0)),
+                ("capacity_component_count", models.IntegerField(default=0)),
+                ("total_capacity_mw", models.FloatField(db_index=True, default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "company_name",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["component_count"], name="company_total_count_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="TechnologyCapacityTotal",
+            fields=[
+                ("component_count", models.IntegerField(default=0)),
+                ("capacity_component_count", models.IntegerField(default=0)),
+                ("total_capacity_mw", models.FloatField(db_index=True, default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "technology",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["component_count"], name="tech_total_count_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="YearTechnologyCapacityTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("component_count", models.IntegerField(default=0)),
+                ("capacity_component_count", models.IntegerField(default=0)),
+                ("total_capacity_mw", models.FloatField(db_index=True, default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("delivery_year", models.CharField(max_length=50)),
+                ("technology", models.CharField(max_length=100)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("delivery_year", "technology"),
+                        name="year_tech_total_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_capacity_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2025-05-06 11:20
+
+from django.db import migrations, models
+
+GIST_INDEX = 'checker_component_point_gist'
+
+
+def backfill(apps, schema_editor):
+    # Same batched backfill as services.spatial.backfill_geohashes() uses elsewhere
+    from checker.services.spatial import backfill_geohashes
+
+    backfill_geohashes(apps.get_model("checker", "Component"))
+
+
+def create_gist_index(apps, schema_editor):
+    # Bounding-box index for point <@ box queries (services/spatial.py); core
+    # PostgreSQL GiST, no PostGIS needed. Other databases use the btree indexes.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIST_INDEX} ON checker_component "
+            f"USING gist (point(longitude, latitude)) "
+            f"WHERE latitude IS NOT NULL AND longitude IS NOT NULL;"
+        )
+
+
+def drop_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {GIST_INDEX};")
+
+
+class Migration(migrations.Migration):
+    # Commit each backfill batch separately on large tables
+    atomic = False
+
+    dependencies = [
+        ("checker", "0012_capacity_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="component",
+            name="geohash",
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="component",
+            index=models.Index(fields=["latitude", "longitude"], name="lat_lng_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="component",
+            index=models.Index(fields=["technology", "geohash"], name="tech_geohash_idx"),
+        ),
+        migrations.RunPython(create_gist_index, drop_gist_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2025-05-06 15:48
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_initial_version(apps, schema_editor):
+    # Existing data counts as version 1, so endpoints have a Last-Modified from the start
+    DataVersion = apps.get_model("checker", "DataVersion")
+    DataVersion.objects.get_or_create(name="components", defaults={"version": 1, "updated_at": timezone.now()})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0013_component_geohash_spatial_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                ("name", models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ("version", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_initial_version, migrations.RunPython.noop),
+    ]
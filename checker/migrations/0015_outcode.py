@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2025-05-07 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0014_dataversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Outcode",
+            fields=[
+                ("outcode", models.CharField(max_length=4, primary_key=True, serialize=False)),
+                ("admin_district", models.JSONField(default=list)),
+                ("parliamentary_constituency", models.JSONField(default=list)),
+                ("region", models.CharField(blank=True, default="", max_length=100)),
+                ("country", models.CharField(blank=True, default="", max_length=50)),
+                ("latitude", models.FloatField(blank=True, null=True)),
+                ("longitude", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2025-05-07 10:05
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Same batched backfill as services.bulk_ingest.backfill_content_hashes() uses elsewhere
+    from checker.services.bulk_ingest import backfill_content_hashes
+
+    backfill_content_hashes(apps.get_model("checker", "Component"), apps.get_model("checker", "CMURegistry"))
+
+
+class Migration(migrations.Migration):
+    # Commit each backfill batch separately on large tables
+    atomic = False
+
+    dependencies = [
+        ("checker", "0015_outcode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="component",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name="cmuregistry",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.CreateModel(
+            name="SyncWatermark",
+            fields=[
+                ("resource_id", models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ("max_record_id", models.BigIntegerField(default=0)),
+                ("record_count", models.IntegerField(default=0)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+                ("last_full_sync_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "last_summary",
+                    models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
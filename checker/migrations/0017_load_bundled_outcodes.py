@@ -0,0 +1,30 @@
+import os
+
+from django.db import migrations
+
+
+def load_bundled_outcodes(apps, schema_editor):
+    # The CSV shipped in data_storage/, so a fresh deploy answers outcode lookups from the
+    # table without postcodes.io. Outcodes already loaded (load_outcodes, enrich_outcodes)
+    # are left alone.
+    from checker.services.outcode_data import OUTCODE_CSV_PATH, read_outcodes_csv
+
+    if not os.path.exists(OUTCODE_CSV_PATH):
+        return
+    Outcode = apps.get_model("checker", "Outcode")
+    Outcode.objects.bulk_create(
+        [Outcode(**row) for row in read_outcodes_csv(OUTCODE_CSV_PATH)],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checker", "0016_content_hash_syncwatermark"),
+    ]
+
+    operations = [
+        migrations.RunPython(load_bundled_outcodes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, transaction
+
+# The general searches OR cmu_id and technology icontains lookups in with the fields
+# migration 0008 indexed; one unindexed branch turns the whole OR into a sequential scan.
+# Same UPPER(col::text) expression as 0008. SQLite already has both columns in the FTS5 table.
+TRIGRAM_INDEXES = {
+    'cmu_id': 'checker_component_cmu_id_trgm',
+    'technology': 'checker_component_technology_trgm',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        except Exception as e:
+            print(f"pg_trgm not available, skipping trigram indexes: {e}")
+            return
+
+        for field, index_name in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON checker_component "
+                f"USING gin (UPPER({field}::text) gin_trgm_ops);"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for index_name in TRIGRAM_INDEXES.values():
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checker", "0017_load_bundled_outcodes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,8 +1,22 @@
 from django.db import models
 from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.search import SearchVectorField
+
+from .utils import normalize
+from .services.spatial import encode_geohash
 
 # Create your models here.
 
+class ComponentQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill in the normalized lookup columns here
+        objs = list(objs)
+        for obj in objs:
+            obj.set_normalized_fields()
+            obj.set_geohash()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Component(models.Model):
     """
     Model for storing components data
@@ -25,10 +39,30 @@ class Component(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     geocoded = models.BooleanField(default=False)  # Track which records have been processed
-    
+    # Geohash of latitude/longitude for viewport range scans (see services/spatial.py).
+    # Set on save()/bulk_create() like the normalized columns below.
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+    # SHA-1 of the source API record (additional_data), set by services/bulk_ingest.py;
+    # delta syncs compare it with freshly fetched records to find changed components
+    content_hash = models.CharField(max_length=40, null=True, blank=True)
+
+    # normalize()d copies of company_name / cmu_id (lowercase, no whitespace) for indexed
+    # equality lookups - company_id URL slugs and case-insensitive CMU ID matches.
+    # Set on save()/bulk_create(); backfill with `manage.py backfill_normalized_fields`
+    # after bulk_update()/update() calls that change the source columns.
+    company_name_norm = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    cmu_id_norm = models.CharField(max_length=50, null=True, blank=True, db_index=True)
+
+    # Full-text search vector over company_name, location, description and cmu_id.
+    # On PostgreSQL this is maintained by a database trigger (see migration 0007) and
+    # has a GIN index; on other databases it stays empty and is never queried.
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ComponentQuerySet.as_manager()
+
     class Meta:
         # Add compound indexes for common search patterns
         indexes = [
@@ -45,6 +79,10 @@ class Component(models.Model):
             # This partial index would be ideal but requires PostgreSQL, 
             # so we'll create a regular compound index instead
             models.Index(fields=['company_name', 'location'], name='vital_search_idx'),
+
+            # Viewport queries for the map (plain bounds, and geohash ranges within a technology)
+            models.Index(fields=['latitude', 'longitude'], name='lat_lng_idx'),
+            models.Index(fields=['technology', 'geohash'], name='tech_geohash_idx'),
         ]
         
         # Add database optimizations
@@ -53,6 +91,26 @@ class Component(models.Model):
     def __str__(self):
         return f"{self.cmu_id} - {self.component_id} ({self.location[:30]})"
 
+    def set_normalized_fields(self):
+        """Derive the normalized lookup columns from company_name and cmu_id."""
+        self.company_name_norm = normalize(self.company_name)
+        self.cmu_id_norm = normalize(self.cmu_id)
+
+    def set_geohash(self):
+        """Derive the geohash column from latitude/longitude."""
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.set_normalized_fields()
+        self.set_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'company_name', 'cmu_id'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'company_name_norm', 'cmu_id_norm'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
     # Optional - add a method to get map info
     def map_info(self):
         """Return a dict with info needed for map markers"""
@@ -73,8 +131,167 @@ class Component(models.Model):
 class CMURegistry(models.Model):
     cmu_id = models.CharField(max_length=100, primary_key=True, unique=True)
     raw_data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    content_hash = models.CharField(max_length=40, null=True, blank=True)  # SHA-1 of raw_data, as on Component
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         applicant = self.raw_data.get('Name of Applicant', 'Unknown')
         return f"{self.cmu_id} ({applicant})"
+
+
+class Company(models.Model):
+    """
+    Directory of companies keyed by the normalized id used in /company/<company_id>/ URLs
+    (see utils.normalize). Lists every raw company_name spelling that maps to the id so
+    company pages can resolve their names with one primary-key lookup instead of a
+    distinct scan of the component table. Maintained by the ingest commands through
+    services/company_directory.py.
+    """
+    company_id = models.CharField(max_length=255, primary_key=True)
+    primary_name = models.CharField(max_length=255)  # Variant with the most components
+    # [{"name": ..., "component_count": ..., "total_derated_capacity_mw": ...}], most components first
+    name_variants = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    component_count = models.IntegerField(default=0)
+    total_derated_capacity_mw = models.FloatField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "companies"
+
+    def __str__(self):
+        return f"{self.primary_name} ({self.company_id})"
+
+    @property
+    def variant_names(self):
+        """All raw company_name values for this company."""
+        return [variant["name"] for variant in self.name_variants]
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    Precomputed figures for the /statistics/ page: company, technology and delivery-year
+    distributions with component counts and capacity totals, plus the headline totals.
+    Rebuilt by the build_statistics_snapshot command and after ingest runs (see
+    services/statistics_snapshot.py); the page renders from the newest row.
+    """
+    version = models.PositiveIntegerField(unique=True)  # Increases by one per rebuild
+    schema_version = models.PositiveSmallIntegerField()  # Layout of `data`
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    component_count = models.IntegerField(default=0)
+    max_component_id = models.BigIntegerField(null=True, blank=True)  # Newest component seen by the build
+    build_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-version"]
+        get_latest_by = "version"
+
+    def __str__(self):
+        return f"Statistics snapshot v{self.version} ({self.component_count} components)"
+
+
+class CapacityTotal(models.Model):
+    """
+    Running component count and de-rated capacity total for one group of components.
+    Kept up to date incrementally by the ingest paths (services/capacity_totals.py) so
+    the capacity rankings read a small indexed table instead of grouping the whole
+    component table; `manage.py verify_capacity_totals` recomputes and compares them.
+    Blank / missing group values are stored as "".
+    """
+    component_count = models.IntegerField(default=0)
+    capacity_component_count = models.IntegerField(default=0)  # Components with a de-rated capacity
+    total_capacity_mw = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_capacity(self):
+        """Capacity total, or None when no component in the group has a capacity (like Sum())."""
+        return self.total_capacity_mw if self.capacity_component_count else None
+
+
+class CompanyCapacityTotal(CapacityTotal):
+    company_name = models.CharField(max_length=255, primary_key=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['component_count'], name='company_total_count_idx')]
+
+    def __str__(self):
+        return f"{self.company_name}: {self.total_capacity_mw:.2f} MW ({self.component_count} components)"
+
+
+class TechnologyCapacityTotal(CapacityTotal):
+    technology = models.CharField(max_length=100, primary_key=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['component_count'], name='tech_total_count_idx')]
+
+    def __str__(self):
+        return f"{self.technology}: {self.total_capacity_mw:.2f} MW ({self.component_count} components)"
+
+
+class YearTechnologyCapacityTotal(CapacityTotal):
+    delivery_year = models.CharField(max_length=50)
+    technology = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['delivery_year', 'technology'], name='year_tech_total_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.delivery_year} / {self.technology}: {self.total_capacity_mw:.2f} MW ({self.component_count} components)"
+
+
+class DataVersion(models.Model):
+    """
+    Version stamp for a body of data, bumped by every path that writes it (see
+    services/data_version.py). Read-only JSON/HTMX endpoints derive their ETag and
+    Last-Modified headers from it, so clients can revalidate with a 304.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} v{self.version} ({self.updated_at:%Y-%m-%d %H:%M:%S})"
+
+
+class Outcode(models.Model):
+    """
+    UK postcode outcode (the part before the space, e.g. "SW1A") with the administrative
+    areas it falls in and its centroid. Loaded from a CSV by `manage.py load_outcodes`
+    (and refreshed from postcodes.io by `manage.py enrich_outcodes`); the postcode
+    helpers answer lookups from it instead of calling the API during searches.
+    """
+    outcode = models.CharField(max_length=4, primary_key=True)
+    admin_district = models.JSONField(default=list)  # An outcode can span several districts
+    parliamentary_constituency = models.JSONField(default=list)
+    region = models.CharField(max_length=100, blank=True, default="")
+    country = models.CharField(max_length=50, blank=True, default="")
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.outcode} ({', '.join(self.admin_district) or self.region or 'unknown'})"
+
+
+class SyncWatermark(models.Model):
+    """
+    Progress of `manage.py delta_sync` for one NESO datastore resource: the highest
+    record _id seen and how many records the resource held, so a --new-only run can
+    fetch just the records appended since (see services/delta_sync.py), plus the
+    change summary of the last run.
+    """
+    resource_id = models.CharField(max_length=64, primary_key=True)
+    max_record_id = models.BigIntegerField(default=0)
+    record_count = models.IntegerField(default=0)  # Records with _id <= max_record_id at the last sync
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)  # Last run that compared every record
+    last_summary = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"{self.resource_id} (_id <= {self.max_record_id}, {self.record_count} records)"
@@ -0,0 +1,52 @@
+"""
+Batched backfill of derived columns (normalized names, geohash, content_hash).
+
+The derived columns are set on save()/bulk_create(); this walks the rows written before
+a column existed, or changed through bulk_update()/QuerySet.update(), in pk order and
+writes only those whose stored values differ from the recomputed ones.
+"""
+from django.db import transaction
+
+
+def backfill_in_batches(queryset, source_fields, derived_fields, compute, batch_size=2000, progress=None):
+    """
+    Recompute `derived_fields` for every row of `queryset` in pk-ordered batches.
+
+    compute(*source values) returns a tuple of new values in derived_fields order; rows
+    where it differs from the stored values are bulk_update()d, one transaction per batch.
+    progress(checked, updated) is called after each batch.
+
+    Returns (rows_checked, rows_updated).
+    """
+    model = queryset.model
+    queryset = queryset.order_by('pk')
+    source_fields = list(source_fields)
+    derived_fields = list(derived_fields)
+    source_count = len(source_fields)
+
+    checked = 0
+    updated = 0
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', *source_fields, *derived_fields)[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        checked += len(rows)
+
+        changed = []
+        for row in rows:
+            new_values = tuple(compute(*row[1:1 + source_count]))
+            if new_values != tuple(row[1 + source_count:]):
+                changed.append(model(pk=row[0], **dict(zip(derived_fields, new_values))))
+
+        if changed:
+            with transaction.atomic():
+                model.objects.bulk_update(changed, derived_fields)
+            updated += len(changed)
+
+        if progress:
+            progress(checked, updated)
+
+    return checked, updated
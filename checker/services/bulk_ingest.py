@@ -0,0 +1,289 @@
+"""
+Set-based writes of API / JSON component records and CMU registry entries.
+
+The ingest paths (crawl_to_database, migrate_json_to_db, the on-demand fetch in
+data_access) used to check `Component.objects.filter(component_id=...).exists()` and
+create or update_or_create one row at a time. Here each batch costs a fixed number of
+queries however many records it holds:
+
+    one component_id__in query for the rows that already exist
+    one INSERT ... ON CONFLICT (component_id) DO UPDATE  (bulk_create update_conflicts)
+    the capacity total deltas and the data version bump, in the same transaction
+
+and the derived columns (derated_capacity_mw and content_hash here, the normalized and
+geohash columns in ComponentQuerySet.bulk_create) are computed in the same pass. The
+company directory is refreshed once for every company the records touched.
+
+content_hash is a SHA-1 of the source record. Upserts leave rows whose stored hash
+matches alone, and delta syncs (services/delta_sync.py) compare it with fetched records.
+"""
+import hashlib
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from ..models import CMURegistry, Component
+from .backfill import backfill_in_batches
+from .capacity_totals import record_components_removed, record_components_replaced
+from .company_directory import refresh_company_directory
+from .data_version import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT ... ON CONFLICT statement (and per transaction)
+INGEST_BATCH_SIZE = 1000
+
+# API record key -> Component field
+RECORD_FIELDS = {
+    "Location and Post Code": "location",
+    "Description of CMU Components": "description",
+    "Generating Technology Class": "technology",
+    "Company Name": "company_name",
+    "Auction Name": "auction_name",
+    "Delivery Year": "delivery_year",
+    "Status": "status",
+    "Type": "type",
+}
+
+# Columns an upsert overwrites on existing components. Geocoding results (latitude,
+# longitude, geocoded, geohash) and created_at are kept.
+UPDATE_FIELDS = [
+    "cmu_id", *RECORD_FIELDS.values(), "additional_data", "derated_capacity_mw", "content_hash",
+    "company_name_norm", "cmu_id_norm", "updated_at",
+]
+
+# What the capacity totals are grouped by, read back for components being overwritten
+TOTAL_FIELDS = ("company_name", "technology", "delivery_year", "derated_capacity_mw")
+
+# Keys CKAN adds to full-text search results (q=...) rather than storing; a component
+# fetched by CMU search and the same one fetched by paging must hash the same
+VOLATILE_RECORD_KEYS = ("rank", "_full_text")
+
+
+def record_hash(record):
+    """SHA-1 hex digest of an API record: canonical JSON, volatile search keys left out."""
+    data = {
+        key: value for key, value in record.items()
+        if key not in VOLATILE_RECORD_KEYS and not key.startswith("rank ")
+    }
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, cls=DjangoJSONEncoder)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def parse_capacity(value):
+    """De-Rated Capacity value as a float, None when missing or not a number."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def source_record(record, default_company_name=None):
+    """
+    The record as stored in additional_data: the component resource has no company,
+    so a missing "Company Name" is filled in with `default_company_name` (the CMU's
+    applicant), as the JSON store does.
+    """
+    if not record.get("Company Name") and default_company_name:
+        record = dict(record, **{"Company Name": default_company_name})
+    return record
+
+
+def component_fields(record, cmu_id, default_company_name=None):
+    """
+    Component field values for one API / JSON component record. The company is the
+    record's "Company Name", else `default_company_name` (e.g. the CMU's applicant).
+    """
+    record = source_record(record, default_company_name)
+    fields = {field: record.get(key, "") for key, field in RECORD_FIELDS.items()}
+    component_id = record.get("_id")
+    fields.update(
+        # Missing ids are stored as NULL, which the unique constraint doesn't compare
+        component_id=str(component_id) if component_id not in (None, "") else None,
+        cmu_id=cmu_id,
+        additional_data=record,
+        derated_capacity_mw=parse_capacity(record.get("De-Rated Capacity")),
+        content_hash=record_hash(record),
+    )
+    return fields
+
+
+def _write_batch(components, update_existing, result):
+    """
+    Insert (and with update_existing, overwrite) one batch of unsaved Components. Rows
+    whose stored content_hash matches the record are left alone either way.
+    """
+    ids = [c.component_id for c in components if c.component_id]
+    existing = {}
+    if ids:
+        existing = {
+            row["component_id"]: row
+            for row in Component.objects.filter(component_id__in=ids).values(
+                "component_id", "content_hash", *TOTAL_FIELDS
+            )
+        }
+
+    if not update_existing:
+        writes = [c for c in components if c.component_id not in existing]
+    else:
+        writes = [
+            c for c in components
+            if c.component_id not in existing or existing[c.component_id]["content_hash"] != c.content_hash
+        ]
+    result["skipped"] += len(components) - len(writes)
+    if not writes:
+        return
+
+    replaced = [existing[c.component_id] for c in writes if c.component_id in existing]
+    with transaction.atomic():
+        Component.objects.bulk_create(
+            writes,
+            update_conflicts=True,
+            unique_fields=["component_id"],
+            update_fields=UPDATE_FIELDS,
+        )
+        # Same transaction, so the capacity totals only move if the write commits
+        record_components_replaced(replaced, writes)
+        # New ETag / Last-Modified for the cached read-only endpoints
+        bump_data_version()
+
+    result["added"] += len(writes) - len(replaced)
+    result["updated"] += len(replaced)
+    result["companies"].update(c.company_name for c in writes)
+    result["companies"].update(row["company_name"] for row in replaced)
+
+
+def ingest_components(records, company_names=None, update_existing=False,
+                      batch_size=INGEST_BATCH_SIZE, refresh_companies=True):
+    """
+    Save component records. `records`: iterable of (cmu_id, record) pairs;
+    `company_names`: optional {cmu_id: company} used when a record has no company.
+
+    Components already in the database (by component_id) are skipped, or overwritten
+    with update_existing when their content_hash differs. A component_id repeated
+    within `records` is saved once (the first occurrence). Returns {'added',
+    'updated', 'skipped', 'errors', 'companies'} where companies is the set of company
+    names touched; with refresh_companies the company directory is refreshed for them
+    before returning.
+    """
+    company_names = company_names or {}
+    result = {"added": 0, "updated": 0, "skipped": 0, "errors": 0, "companies": set()}
+
+    components = []
+    seen_ids = set()
+    for cmu_id, record in records:
+        try:
+            component = Component(**component_fields(record, cmu_id, company_names.get(cmu_id)))
+        except (AttributeError, TypeError) as e:
+            logger.error(f"Skipping malformed component record for CMU {cmu_id}: {e}")
+            result["errors"] += 1
+            continue
+        if component.component_id:
+            if component.component_id in seen_ids:
+                result["skipped"] += 1
+                continue
+            seen_ids.add(component.component_id)
+        components.append(component)
+
+    for start in range(0, len(components), batch_size):
+        _write_batch(components[start:start + batch_size], update_existing, result)
+
+    if refresh_companies and result["companies"]:
+        try:
+            refresh_company_directory(result["companies"])
+        except Exception as e:
+            logger.error(f"Error refreshing company directory: {e}")
+            result["errors"] += 1
+    return result
+
+
+def delete_components(component_ids, batch_size=INGEST_BATCH_SIZE, refresh_companies=True):
+    """
+    Delete components by component_id, taking them out of the capacity totals in the
+    same transaction. Returns {'deleted', 'companies'}; with refresh_companies the
+    company directory is refreshed for the companies they belonged to.
+    """
+    component_ids = list(component_ids)
+    result = {"deleted": 0, "companies": set()}
+    for start in range(0, len(component_ids), batch_size):
+        chunk = component_ids[start:start + batch_size]
+        with transaction.atomic():
+            rows = list(Component.objects.filter(component_id__in=chunk).values("component_id", *TOTAL_FIELDS))
+            if not rows:
+                continue
+            Component.objects.filter(component_id__in=[row["component_id"] for row in rows]).delete()
+            record_components_removed(rows)
+            bump_data_version()
+        result["deleted"] += len(rows)
+        result["companies"].update(row["company_name"] for row in rows)
+
+    if refresh_companies and result["companies"]:
+        try:
+            refresh_company_directory(result["companies"])
+        except Exception as e:
+            logger.error(f"Error refreshing company directory: {e}")
+    return result
+
+
+def upsert_cmu_registry(entries, batch_size=INGEST_BATCH_SIZE):
+    """
+    Create or update CMURegistry rows from (cmu_id, raw_data) pairs (the last pair wins
+    for a repeated cmu_id). Returns the number of rows written.
+    """
+    rows = {cmu_id: raw_data for cmu_id, raw_data in entries if cmu_id}
+    if not rows:
+        return 0
+    with transaction.atomic():
+        CMURegistry.objects.bulk_create(
+            [
+                CMURegistry(cmu_id=cmu_id, raw_data=raw_data, content_hash=record_hash(raw_data))
+                for cmu_id, raw_data in rows.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["cmu_id"],
+            update_fields=["raw_data", "content_hash", "last_updated"],
+        )
+    return len(rows)
+
+
+def delete_cmu_registry(cmu_ids, batch_size=INGEST_BATCH_SIZE):
+    """Delete CMURegistry rows by cmu_id. Returns the number deleted."""
+    cmu_ids = list(cmu_ids)
+    deleted = 0
+    for start in range(0, len(cmu_ids), batch_size):
+        deleted += CMURegistry.objects.filter(cmu_id__in=cmu_ids[start:start + batch_size]).delete()[0]
+    return deleted
+
+
+def _backfill_hashes(model, data_field, batch_size, only_missing):
+    queryset = model.objects.all()
+    if only_missing:
+        queryset = queryset.filter(content_hash__isnull=True)
+    return backfill_in_batches(
+        queryset,
+        (data_field,),
+        ("content_hash",),
+        lambda data: (record_hash(data or {}),),
+        batch_size=batch_size,
+    )
+
+
+def backfill_content_hashes(component_model=None, registry_model=None, batch_size=2000, only_missing=True):
+    """
+    Set content_hash on components (from additional_data) and CMU registry rows (from
+    raw_data) in pk-ordered batches. The model arguments let migrations pass their
+    historical models. Returns {model name: (rows_checked, rows_updated)}.
+    """
+    component_model = component_model or Component
+    registry_model = registry_model or CMURegistry
+    results = {
+        "component": _backfill_hashes(component_model, "additional_data", batch_size, only_missing),
+        "cmu_registry": _backfill_hashes(registry_model, "raw_data", batch_size, only_missing),
+    }
+    logger.info(f"Content hash backfill: {results}")
+    return results
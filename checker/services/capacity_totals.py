@@ -0,0 +1,230 @@
+"""
+Incrementally maintained capacity totals by company, technology and delivery year x technology.
+
+The capacity rankings used to run Sum('derated_capacity_mw') grouped over the whole
+component table on every request. The summary tables (models.CapacityTotal subclasses)
+hold the same figures and are adjusted by the code paths that write components:
+
+    record_components_added(components)     # after inserting components
+    record_components_removed(components)   # before/after deleting them
+    record_components_replaced(old, new)    # after overwriting/inserting in one write
+    record_capacity_changes(changes)        # after changing derated_capacity_mw
+
+Each call turns the components into per-group deltas and applies them with one
+UPDATE ... SET x = x + delta per touched group (creating missing groups), inside the
+caller's transaction when there is one. compute_capacity_totals() recomputes everything
+from the component table; diff_capacity_totals() / `manage.py verify_capacity_totals`
+compare the two.
+"""
+import logging
+import math
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from ..models import Component, CompanyCapacityTotal, TechnologyCapacityTotal, YearTechnologyCapacityTotal
+
+logger = logging.getLogger(__name__)
+
+# Summary model -> the component fields it is grouped by
+SUMMARY_TABLES = (
+    (CompanyCapacityTotal, ("company_name",)),
+    (TechnologyCapacityTotal, ("technology",)),
+    (YearTechnologyCapacityTotal, ("delivery_year", "technology")),
+)
+
+# Capacity sums built up one delta at a time drift from a fresh SUM() by float rounding
+CAPACITY_TOLERANCE_MW = 1e-6
+
+
+def _value(component, field):
+    value = component.get(field) if isinstance(component, dict) else getattr(component, field)
+    return value or ""
+
+
+def _capacity(component):
+    if isinstance(component, dict):
+        return component.get("derated_capacity_mw")
+    return component.derated_capacity_mw
+
+
+def _collect(deltas, component, count, capacity_count, capacity):
+    for model, fields in SUMMARY_TABLES:
+        key = tuple(_value(component, field) for field in fields)
+        delta = deltas[model][key]
+        delta[0] += count
+        delta[1] += capacity_count
+        delta[2] += capacity
+
+
+def _apply(deltas):
+    """Add the collected [count, capacity_count, capacity] deltas to the summary rows."""
+    with transaction.atomic():
+        for model, fields in SUMMARY_TABLES:
+            # Sorted, so concurrent writers (parallel migrate_json_to_db workers) lock the
+            # summary rows in the same order and can't deadlock, as long as each write
+            # makes one _apply() call (see record_components_replaced)
+            for key, (count, capacity_count, capacity) in sorted(deltas[model].items()):
+                if not (count or capacity_count or capacity):
+                    continue
+                lookup = dict(zip(fields, key))
+                changes = {
+                    "component_count": F("component_count") + count,
+                    "capacity_component_count": F("capacity_component_count") + capacity_count,
+                    "total_capacity_mw": F("total_capacity_mw") + capacity,
+                }
+                if model.objects.filter(**lookup).update(**changes):
+                    continue
+                try:
+                    # New group; the savepoint lets a concurrent insert of the same group fall back to UPDATE
+                    with transaction.atomic():
+                        model.objects.create(
+                            component_count=count,
+                            capacity_component_count=capacity_count,
+                            total_capacity_mw=capacity,
+                            **lookup,
+                        )
+                except IntegrityError:
+                    model.objects.filter(**lookup).update(**changes)
+
+
+def _new_deltas():
+    return {model: defaultdict(lambda: [0, 0, 0.0]) for model, _ in SUMMARY_TABLES}
+
+
+def _collect_added(deltas, components):
+    for component in components:
+        capacity = _capacity(component)
+        _collect(deltas, component, 1, int(capacity is not None), capacity or 0.0)
+
+
+def _collect_removed(deltas, components):
+    for component in components:
+        capacity = _capacity(component)
+        _collect(deltas, component, -1, -int(capacity is not None), -(capacity or 0.0))
+
+
+def record_components_added(components):
+    """Count newly inserted components (Component instances or dicts with the model field names)."""
+    deltas = _new_deltas()
+    _collect_added(deltas, components)
+    _apply(deltas)
+
+
+def record_components_removed(components):
+    """Inverse of record_components_added() for deleted components."""
+    deltas = _new_deltas()
+    _collect_removed(deltas, components)
+    _apply(deltas)
+
+
+def record_components_replaced(removed, added):
+    """
+    record_components_removed(removed) and record_components_added(added) in one pass,
+    for a write that overwrites some components and inserts others. One _apply() means
+    the summary rows are locked in a single sorted order.
+    """
+    deltas = _new_deltas()
+    _collect_removed(deltas, removed)
+    _collect_added(deltas, added)
+    _apply(deltas)
+
+
+def record_capacity_changes(changes):
+    """
+    Adjust the capacity totals for components whose derated_capacity_mw changed.
+    changes: iterable of (component, old_capacity) where the component carries the new value.
+    """
+    deltas = _new_deltas()
+    for component, old_capacity in changes:
+        new_capacity = _capacity(component)
+        capacity_count = int(new_capacity is not None) - int(old_capacity is not None)
+        _collect(deltas, component, 0, capacity_count, (new_capacity or 0.0) - (old_capacity or 0.0))
+    _apply(deltas)
+
+
+# --- Full recomputation / verification ---
+
+def compute_capacity_totals():
+    """{model: {key: (component_count, capacity_component_count, total_capacity_mw)}} from the component table."""
+    totals = {}
+    for model, fields in SUMMARY_TABLES:
+        groups = defaultdict(lambda: [0, 0, 0.0])
+        rows = (
+            Component.objects.values(*fields)
+            .annotate(count=Count("id"), capacity_count=Count("derated_capacity_mw"), capacity=Sum("derated_capacity_mw"))
+            .order_by()
+        )
+        for row in rows:
+            # NULL and "" are the same group
+            group = groups[tuple(row[field] or "" for field in fields)]
+            group[0] += row["count"]
+            group[1] += row["capacity_count"]
+            group[2] += row["capacity"] or 0.0
+        totals[model] = {key: tuple(value) for key, value in groups.items()}
+    return totals
+
+
+def stored_capacity_totals():
+    """Same shape as compute_capacity_totals(), read from the summary tables."""
+    totals = {}
+    for model, fields in SUMMARY_TABLES:
+        totals[model] = {
+            tuple(row[:len(fields)]): tuple(row[len(fields):])
+            for row in model.objects.values_list(
+                *fields, "component_count", "capacity_component_count", "total_capacity_mw"
+            )
+        }
+    return totals
+
+
+def diff_capacity_totals(expected=None):
+    """
+    Differences between the summary tables and a fresh recomputation, as dicts with
+    table, key, stored and expected (None where the row is missing). Empty groups
+    left behind by removals count as matching a missing row.
+    """
+    expected = expected if expected is not None else compute_capacity_totals()
+    stored = stored_capacity_totals()
+    empty = (0, 0, 0.0)
+    differences = []
+    for model, fields in SUMMARY_TABLES:
+        for key in sorted(set(expected[model]) | set(stored[model])):
+            want = expected[model].get(key, empty)
+            have = stored[model].get(key, empty)
+            if (
+                want[0] != have[0] or want[1] != have[1]
+                or not math.isclose(want[2], have[2], rel_tol=1e-9, abs_tol=CAPACITY_TOLERANCE_MW)
+            ):
+                differences.append({
+                    "table": model.__name__,
+                    "key": dict(zip(fields, key)),
+                    "stored": stored[model].get(key),
+                    "expected": expected[model].get(key),
+                })
+    return differences
+
+
+def rebuild_capacity_totals(expected=None):
+    """Replace the summary tables with a fresh recomputation; returns rows written per table."""
+    expected = expected if expected is not None else compute_capacity_totals()
+    written = {}
+    with transaction.atomic():
+        for model, fields in SUMMARY_TABLES:
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                [
+                    model(
+                        component_count=count,
+                        capacity_component_count=capacity_count,
+                        total_capacity_mw=capacity,
+                        **dict(zip(fields, key)),
+                    )
+                    for key, (count, capacity_count, capacity) in expected[model].items()
+                ],
+                batch_size=1000,
+            )
+            written[model.__name__] = len(expected[model])
+    logger.info(f"Rebuilt capacity totals: {written}")
+    return written
@@ -0,0 +1,220 @@
+"""
+In-memory company / CMU / year lookup that replaces the pandas cmu_df on the search paths.
+
+get_cmu_dataframe() turns every distinct (cmu_id, company_name, delivery_year, auction_name)
+row into a DataFrame, and callers then filter the whole frame with a boolean mask per
+company. CmuLookup keeps the same rows as parallel int arrays that point into interned
+string tables, plus dicts of int arrays (row positions) by company, normalized company,
+CMU ID and year. A lookup touches only the rows it returns.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from ..utils import normalize
+
+logger = logging.getLogger(__name__)
+
+# Rebuild after this many seconds (the cmu_df cache used 15 minutes)
+LOOKUP_TTL = getattr(settings, 'CMU_LOOKUP_TTL_SECONDS', 900)
+
+
+class _StringTable:
+    """Interned strings with a string -> code dict; codes index into `values`."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        value = value or ""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CmuLookup:
+    """Distinct (CMU, company, year, auction) rows stored column-wise."""
+
+    def __init__(self, rows):
+        """rows: iterable of (cmu_id, company_name, delivery_year, auction_name) tuples."""
+        self.cmu_table = _StringTable()
+        self.company_table = _StringTable()
+        self.company_norm_table = _StringTable()
+        self.year_table = _StringTable()
+        self.auction_table = _StringTable()
+
+        # One entry per row
+        self.row_cmu = array('i')
+        self.row_company = array('i')
+        self.row_year = array('i')
+        self.row_auction = array('i')
+
+        # Code -> row positions
+        self.rows_by_company = {}
+        self.rows_by_company_norm = {}
+        self.rows_by_cmu = {}
+        self.rows_by_year = {}
+
+        # One normalized-name code per company-name code
+        company_to_norm = array('i')
+
+        for cmu_id, company_name, delivery_year, auction_name in rows:
+            position = len(self.row_cmu)
+            cmu_code = self.cmu_table.code(cmu_id)
+            company_code = self.company_table.code(company_name)
+            if company_code == len(company_to_norm):
+                company_to_norm.append(self.company_norm_table.code(normalize(company_name or "")))
+            year_code = self.year_table.code(delivery_year)
+
+            self.row_cmu.append(cmu_code)
+            self.row_company.append(company_code)
+            self.row_year.append(year_code)
+            self.row_auction.append(self.auction_table.code(auction_name))
+
+            for index, key in (
+                (self.rows_by_company, company_code),
+                (self.rows_by_company_norm, company_to_norm[company_code]),
+                (self.rows_by_cmu, cmu_code),
+                (self.rows_by_year, year_code),
+            ):
+                positions = index.get(key)
+                if positions is None:
+                    positions = index[key] = array('i')
+                positions.append(position)
+
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        from ..models import Component
+
+        start_time = time.time()
+        rows = (
+            Component.objects.values_list('cmu_id', 'company_name', 'delivery_year', 'auction_name')
+            .distinct().order_by('cmu_id', 'company_name', 'delivery_year', 'auction_name')
+        )
+        lookup = cls(rows.iterator(chunk_size=5000))
+        logger.info(
+            f"Built CMU lookup with {len(lookup)} rows, {len(lookup.company_table)} companies and "
+            f"{len(lookup.cmu_table)} CMU IDs in {time.time() - start_time:.2f}s "
+            f"(~{lookup.memory_footprint()['total_bytes'] / 1024:.0f} KB)"
+        )
+        return lookup
+
+    def __len__(self):
+        return len(self.row_cmu)
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at >= LOOKUP_TTL
+
+    # --- Row selection ---
+
+    def rows_for_companies(self, company_names):
+        """Row positions for the given raw company names, in row order."""
+        positions = []
+        for company_name in company_names:
+            code = self.company_table.codes.get(company_name)
+            if code is not None:
+                positions.extend(self.rows_by_company[code])
+        positions.sort()
+        return positions
+
+    def rows_for_company_id(self, company_id):
+        """Row positions for every spelling that normalizes to company_id."""
+        code = self.company_norm_table.codes.get(company_id)
+        return list(self.rows_by_company_norm[code]) if code is not None else []
+
+    def rows_for_cmu(self, cmu_id):
+        code = self.cmu_table.codes.get(cmu_id)
+        return list(self.rows_by_cmu[code]) if code is not None else []
+
+    def filter_rows(self, positions, year=None, auction_name=None):
+        """Narrow row positions to an exact delivery year and/or auction name."""
+        if year is not None:
+            year_code = self.year_table.codes.get(year)
+            if year_code is None:
+                return []
+            positions = [position for position in positions if self.row_year[position] == year_code]
+        if auction_name:
+            auction_code = self.auction_table.codes.get(auction_name)
+            if auction_code is None:
+                return []
+            positions = [position for position in positions if self.row_auction[position] == auction_code]
+        return positions
+
+    # --- Row projections ---
+
+    def cmu_ids(self, positions):
+        """Distinct CMU IDs for the rows, in first-seen order."""
+        values = self.cmu_table.values
+        return list(dict.fromkeys(values[self.row_cmu[position]] for position in positions))
+
+    def year_auction_pairs(self, positions):
+        """(delivery_year, auction_name) for each row (what _organize_year_data consumes)."""
+        years = self.year_table.values
+        auctions = self.auction_table.values
+        return [(years[self.row_year[position]], auctions[self.row_auction[position]]) for position in positions]
+
+    def company_for_cmu(self, cmu_id):
+        positions = self.rows_for_cmu(cmu_id)
+        return self.company_table.values[self.row_company[positions[0]]] if positions else None
+
+    # --- Introspection ---
+
+    def memory_footprint(self):
+        """Approximate bytes held, broken down by part (strings, row columns, indexes)."""
+
+        def table_bytes(table):
+            return (
+                sum(sys.getsizeof(value) for value in table.values)
+                + sys.getsizeof(table.values) + sys.getsizeof(table.codes)
+            )
+
+        def index_bytes(index):
+            return sys.getsizeof(index) + sum(sys.getsizeof(positions) for positions in index.values())
+
+        footprint = {
+            "rows": len(self),
+            "string_tables": sum(
+                table_bytes(table) for table in (
+                    self.cmu_table, self.company_table, self.company_norm_table,
+                    self.year_table, self.auction_table,
+                )
+            ),
+            "row_columns": sum(
+                sys.getsizeof(column) for column in (
+                    self.row_cmu, self.row_company, self.row_year, self.row_auction,
+                )
+            ),
+            "indexes": sum(
+                index_bytes(index) for index in (
+                    self.rows_by_company, self.rows_by_company_norm, self.rows_by_cmu, self.rows_by_year,
+                )
+            ),
+        }
+        footprint["total_bytes"] = footprint["string_tables"] + footprint["row_columns"] + footprint["indexes"]
+        return footprint
+
+
+_lookup = None
+_lookup_lock = threading.Lock()
+
+
+def get_cmu_lookup():
+    """Return the process-wide lookup, (re)building it when missing or older than LOOKUP_TTL."""
+    global _lookup
+    if _lookup is None or _lookup.is_stale():
+        with _lookup_lock:
+            if _lookup is None or _lookup.is_stale():
+                _lookup = CmuLookup.from_database()
+    return _lookup
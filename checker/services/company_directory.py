@@ -0,0 +1,206 @@
+"""
+Maintenance and lookups for the Company directory table (see models.Company).
+
+Company pages receive a normalized company_id slug and need every raw company_name
+spelling that normalizes to it. Rather than scanning all distinct names on each hit,
+the ingest paths call refresh_company_directory() with the names they touched and the
+pages call get_company_name_variations().
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from ..models import Component, Company
+from ..utils import normalize
+from .data_version import versioned_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Search pages show the same handful of companies repeatedly; keep summaries briefly
+COMPANY_SUMMARY_CACHE_TTL = 300
+
+# Unknown company ids (crawlers, stale links) are remembered briefly so repeat hits
+# skip the component fallback; the key also changes with the data version
+COMPANY_MISS_CACHE_TTL = 60
+COMPANY_MISS = "__missing__"
+
+# CMU IDs kept per summary for display ("CMU IDs: A, B, C and 12 more")
+COMPANY_SUMMARY_CMU_SAMPLE = 5
+
+
+def _aggregate_company_names(company_names=None, company_ids=None):
+    """
+    One grouped query: component count and total derated capacity per raw company_name,
+    grouped into {company_id: [variant, ...]}. Restricted to the given raw names and/or
+    normalized ids when either is passed.
+    """
+    queryset = Component.objects.exclude(company_name__isnull=True).exclude(company_name="")
+    if company_names is not None or company_ids is not None:
+        queryset = queryset.filter(
+            Q(company_name__in=list(company_names or [])) | Q(company_name_norm__in=list(company_ids or []))
+        )
+
+    rows = (
+        queryset.values("company_name")
+        .annotate(count=Count("id"), capacity=Sum("derated_capacity_mw"))
+        .order_by()
+    )
+
+    companies = {}
+    for row in rows:
+        company_id = normalize(row["company_name"])
+        if company_id:
+            companies.setdefault(company_id, []).append({
+                "name": row["company_name"],
+                "component_count": row["count"],
+                "total_derated_capacity_mw": row["capacity"] or 0,
+            })
+    return companies
+
+
+def _build_company(company_id, variants):
+    variants.sort(key=lambda variant: variant["component_count"], reverse=True)
+    return Company(
+        company_id=company_id,
+        primary_name=variants[0]["name"],
+        name_variants=variants,
+        component_count=sum(variant["component_count"] for variant in variants),
+        total_derated_capacity_mw=sum(variant["total_derated_capacity_mw"] for variant in variants),
+    )
+
+
+def refresh_company_directory(company_names=None):
+    """
+    Recompute directory rows from the Component table.
+
+    With company_names, only the companies those names normalize to are recomputed
+    (this is what the ingest paths call after writing components). Without it the
+    whole directory is rebuilt and companies with no components left are removed.
+
+    Returns a stats dict.
+    """
+    stats = {"companies_updated": 0, "companies_removed": 0}
+
+    if company_names is not None:
+        company_names = {name for name in company_names if name}
+        if not company_names:
+            return stats
+        company_ids = {normalize(name) for name in company_names}
+
+        # Include variants we already know about so their counts are recomputed too
+        # (the company_name_norm match also finds spellings we haven't seen yet)
+        candidate_names = set(company_names)
+        for company in Company.objects.filter(company_id__in=company_ids):
+            candidate_names.update(company.variant_names)
+
+        companies = _aggregate_company_names(candidate_names, company_ids)
+    else:
+        company_ids = None
+        companies = _aggregate_company_names()
+
+    directory = [_build_company(company_id, variants) for company_id, variants in companies.items()]
+
+    with transaction.atomic():
+        Company.objects.bulk_create(
+            directory,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["company_id"],
+            update_fields=["primary_name", "name_variants", "component_count", "total_derated_capacity_mw", "last_updated"],
+        )
+        stale = Company.objects.exclude(company_id__in=list(companies.keys()))
+        if company_ids is not None:
+            stale = stale.filter(company_id__in=company_ids)
+        stats["companies_removed"] = stale.delete()[0]
+
+    stats["companies_updated"] = len(directory)
+    logger.info(
+        f"Company directory refreshed: {stats['companies_updated']} updated, {stats['companies_removed']} removed"
+    )
+    return stats
+
+
+def get_company_name_variations(company_id):
+    """
+    Resolve a normalized company_id to (primary_name, [raw name variants]).
+    Returns (None, []) if no company matches.
+
+    Normally a single primary-key lookup. If the directory has no row yet (e.g. data
+    loaded by a path that doesn't maintain it), fall back to the indexed
+    company_name_norm column and store the result so the next lookup is direct. Ids
+    with no components at all are cached as misses for COMPANY_MISS_CACHE_TTL.
+    """
+    company = Company.objects.filter(company_id=company_id).first()
+    if company is not None:
+        return company.primary_name, company.variant_names
+
+    miss_key = versioned_cache_key("company_miss", company_id)
+    if cache.get(miss_key) == COMPANY_MISS:
+        return None, []
+
+    logger.info(f"Company '{company_id}' not in directory, falling back to component lookup")
+    matching_names = list(
+        Component.objects.filter(company_name_norm=company_id)
+        .exclude(company_name__isnull=True)
+        .values_list("company_name", flat=True).distinct().order_by()
+    )
+    if not matching_names:
+        cache.set(miss_key, COMPANY_MISS, COMPANY_MISS_CACHE_TTL)
+        return None, []
+
+    try:
+        refresh_company_directory(matching_names)
+        company = Company.objects.filter(company_id=company_id).first()
+        if company is not None:
+            return company.primary_name, company.variant_names
+    except Exception as e:
+        logger.error(f"Error adding '{company_id}' to the company directory: {e}")
+
+    return matching_names[0], matching_names
+
+
+def get_company_summaries(company_names):
+    """
+    Component count, distinct CMU count and a sample of CMU IDs for each raw company name.
+
+    Returns {company_name: {"component_count", "cmu_count", "cmu_ids"}} for the names that
+    have components. Cached names come from one get_many; the rest are answered by a
+    single grouped (company_name, cmu_id) query instead of per-company exists/count calls.
+    """
+    company_names = list(dict.fromkeys(name for name in company_names if name))
+    if not company_names:
+        return {}
+
+    cache_keys = {versioned_cache_key("company_summary", name): name for name in company_names}
+    keys_by_name = {name: key for key, name in cache_keys.items()}
+    cached = cache.get_many(list(cache_keys.keys()))
+    summaries = {cache_keys[key]: summary for key, summary in cached.items()}
+
+    missing = [name for name in company_names if name not in summaries]
+    if missing:
+        rows = (
+            Component.objects.filter(company_name__in=missing)
+            .values("company_name", "cmu_id")
+            .annotate(count=Count("id"))
+            .order_by("company_name", "cmu_id")
+        )
+        fetched = {}
+        for row in rows:
+            summary = fetched.setdefault(row["company_name"], {"component_count": 0, "cmu_count": 0, "cmu_ids": []})
+            summary["component_count"] += row["count"]
+            if row["cmu_id"]:
+                summary["cmu_count"] += 1
+                if len(summary["cmu_ids"]) < COMPANY_SUMMARY_CMU_SAMPLE:
+                    summary["cmu_ids"].append(row["cmu_id"])
+
+        # Cache misses too (as empty summaries) so unknown names don't hit the database again
+        empty = {"component_count": 0, "cmu_count": 0, "cmu_ids": []}
+        cache.set_many(
+            {keys_by_name[name]: fetched.get(name, empty) for name in missing},
+            COMPANY_SUMMARY_CACHE_TTL,
+        )
+        summaries.update(fetched)
+
+    return {name: summary for name, summary in summaries.items() if summary["component_count"]}
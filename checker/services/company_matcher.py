@@ -0,0 +1,128 @@
+"""
+Long-lived fuzzy matcher for company-name suggestions.
+
+The old _perform_company_search rebuilt the list of normalized names from the cmu_df
+DataFrame, ran process.extract(limit=None) and then rescored every row with
+DataFrame.apply on each request. This matcher holds the deduplicated normalized names
+(and the raw spellings / CMU IDs behind each) once per process and scores a query
+against all of them in a single multi-threaded rapidfuzz.process.cdist call.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from rapidfuzz import fuzz, process
+
+from ..utils import normalize
+
+logger = logging.getLogger(__name__)
+
+# Rebuild the name list after this many seconds so new companies show up
+MATCHER_TTL = getattr(settings, 'COMPANY_MATCHER_TTL_SECONDS', 900)
+
+# rapidfuzz worker threads for cdist (-1 = all cores)
+MATCHER_WORKERS = getattr(settings, 'COMPANY_MATCHER_WORKERS', -1)
+
+# Same scorer/cutoff the DataFrame search used
+DEFAULT_SCORER = fuzz.partial_token_set_ratio
+DEFAULT_SCORE_CUTOFF = 70
+
+
+class CompanyNameMatcher:
+    """Deduplicated normalized company names with their raw spellings and CMU IDs."""
+
+    def __init__(self, rows):
+        """rows: iterable of (company_name, cmu_id) pairs."""
+        positions = {}
+        self.norm_names = []
+        self.display_names = []  # per norm name: raw spellings in first-seen order
+        self.cmu_ids = []        # per norm name: CMU IDs in first-seen order
+
+        for company_name, cmu_id in rows:
+            norm_name = normalize(company_name)
+            if not norm_name:
+                continue
+            pos = positions.get(norm_name)
+            if pos is None:
+                pos = positions[norm_name] = len(self.norm_names)
+                self.norm_names.append(norm_name)
+                self.display_names.append([])
+                self.cmu_ids.append([])
+            if company_name not in self.display_names[pos]:
+                self.display_names[pos].append(company_name)
+            if cmu_id and cmu_id not in self.cmu_ids[pos]:
+                self.cmu_ids[pos].append(cmu_id)
+
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        from ..models import Component
+
+        start_time = time.time()
+        rows = (
+            Component.objects.exclude(company_name__isnull=True).exclude(company_name="")
+            .values_list('company_name', 'cmu_id').distinct().order_by('company_name', 'cmu_id')
+        )
+        matcher = cls(rows.iterator(chunk_size=5000))
+        logger.info(f"Built company name matcher with {len(matcher.norm_names)} names in {time.time() - start_time:.2f}s")
+        return matcher
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at >= MATCHER_TTL
+
+    def match(self, query, limit=50, score_cutoff=DEFAULT_SCORE_CUTOFF, scorer=DEFAULT_SCORER):
+        """
+        Top `limit` companies for `query`, best first, as dicts with keys
+        norm_name, names (raw spellings), cmu_ids and score.
+        """
+        norm_query = normalize(query)
+        if not norm_query or not self.norm_names:
+            return []
+
+        # One row of scores against every name; entries below the cutoff come back as 0
+        scores = process.cdist(
+            [norm_query], self.norm_names, scorer=scorer,
+            score_cutoff=score_cutoff, dtype=np.uint8, workers=MATCHER_WORKERS,
+        )[0]
+
+        candidates = np.flatnonzero(scores >= score_cutoff)
+        # Highest score first, ties in name order (candidates are already in name order,
+        # so a stable sort on the negated score keeps them that way)
+        order = np.argsort(-scores[candidates].astype(np.int16), kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        candidates = candidates[order]
+
+        return [
+            {
+                "norm_name": self.norm_names[pos],
+                "names": self.display_names[pos],
+                "cmu_ids": self.cmu_ids[pos],
+                "score": int(scores[pos]),
+            }
+            for pos in candidates
+        ]
+
+    def match_names(self, query, limit=50, **kwargs):
+        """Raw company names for the top matches, best first (what the search pages list)."""
+        names = []
+        for match in self.match(query, limit=limit, **kwargs):
+            names.extend(match["names"])
+        return names[:limit] if limit is not None else names
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_company_matcher():
+    """Return the process-wide matcher, (re)building it when missing or older than MATCHER_TTL."""
+    global _matcher
+    if _matcher is None or _matcher.is_stale():
+        with _matcher_lock:
+            if _matcher is None or _matcher.is_stale():
+                _matcher = CompanyNameMatcher.from_database()
+    return _matcher
@@ -1,4 +1,3 @@
-import pandas as pd
 import urllib.parse
 import logging
 import time
@@ -9,12 +8,11 @@ from django.core.cache import cache
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 import requests
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 import re
 from django.db.models import Count, Value
 from django.db.models.functions import Coalesce
 from ..models import Component
-from rapidfuzz import fuzz, process
+from rapidfuzz import fuzz
 
 from ..utils import (
     normalize,
@@ -24,17 +22,21 @@ from ..utils import (
     from_url_param,
 )
 from .data_access import (
-    get_cmu_dataframe,
     fetch_components_for_cmu_id,
     get_component_data_from_json,
     save_component_data_to_json,
 )
+from .search_backends import get_search_backend
+from .company_directory import get_company_name_variations, get_company_summaries
+from .company_matcher import get_company_matcher
+from .cmu_lookup import get_cmu_lookup
+from .pagination import CountingPaginator, KeysetPaginator, COUNT_MODE_ESTIMATE
+from .data_version import versioned_cache_key
 
 logger = logging.getLogger(__name__)
 
 # --- Moved imports here ---
 from django.db.models import Q, Count, Value
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from ..models import Component
 from ..utils import normalize # Ensure utils are imported too
 # --- End moved imports ---
@@ -107,8 +109,9 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                 
                 # Try istartswith first (faster)
                 logger.debug(f"Attempting DB istartswith query for '{query}'")
+                search_backend = get_search_backend()
                 db_candidate_companies_qs = Component.objects.filter(
-                    company_name__istartswith=query
+                    search_backend.startswith_filter(query, 'company_name')
                 ).values_list('company_name', flat=True).distinct()[:db_limit]
                 db_candidate_companies = list(db_candidate_companies_qs)
                 logger.info(f"DB istartswith found {len(db_candidate_companies)} candidates.")
@@ -117,28 +120,19 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                 if not db_candidate_companies:
                     logger.debug(f"No results via istartswith, falling back to icontains for '{query}'")
                     db_candidate_companies_qs = Component.objects.filter(
-                        company_name__icontains=query
+                        search_backend.contains_filter(query, ['company_name'])
                     ).values_list('company_name', flat=True).distinct()[:db_limit]
                     db_candidate_companies = list(db_candidate_companies_qs)
                     logger.info(f"DB icontains found {len(db_candidate_companies)} candidates.")
                     
                 # --- Fuzzy Search for Candidates --- 
+                # The matcher keeps the normalized names in memory, so no DataFrame is needed
                 fuzzy_candidate_companies = []
-                cmu_df = None # Initialize cmu_df
-                df_api_time = 0
                 try:
-                    cmu_df, df_api_time = get_cmu_dataframe()
-                    api_time += df_api_time
-                    if cmu_df is not None:
-                        # Limit the number of fuzzy matches considered initially
-                        # Note: _perform_company_search already returns sorted by score
-                        fuzzy_limit = 50 
-                        fuzzy_matches_df = _perform_company_search(cmu_df, query)
-                        if not fuzzy_matches_df.empty:
-                            fuzzy_candidate_companies = fuzzy_matches_df['Full Name'].unique().tolist()[:fuzzy_limit]
-                            logger.info(f"Fuzzy search (_perform_company_search) found {len(fuzzy_candidate_companies)} unique candidates (limited to {fuzzy_limit}).")
-                        else:
-                            logger.error("CMU DataFrame not available for fuzzy search.")
+                    # Limit the number of fuzzy matches considered initially (returned best first)
+                    fuzzy_limit = 50 
+                    fuzzy_candidate_companies = get_company_matcher().match_names(query, limit=fuzzy_limit)
+                    logger.info(f"Fuzzy search (company matcher) found {len(fuzzy_candidate_companies)} unique candidates (limited to {fuzzy_limit}).")
                 except Exception as fuzzy_e:
                     logger.error(f"Error during fuzzy company search step: {fuzzy_e}")
                 
@@ -171,20 +165,9 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                     # --- Build links for the top N --- 
                     if unique_top_companies:
                         try:
-                            # Ensure cmu_df is loaded if it wasn't during fuzzy search or failed
-                            if cmu_df is None:
-                                logger.debug("CMU DataFrame was not loaded previously or failed, attempting to load now...")
-                                cmu_df, df_api_time = get_cmu_dataframe()
-                                api_time += df_api_time
-                                if cmu_df is None:
-                                    logger.error("Failed to load CMU DataFrame for building links.")
-                                    # Skip building links if DF is unavailable
-                                    raise ValueError("CMU DataFrame could not be loaded.") 
-                                
-                            # Proceed only if cmu_df is available
-                            logger.debug(f"Building links for {len(unique_top_companies)} companies using loaded CMU DataFrame.")
+                            logger.debug(f"Building links for {len(unique_top_companies)} companies using the CMU lookup.")
                             results_dict, render_time_links_ = _build_search_results(
-                                cmu_df, unique_top_companies, sort_order, query, cmu_limit=3, add_debug_info=True
+                                unique_top_companies, sort_order, query, add_debug_info=True
                             )
                             company_links = results_dict.get(query, [])
                             company_link_count = len(company_links)
@@ -216,7 +199,7 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                 # Check if the search is specifically for a CMU ID
                 if search_type == 'cmu' and query:
                     logger.info(f"CMU ID specific search detected for query: '{query}'. Applying exact match filter.")
-                    component_query_filter = Q(cmu_id__iexact=query)
+                    component_query_filter = Q(cmu_id_norm=normalize(query))
                     # Optionally disable company search if only CMU results are needed
                     # company_links = [] 
                     # company_link_count = 0
@@ -226,14 +209,12 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                     component_terms = query.split()
                     for term in component_terms:
                         if len(term) >= 2:
-                            term_filter = (
-                                Q(location__icontains=term) | Q(description__icontains=term) |
-                                Q(technology__icontains=term) | Q(company_name__icontains=term) |
-                                Q(cmu_id__icontains=term) # Keep icontains here for general search
+                            # Substring match on every searchable field (index-backed where the backend allows)
+                            component_query_filter |= search_backend.contains_filter(
+                                term, ['location', 'description', 'technology', 'company_name', 'cmu_id']
                             )
-                            component_query_filter |= term_filter
                     # Add exact CMU ID match as well for general search
-                    component_query_filter |= Q(cmu_id__iexact=query)
+                    component_query_filter |= Q(cmu_id_norm=normalize(query))
                 
                 if not component_query_filter:
                      logger.warning("Component query filter is empty. No components searched.")
@@ -243,20 +224,22 @@ def search_companies_service(request, extra_context=None, return_data_only=False
                     logger.warning(f"Attempting component query with filter: {component_query_filter}")
                     comp_sort_prefix = '-' if comp_sort_order == 'desc' else ''
                     comp_django_sort_field = f'{comp_sort_prefix}delivery_year'
-                    all_components = Component.objects.filter(component_query_filter).order_by(comp_django_sort_field).distinct()
-                    component_count = all_components.count()
-                    logger.warning(f"Component query found {component_count} components.")
-
-                # Pagination for Components
-                if component_count > 0:
-                    paginator = Paginator(all_components, per_page)
-                    try:
-                        page_obj = paginator.page(page)
-                    except PageNotAnInteger: page_obj = paginator.page(1)
-                    except EmptyPage: page_obj = paginator.page(paginator.num_pages)
-                else:
-                    paginator = None
-                    page_obj = None # Ensure page_obj is None if no components
+                    # Single-table filter, so rows are already unique (no DISTINCT)
+                    all_components = Component.objects.filter(component_query_filter).order_by(comp_django_sort_field, 'pk')
+
+                # Pagination for Components: page rows and total in one query, with the
+                # total estimated/capped for very broad searches
+                paginator = None
+                page_obj = None # Ensure page_obj is None if no components
+                component_count = 0
+                if component_query_filter:
+                    paginator = CountingPaginator(all_components, per_page, count_mode=COUNT_MODE_ESTIMATE)
+                    page_obj = paginator.get_page(page)
+                    component_count = paginator.count
+                    logger.warning(f"Component query found {paginator.display_count} components.")
+                    if component_count == 0:
+                        paginator = None
+                        page_obj = None
 
                 api_time = time.time() - start_time
                 logger.warning(f"Successfully completed {search_method}. API time: {api_time:.4f}s")
@@ -343,75 +326,18 @@ def search_companies_service(request, extra_context=None, return_data_only=False
 # --- End of search_companies_service ---
 
 
-def _perform_company_search(cmu_df, query):
-    """
-    Perform fuzzy search for companies based on the query using RapidFuzz.
-    Uses token_set_ratio for flexibility with extra words.
-    Returns a DataFrame of matching records, sorted by score.
-    """
-    logger = logging.getLogger(__name__)
-    min_score = 70
-    scorer = fuzz.partial_token_set_ratio
-    norm_query = normalize(query) # Normalize the incoming query
-
-    # Prepare choices for fuzzy matching
-    company_names = cmu_df["Normalized Full Name"].dropna().unique().tolist()
-
-    # --- DEBUG --- 
-    logger.debug(f"Normalized search query: '{norm_query}'")
-    sample_size = min(10, len(company_names))
-    logger.debug(f"Performing fuzzy match against {len(company_names)} unique normalized company names. Sample: {company_names[:sample_size]}")
-    # --- END DEBUG ---
-
-    # Perform fuzzy search
-    matches_list = process.extract(
-        norm_query, company_names, scorer=scorer, score_cutoff=min_score, limit=None
-    )
-    logger.debug(f"Fuzzy matches list found (score >= {min_score}): {matches_list}")
-
-    if not matches_list:
-        logger.info(f"No companies found for query '{query}' (normalized: '{norm_query}') with score >= {min_score}")
-        return pd.DataFrame(columns=cmu_df.columns)
-
-    # Build score dictionary and filter DataFrame
-    matches_with_scores = {match[0]: match[1] for match in matches_list}
-    matched_norm_names = set(matches_with_scores.keys())
-    
-    potential_matches_df = cmu_df[cmu_df["Normalized Full Name"].isin(matched_norm_names)]
-    potential_matches_df = potential_matches_df.drop_duplicates(subset=["Full Name"])
-
-    # Add score
-    def get_score(row):
-        return matches_with_scores.get(row["Normalized Full Name"], 0)
-
-    if potential_matches_df.empty:
-        return potential_matches_df
-    else:
-        potential_matches_df = potential_matches_df.copy()
-        potential_matches_df['match_score'] = potential_matches_df.apply(get_score, axis=1)
-        # Keep only matches > 0 (should always be true here)
-        potential_matches_df = potential_matches_df[potential_matches_df['match_score'] > 0]
-
-    # Sort
-    final_sorted_df = potential_matches_df.sort_values(by='match_score', ascending=False).reset_index(drop=True)
-
-    logger.info(f"Found and sorted {len(final_sorted_df)} companies with score >= {min_score} for query '{query}'")
-    return final_sorted_df
-
-
 def _build_search_results(
-    cmu_df, unique_companies, sort_order, query, cmu_limit=5, add_debug_info=False
+    unique_companies, sort_order, query, cmu_limit=3, add_debug_info=False
 ):
     """
     Build search results for companies.
     Returns a dictionary with query as key and list of formatted company links as values.
 
     Args:
-        cmu_df: DataFrame with CMU data
         unique_companies: List of company names to include
         sort_order: Sort order for years ('asc' or 'desc')
         query: Original search query
-        cmu_limit: Maximum number of CMU IDs to check per company (default: 5)
+        cmu_limit: Number of CMU IDs to list per company before "and N more" (default: 3)
         add_debug_info: Whether to log debug information
 
     Returns:
@@ -429,6 +355,15 @@ def _build_search_results(
         return results, 0.0 # Match return signature (results, render_time)
     # --- END FIX ---
 
+    lookup = get_cmu_lookup()
+
+    # Component / CMU counts for every company in one grouped query (cached briefly)
+    try:
+        company_summaries = get_company_summaries(unique_companies)
+    except Exception as e:
+        logger.warning(f"Company summary query failed for '{query}': {e}")
+        company_summaries = {}
+
     # Debug info for component retrieval
     debug_info = {
         "company_count": company_count,
@@ -453,126 +388,36 @@ def _build_search_results(
         # --- END ADDED ---
 
         # Get all CMU IDs for this company
-        company_records = cmu_df[cmu_df["Full Name"] == company]
-        # --- DEBUG: Log shape of slice passed to _organize_year_data ---
-        logger.debug(f"_build_search_results: Processing company '{company}'. Records slice shape: {company_records.shape}")
-        # --- END DEBUG ---
-        cmu_ids = company_records["CMU ID"].unique().tolist()
+        company_rows = lookup.rows_for_companies([company])
+        logger.debug(f"_build_search_results: Processing company '{company}'. {len(company_rows)} CMU rows.")
+        cmu_ids = lookup.cmu_ids(company_rows)
 
         debug_info["total_cmu_ids"] += len(cmu_ids)
 
         # Organize years from the records
-        year_data = _organize_year_data(company_records, sort_order)
+        year_data = _organize_year_data(lookup.year_auction_pairs(company_rows), sort_order)
 
         if year_data:
             debug_info["companies_with_years"] += 1
 
-            # Check if any CMU has components, but limit the search to avoid timeouts
-            has_components = False
-            company_component_count = 0
-            cmu_ids_checked = 0
-
-            try:
-                # Use a direct database query to get component counts
-                from ..models import Component
-
-                # First, check if ANY components exist for this company name
-                if Component.objects.filter(company_name=company).exists():
-                    has_components = True
-                    # Get count from database
-                    company_component_count = Component.objects.filter(
-                        company_name=company
-                    ).count()
-                    # Get count of CMU IDs
-                    cmu_count_db = (
-                        Component.objects.filter(company_name=company)
-                        .values("cmu_id")
-                        .distinct()
-                        .count()
-                    )
-                    debug_info["companies_with_components"] += 1
-                else:
-                    # Only check a limited number of CMU IDs for components
-                    cmu_ids_to_check = cmu_ids[: min(cmu_limit, len(cmu_ids))]
-
-                    for cmu_id in cmu_ids_to_check:
-                        cmu_ids_checked += 1
-                        # Check if this CMU has components
-                        if Component.objects.filter(cmu_id=cmu_id).exists():
-                            has_components = True
-                            # Get an approximation of component count
-                            count = Component.objects.filter(cmu_id=cmu_id).count()
-                            company_component_count += count
-
-                        # If we found components already, no need to check more CMU IDs
-                        if has_components and company_component_count > 0:
-                            debug_info["companies_with_components"] += 1
-                            break
-            except Exception as e:
-                # If database check fails, fall back to JSON check
-                logger.warning(f"Database component check failed for {company}: {e}")
-
-                # Only check a limited number of CMU IDs for components
-                cmu_ids_to_check = cmu_ids[: min(cmu_limit, len(cmu_ids))]
-
-                for cmu_id in cmu_ids_to_check:
-                    cmu_ids_checked += 1
-                    # Check if this CMU has components
-                    try:
-                        from ..models import Component
-
-                        if Component.objects.filter(cmu_id=cmu_id).exists():
-                            has_components = True
-                            company_component_count += Component.objects.filter(
-                                cmu_id=cmu_id
-                            ).count()
-                            break
-                    except:
-                        # If that fails, try the JSON method
-                        try:
-                            components = get_component_data_from_json(cmu_id)
-                            if components:
-                                has_components = True
-                                company_component_count += len(components)
-                                break
-                        except:
-                            # If both methods fail, continue to the next CMU ID
-                            continue
-
-                if has_components:
-                    debug_info["companies_with_components"] += 1
-
-            debug_info["total_components"] += company_component_count
+            summary = company_summaries.get(company)
+            if summary:
+                debug_info["companies_with_components"] += 1
+                debug_info["total_components"] += summary["component_count"]
+                component_info = f"{summary['component_count']} components across {summary['cmu_count']} CMU IDs"
+                sample_cmu_ids, cmu_id_count = summary["cmu_ids"], summary["cmu_count"]
+            else:
+                # No components stored under this name; show that we have CMU IDs at least
+                component_info = f"{len(cmu_ids)} CMU IDs found"
+                sample_cmu_ids, cmu_id_count = cmu_ids, len(cmu_ids)
 
             # Generate a simple blue link for the company
             company_html = f'<a href="/company/{normalized_company_id}/" style="color: blue; text-decoration: underline;">{company}</a>'
 
-            # Add additional information about CMU IDs and components count
-            if len(cmu_ids) <= 3:
-                cmu_ids_str = ", ".join(cmu_ids)
-            else:
-                cmu_ids_str = ", ".join(cmu_ids[:3])
-                cmu_ids_str += f" and {len(cmu_ids) - 3} more"
-
-            # If we didn't find components, show that we have CMU IDs at least
-            if not has_components:
-                if cmu_ids_checked < len(cmu_ids):
-                    # Indicate we only checked some CMU IDs
-                    component_info = (
-                        f"{len(cmu_ids)} CMU IDs found (checked {cmu_ids_checked})"
-                    )
-                else:
-                    component_info = f"{len(cmu_ids)} CMU IDs found"
-            else:
-                # Show approximate component count
-                if "cmu_count_db" in locals():
-                    # If we have the DB count, show that
-                    component_info = f"{company_component_count} components across {cmu_count_db} CMU IDs"
-                else:
-                    # Otherwise estimate based on what we checked
-                    component_info = (
-                        f"At least {company_component_count} components found"
-                    )
+            # Add additional information about CMU IDs
+            cmu_ids_str = ", ".join(sample_cmu_ids[:cmu_limit])
+            if cmu_id_count > cmu_limit:
+                cmu_ids_str += f" and {cmu_id_count - cmu_limit} more"
 
             company_html_with_details = f"""
             <div>
@@ -639,6 +484,32 @@ def _build_company_card_html(company_name, company_id, year_auction_data):
     )
 
 
+# Auction accordions are reopened often; the component tree changes only on ingest
+AUCTION_TREE_CACHE_TTL = 600
+
+# Columns the auction component lists render
+AUCTION_TREE_FIELDS = (
+    "id", "cmu_id", "location", "description", "technology",
+    "component_id", "derated_capacity_mw",
+)
+
+
+def build_auction_component_tree(component_filter):
+    """
+    Fetch the components matching component_filter in one ordered query and group them
+    as {cmu_id: {location: [component dict, ...]}} (CMU IDs and locations in sorted order).
+    """
+    tree = {}
+    rows = (
+        Component.objects.filter(component_filter)
+        .values(*AUCTION_TREE_FIELDS)
+        .order_by("cmu_id", "location", "id")
+    )
+    for row in rows:
+        tree.setdefault(row["cmu_id"], {}).setdefault(row["location"], []).append(row)
+    return tree
+
+
 def auction_components(request, company_id, year, auction_name):
     """
     API endpoint for fetching components for a specific auction
@@ -647,8 +518,9 @@ def auction_components(request, company_id, year, auction_name):
     from django.db.models import Q
     import logging
     import traceback
-    from ..models import Component
+    from ..models import Component, Company
     from ..utils import normalize, from_url_param
+    from .company_directory import get_company_name_variations
 
     logger = logging.getLogger(__name__)
     logger.info(
@@ -660,26 +532,14 @@ def auction_components(request, company_id, year, auction_name):
     auction_name = from_url_param(auction_name)
 
     try:
-        # Find company name
-        company_query = Component.objects.values("company_name").distinct()
-        company_name = None
-
-        for company in company_query:
-            curr_name = company["company_name"]
-            if curr_name and normalize(curr_name) == company_id:
-                company_name = curr_name
-                break
+        # Find company name variations from the company directory
+        company_name, company_name_variations = get_company_name_variations(company_id)
 
         if not company_name:
-            # Try a more flexible match
-            for company in company_query:
-                curr_name = company["company_name"]
-                if curr_name and (
-                    company_id in normalize(curr_name)
-                    or normalize(curr_name) in company_id
-                ):
-                    company_name = curr_name
-                    break
+            # Try a more flexible match against the directory ids
+            company = Company.objects.filter(company_id__contains=company_id).first()
+            if company is not None:
+                company_name, company_name_variations = company.primary_name, company.variant_names
 
         if not company_name:
             return HttpResponse(
@@ -689,7 +549,7 @@ def auction_components(request, company_id, year, auction_name):
         logger.info(f"Found company: {company_name}")
 
         # Build a more flexible query for components
-        query = Q(company_name=company_name)
+        query = Q(company_name__in=company_name_variations)
 
         # Add year filter with flexible matching
         if year:
@@ -728,17 +588,24 @@ def auction_components(request, company_id, year, auction_name):
 
             query &= auction_query
 
-        # Get matching components
-        components = Component.objects.filter(query)
-
-        # Get all unique CMU IDs
-        cmu_ids = components.values("cmu_id").distinct()
+        # One ordered fetch grouped into CMU -> location -> components (cached per company/year/auction)
+        cache_key = versioned_cache_key("auction_component_tree", f"{company_id}|{year}|{auction_name}")
+        tree = cache.get(cache_key)
+        if tree is None:
+            tree = build_auction_component_tree(query)
+            cache.set(cache_key, tree, AUCTION_TREE_CACHE_TTL)
+
+        component_count = sum(
+            len(location_components)
+            for locations in tree.values()
+            for location_components in locations.values()
+        )
 
         logger.info(
-            f"Found {components.count()} components across {cmu_ids.count()} CMU IDs"
+            f"Found {component_count} components across {len(tree)} CMU IDs"
         )
 
-        if components.count() == 0:
+        if component_count == 0:
             return HttpResponse(
                 f"""
                 <div class='alert alert-warning'>
@@ -755,21 +622,16 @@ def auction_components(request, company_id, year, auction_name):
 
         # Generate HTML with the matching components
         html = f"<div class='component-results mb-3'>"
-        html += f"<div class='alert alert-info'>Found {components.count()} components across {cmu_ids.count()} CMU IDs</div>"
+        html += f"<div class='alert alert-info'>Found {component_count} components across {len(tree)} CMU IDs</div>"
 
         # Group by CMU ID
         html += "<div class='row'>"
 
-        for cmu_id_obj in cmu_ids:
-            cmu_id = cmu_id_obj["cmu_id"]
+        for cmu_id, locations in tree.items():
             if not cmu_id:
                 continue
 
-            # Get components for this CMU ID
-            cmu_components = components.filter(cmu_id=cmu_id)
-
-            # Get all locations for this CMU
-            locations = cmu_components.values("location").distinct()
+            cmu_component_count = sum(len(location_components) for location_components in locations.values())
 
             # Format component records for the template
             cmu_html = f"""
@@ -780,24 +642,20 @@ def auction_components(request, company_id, year, auction_name):
                             <span>CMU ID: <strong>{cmu_id}</strong></span>
                             <a href="/components/?q={cmu_id}" class="btn btn-sm btn-info">View Components</a>
                         </div>
-                        <div class="small text-muted mt-1">Found {cmu_components.count()} components</div>
+                        <div class="small text-muted mt-1">Found {cmu_component_count} components</div>
                     </div>
                     <div class="card-body">
-                        <p><strong>Components:</strong> {cmu_components.count()}</p>
+                        <p><strong>Components:</strong> {cmu_component_count}</p>
             """
 
             # Add locations list
             if locations:
                 cmu_html += "<ul class='list-unstyled'>"
 
-                for location_obj in locations:
-                    location = location_obj["location"]
+                for location, location_components in locations.items():
                     if not location:
                         continue
 
-                    # Add components at this location
-                    location_components = cmu_components.filter(location=location)
-
                     # Create component ID for linking
                     component_id = f"{cmu_id}_{normalize(location)}"
 
@@ -806,14 +664,14 @@ def auction_components(request, company_id, year, auction_name):
 
                     cmu_html += f"""
                         <li class="mb-2">
-                            <strong>{location_html}</strong> <span class="text-muted">({location_components.count()} components)</span>
+                            <strong>{location_html}</strong> <span class="text-muted">({len(location_components)} components)</span>
                             <ul class="ms-3">
                     """
 
                     # Add description of components
                     for component in location_components:
-                        desc = component.description or "No description"
-                        tech = component.technology or ""
+                        desc = component["description"] or "No description"
+                        tech = component["technology"] or ""
 
                         cmu_html += f"""
                             <li><i>{desc}</i>{f" - {tech}" if tech else ""}</li>
@@ -897,32 +755,29 @@ def get_company_years(company_id, year, auction_name=None):
     Get year details for a company.
     This function is used by the HTMX endpoint to load year details lazily.
     """
-    cmu_df, _ = get_cmu_dataframe()
-
-    if cmu_df is None:
+    try:
+        lookup = get_cmu_lookup()
+    except Exception as e:
+        logger.error(f"Error building CMU lookup: {e}")
         return "<div class='alert alert-danger'>Error loading CMU data</div>"
 
-    company_name = None
-    for _, row in cmu_df.iterrows():
-        if normalize(row.get("Full Name", "")) == company_id:
-            company_name = row.get("Full Name")
-            break
+    company_name, company_name_variations = get_company_name_variations(company_id)
 
     if not company_name:
         return f"<div class='alert alert-warning'>Company not found: {company_id}</div>"
 
-    company_records = cmu_df[cmu_df["Full Name"] == company_name]
-    year_records = company_records[company_records["Delivery Year"] == year]
+    company_rows = lookup.rows_for_companies(company_name_variations)
+    year_rows = lookup.filter_rows(company_rows, year=year)
 
-    if year_records.empty:
+    if not year_rows:
         return f"<div class='alert alert-info'>No CMUs found for {company_name} in {year}</div>"
 
-    if auction_name and "Auction Name" in year_records.columns:
-        year_records = year_records[year_records["Auction Name"] == auction_name]
-        if year_records.empty:
+    if auction_name:
+        year_rows = lookup.filter_rows(year_rows, auction_name=auction_name)
+        if not year_rows:
             return f"<div class='alert alert-info'>No CMUs found for {company_name} in {year} with auction {auction_name}</div>"
 
-    cmu_ids = year_records["CMU ID"].unique().tolist()
+    cmu_ids = lookup.cmu_ids(year_rows)
     debug_info = f"Found {len(cmu_ids)} CMU IDs for {company_name} in {year}"
     if auction_name:
         debug_info += f" (Auction: {auction_name})"
@@ -1094,7 +949,6 @@ def get_cmu_details(cmu_id):
 
 def company_detail(request, company_id):
     """Displays details for a specific company, including years, auctions, and potentially components."""
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
     from ..models import Component
     from django.db.models import Sum  # Import Sum
 
@@ -1109,7 +963,7 @@ def company_detail(request, company_id):
     sort_order_provided = "sort" in request.GET 
     # Get sort order, default to 'asc' initially
     sort_order = request.GET.get("sort", "asc")  
-    page = request.GET.get("page", 1)
+    cursor = request.GET.get("cursor")
     per_page = 50  # Components per page for capacity and all_components views
 
     # Override default sort order to 'desc' for year_auction view if not provided
@@ -1150,17 +1004,8 @@ def company_detail(request, company_id):
     start_time = time.time()
 
     # Find all company name variations based on the normalized company_id
-    # (This logic might need adjustment if company_id isn't the normalized name)
-    all_db_company_names = Component.objects.values_list(
-        "company_name", flat=True
-    ).distinct()
-    company_name_variations = []
-    primary_company_name = None
-    for name in all_db_company_names:
-        if name and normalize(name) == company_id:
-            company_name_variations.append(name)
-            if primary_company_name is None:
-                primary_company_name = name
+    # (one lookup in the company directory)
+    primary_company_name, company_name_variations = get_company_name_variations(company_id)
 
     if not company_name_variations:
         context["error"] = (
@@ -1181,14 +1026,11 @@ def company_detail(request, company_id):
                     "auction_name",  # Removed auction_type as it's not a direct field
                 )
                 .distinct()
+                .order_by()
+            )
+            context["year_auction_data"] = _organize_year_data(
+                company_records.values_list("delivery_year", "auction_name"), sort_order
             )
-            # Convert queryset to DataFrame for processing - might be inefficient for large sets
-            # Consider direct DB aggregation if performance is an issue
-            if company_records.exists():
-                df = pd.DataFrame(list(company_records))
-                context["year_auction_data"] = _organize_year_data(df, sort_order)
-            else:
-                context["year_auction_data"] = []
 
         elif view_mode == "capacity":
             # Existing logic for capacity view
@@ -1196,24 +1038,16 @@ def company_detail(request, company_id):
                 company_name__in=company_name_variations
             ).exclude(derated_capacity_mw__isnull=True)
 
-            # Apply sorting
-            order_direction = "-" if sort_order == "desc" else ""
-            components_query = components_query.order_by(
-                f"{order_direction}derated_capacity_mw", "delivery_year"
+            # Keyset pagination on (derated_capacity_mw, id)
+            paginator = KeysetPaginator(
+                components_query, per_page, "derated_capacity_mw",
+                descending=sort_order == "desc",
             )
-
-            total_count = components_query.count()
-            paginator = Paginator(components_query, per_page)
-            try:
-                page_obj = paginator.page(page)
-            except PageNotAnInteger:
-                page_obj = paginator.page(1)
-            except EmptyPage:
-                page_obj = paginator.page(paginator.num_pages)
+            page_obj = paginator.get_page(cursor)
 
             context["page_obj"] = page_obj
             context["paginator"] = paginator
-            context["total_count"] = total_count
+            context["total_count"] = page_obj.total_count or 0
 
         elif view_mode == "all_components":
             # NEW Logic for all_components view
@@ -1221,26 +1055,17 @@ def company_detail(request, company_id):
                 company_name__in=company_name_variations
             )
 
-            # Apply sorting based on sort_field and sort_order
-            order_direction = "-" if sort_order == "desc" else ""
-            # Add nulls_last/nulls_first if needed depending on DB and field type
-            if sort_field:
-                components_query = components_query.order_by(
-                    f"{order_direction}{sort_field}"
-                )
-
-            total_count = components_query.count()
-            paginator = Paginator(components_query, per_page)
-            try:
-                page_obj = paginator.page(page)
-            except PageNotAnInteger:
-                page_obj = paginator.page(1)
-            except EmptyPage:
-                page_obj = paginator.page(paginator.num_pages)
+            # Keyset pagination on (sort_field, id); rows with no value for the
+            # sort field come last in either direction
+            paginator = KeysetPaginator(
+                components_query, per_page, sort_field,
+                descending=sort_order == "desc",
+            )
+            page_obj = paginator.get_page(cursor)
 
             context["page_obj"] = page_obj
             context["paginator"] = paginator
-            context["total_count"] = total_count
+            context["total_count"] = page_obj.total_count or 0
 
     except Exception as e:
         logger.error(
@@ -1257,45 +1082,26 @@ def company_detail(request, company_id):
     return render(request, "checker/company_detail.html", context)
 
 
-def _organize_year_data(company_records, sort_order):
+def _organize_year_data(year_auction_pairs, sort_order):
     """
     Organize year data for a company.
-    Returns a list of year objects with auctions.
+    Takes (delivery_year, auction_name) pairs (from the CMU lookup or a values_list query)
+    and returns a list of year objects with auctions.
     """
-    # --- DEBUG: Log input DataFrame ---
-    logger.debug(f"_organize_year_data: Input DF shape: {company_records.shape}")
-    try:
-        logger.debug(f"_organize_year_data: Input DF head:\n{company_records.head().to_string()}")
-    except Exception: logger.debug("_organize_year_data: Could not log input DF head")
-    # --- END DEBUG ---
-
     year_auctions = {}
-    for index, row in company_records.iterrows():
-        # --- FIX: Handle both Title Case and lowercase field names ---
-        year = str(row.get("Delivery Year", row.get("delivery_year", ""))) # Check both
-        auction = str(row.get("Auction Name", row.get("auction_name", ""))) # Check both
-        # --- END FIX ---
-        # --- DEBUG: Log extracted values ---
-        logger.debug(f"_organize_year_data: Row {index} - Extracted Year: '{year}', Auction: '{auction}'")
-        # --- END DEBUG ---
+    for year, auction in year_auction_pairs:
+        year = str(year or "")
+        auction = str(auction or "")
         if not year or year == "nan":
-            logger.debug(f"_organize_year_data: Row {index} - Skipping due to invalid year.")
             continue
 
         if year not in year_auctions:
             year_auctions[year] = {}
 
-        # Use correct DataFrame column names
-        # auction = str(row.get("auction_name", "")) # Already got auction above
         if auction and auction != "nan":
             year_auctions[year][auction] = True
-            logger.debug(f"_organize_year_data: Row {index} - Added Auction '{auction}' for Year '{year}'")
-        else:
-            logger.debug(f"_organize_year_data: Row {index} - Skipping auction due to invalid value.")
 
-    # --- DEBUG: Log intermediate dictionary ---
     logger.debug(f"_organize_year_data: Built year_auctions dict: {year_auctions}")
-    # --- END DEBUG ---
 
     # Convert to list of year objects
     year_data = []
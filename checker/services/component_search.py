@@ -5,18 +5,21 @@ from django.shortcuts import render
 from django.core.cache import cache
 import traceback
 from django.urls import reverse
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Paginator
 from django.template.loader import render_to_string
 from ..models import Component, CMURegistry
 import json
-from django.db.models import Q
 
 from ..utils import normalize, get_cache_key
 from .data_access import (
+    get_cmu_dataframe,
     fetch_components_for_cmu_id, 
     get_components_from_database
 )
-from .company_search import _perform_company_search, get_cmu_dataframe, _build_search_results
+from .company_search import _build_search_results
+from .company_matcher import get_company_matcher
+from .pagination import CountingPaginator, COUNT_MODE_ESTIMATE
+from .search_backends import get_search_backend
 
 logger = logging.getLogger(__name__)
 
@@ -94,23 +97,15 @@ def search_components_service(request, extra_context=None, return_data_only=Fals
         displayed_component_count = min(per_page, len(component_results_dict.get(query, [])))
         api_time = 0
     else:
-        # STEP 1: Search for matching companies (using dataframe approach)
+        # STEP 1: Search for matching companies (name matcher + in-memory CMU lookup)
         debug_info["company_search_attempted"] = True
         try:
-            cmu_df, df_api_time = get_cmu_dataframe()
-            api_time += df_api_time
-            if cmu_df is not None:
-                norm_query = normalize(query)
-                matching_records = _perform_company_search(cmu_df, norm_query)
-                # Limit companies shown for performance, use _build_search_results for formatting
-                unique_companies = list(matching_records["Full Name"].unique())[:20] 
-                company_results_built = _build_search_results(cmu_df, unique_companies, sort_order, query, cmu_limit=3)
-                if query in company_results_built:
-                    company_links = company_results_built[query]
-                logger.info(f"Found {len(company_links)} matching company links for '{query}'")
-            else:
-                error_message = "Error loading company data (CMU dataframe)."
-                logger.error(error_message)
+            # Limit companies shown for performance, use _build_search_results for formatting
+            unique_companies = get_company_matcher().match_names(query, limit=20)
+            company_results_built, _ = _build_search_results(unique_companies, sort_order, query)
+            if query in company_results_built:
+                company_links = company_results_built[query]
+            logger.info(f"Found {len(company_links)} matching company links for '{query}'")
         except Exception as e:
             error_message = f"Error searching companies: {str(e)}"
             logger.exception(error_message)
@@ -137,27 +132,23 @@ def search_components_service(request, extra_context=None, return_data_only=Fals
                 base_queryset = Component.objects.all() # Start with all
                 if query:
                      # Simplified example: You'll need to adapt your existing multi-field search logic here
+                     # (single-table filter, so rows are already unique without DISTINCT)
                      base_queryset = base_queryset.filter(
-                         Q(company_name__icontains=query) | 
-                         Q(location__icontains=query) | 
-                         Q(description__icontains=query) | 
-                         Q(cmu_id__icontains=query) |
-                         Q(technology__icontains=query)
-                     ).distinct()
+                         get_search_backend().contains_filter(
+                             query, ['company_name', 'location', 'description', 'cmu_id', 'technology']
+                         )
+                     )
 
                 # Apply DB sorting if applicable
                 if db_sort_field:
-                    component_queryset = base_queryset.order_by(db_sort_field)
+                    component_queryset = base_queryset.order_by(db_sort_field, 'pk')
                 else:
-                    component_queryset = base_queryset # Keep original order for Python sort
-
-                total_component_count = component_queryset.count()
-                logger.info(f"Initial query found {total_component_count} components for '{query}'")
+                    component_queryset = base_queryset.order_by('pk') # Keep original order for Python sort
                 
                 # --- Python Sorting (if needed) --- 
                 if sort_field == 'mw': # Example for Connection Capacity
-                    logger.info(f"Fetching all {total_component_count} components for Python sort: {sort_field}")
                     all_components = list(component_queryset) # Fetch all
+                    logger.info(f"Fetched all {len(all_components)} components for Python sort: {sort_field}")
                     # Define get_connection_capacity helper (as before)
                     def get_connection_capacity(comp):
                         # ... (logic to parse from additional_data) ...
@@ -166,16 +157,14 @@ def search_components_service(request, extra_context=None, return_data_only=Fals
                     logger.info(f"Applied Python sort for MW ({sort_order})")
                     paginator = Paginator(all_components, per_page)
                 else:
-                    # Paginate the queryset directly if using DB sort
-                    paginator = Paginator(component_queryset, per_page)
+                    # Paginate the queryset directly if using DB sort: page rows and total in one
+                    # query, with the total estimated/capped for very broad searches
+                    paginator = CountingPaginator(component_queryset, per_page, count_mode=COUNT_MODE_ESTIMATE)
                     
                 # Get the current page
-                try:
-                    components_page = paginator.page(page)
-                except PageNotAnInteger:
-                    components_page = paginator.page(1)
-                except EmptyPage:
-                    components_page = paginator.page(paginator.num_pages)
+                components_page = paginator.get_page(page)
+                total_component_count = paginator.count
+                logger.info(f"Initial query found {total_component_count} components for '{query}'")
                 # --- END REFACTOR --- 
                 
                 # --- Fetch Registry Data for Current Page --- 
@@ -0,0 +1,401 @@
+"""
+Append-only component store for the offline JSON cache (json_data/component_store/).
+
+save_component_data_to_json() used to load the whole components_{prefix}.json shard,
+replace one CMU's list and rewrite the file with indent=2, so crawling a letter cost
+time quadratic in the shard size, and `crawl_all_components --resume` parsed a shard
+per CMU to see what had been fetched. Here a save appends one line to a segment file
+and one line to the index:
+
+    segment-000001.jsonl   {"cmu_id": "...", "components": [...]}\\n   one line per save
+    index.tsv              cmu_id \\t segment \\t offset \\t length \\t component count
+
+The index is loaded into a dict (the last line for a cmu_id wins), so has_cmu() is a
+dict lookup and get() one seek and read. Other processes' appends are picked up by
+comparing the index file's size (and inode, for compaction) before each lookup.
+Writers take an flock on .lock so offsets never interleave; readers don't lock.
+
+Superseded lines stay in the segments until `manage.py compact_component_store`
+copies the live lines into new segments, swaps in a new index with os.replace and
+deletes the old segments. A save that crashed after the segment write but before the
+index line is simply not in the index; rebuild_index() recovers the index from the
+segments if it is lost.
+"""
+import glob
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A new segment is started once the active one reaches this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+INDEX_FILE = "index.tsv"
+LOCK_FILE = ".lock"
+_SEGMENT_NAME = re.compile(r"^segment-(\d{6})\.jsonl$")
+
+_stores = {}
+
+
+def default_store_dir():
+    return os.path.join(settings.BASE_DIR, "json_data", "component_store")
+
+
+def get_component_store(directory=None):
+    """The ComponentStore for `directory` (default json_data/component_store), one per process."""
+    directory = os.path.abspath(directory or default_store_dir())
+    if directory not in _stores:
+        _stores[directory] = ComponentStore(directory)
+    return _stores[directory]
+
+
+def _segment_name(number):
+    return f"segment-{number:06d}.jsonl"
+
+
+def _encode(cmu_id, components):
+    line = json.dumps({"cmu_id": cmu_id, "components": components}, separators=(",", ":"), ensure_ascii=False)
+    return (line + "\n").encode("utf-8")
+
+
+class ComponentStore:
+    """CMU ID -> component list, stored as append-only JSONL segments plus an offset index."""
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._entries = {}  # cmu_id -> (segment, offset, length, count)
+        self._index_id = None  # (st_dev, st_ino) of the index file loaded
+        self._index_pos = 0  # bytes of the index file read (complete lines only)
+
+    # -- index -------------------------------------------------------------
+
+    def _read_index(self, start):
+        """Apply index lines from byte `start`; returns the end of the last complete line."""
+        with open(self.index_path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # A partial last line is an append in progress (or a crash)
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                cmu_id, segment, offset, length, count = line.split("\t")
+                self._entries[cmu_id] = (int(segment), int(offset), int(length), int(count))
+            except ValueError:
+                logger.warning(f"Skipping malformed component store index line: {line!r}")
+        return start + end
+
+    def _refresh(self):
+        """Pick up index lines appended (or an index swapped in) since the last look."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._entries, self._index_id, self._index_pos = {}, None, 0
+            return
+        if (st.st_dev, st.st_ino) != self._index_id:
+            self._entries, self._index_pos = {}, 0
+            self._index_id = (st.st_dev, st.st_ino)
+        if st.st_size > self._index_pos:
+            self._index_pos = self._read_index(self._index_pos)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _segments(self):
+        """Segment numbers on disk, ascending."""
+        numbers = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.jsonl")):
+            match = _SEGMENT_NAME.match(os.path.basename(path))
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    # -- reads -------------------------------------------------------------
+
+    def has_cmu(self, cmu_id):
+        """True when components are stored for cmu_id (an empty list counts as not fetched)."""
+        self._refresh()
+        entry = self._entries.get(cmu_id)
+        return bool(entry and entry[3])
+
+    def __contains__(self, cmu_id):
+        self._refresh()
+        return cmu_id in self._entries
+
+    def __len__(self):
+        self._refresh()
+        return len(self._entries)
+
+    def cmu_ids(self):
+        self._refresh()
+        return list(self._entries)
+
+    def _read_entry(self, entry):
+        segment, offset, length, _ = entry
+        with open(os.path.join(self.directory, _segment_name(segment)), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get(self, cmu_id, default=None):
+        """The stored component list for cmu_id, or `default`."""
+        self._refresh()
+        entry = self._entries.get(cmu_id)
+        if entry is None:
+            return default
+        try:
+            data = self._read_entry(entry)
+        except FileNotFoundError:
+            # Compacted away since the index was read: reload it and try once more
+            self._index_id = None
+            self._refresh()
+            entry = self._entries.get(cmu_id)
+            if entry is None:
+                return default
+            data = self._read_entry(entry)
+        return json.loads(data)["components"]
+
+    def items(self):
+        """Yield (cmu_id, components) for every stored CMU in file order (sequential reads)."""
+        self._refresh()
+        entries = sorted(self._entries.items(), key=lambda item: item[1][:2])
+        current, f = None, None
+        try:
+            for cmu_id, (segment, offset, length, _) in entries:
+                if segment != current:
+                    if f:
+                        f.close()
+                    f = open(os.path.join(self.directory, _segment_name(segment)), "rb")
+                    current = segment
+                f.seek(offset)
+                yield cmu_id, json.loads(f.read(length))["components"]
+        finally:
+            if f:
+                f.close()
+
+    def iter_components(self):
+        """
+        (cmu_id, component) pairs in the shape json_shards.iter_shard_components
+        yields them, (cmu_id, None) for a CMU with no components.
+        """
+        for cmu_id, components in self.items():
+            if not components:
+                yield cmu_id, None
+            for component in components:
+                yield cmu_id, component
+
+    def stats(self):
+        """Live CMUs/components/bytes against the bytes on disk."""
+        self._refresh()
+        segment_bytes = sum(
+            os.path.getsize(os.path.join(self.directory, _segment_name(n))) for n in self._segments()
+        )
+        live_bytes = sum(entry[2] for entry in self._entries.values())
+        return {
+            "cmu_ids": len(self._entries),
+            "components": sum(entry[3] for entry in self._entries.values()),
+            "segments": len(self._segments()),
+            "segment_bytes": segment_bytes,
+            "live_bytes": live_bytes,
+            "garbage_ratio": round(1 - live_bytes / segment_bytes, 4) if segment_bytes else 0.0,
+        }
+
+    # -- writes ------------------------------------------------------------
+
+    def put(self, cmu_id, components):
+        """Store components for cmu_id, replacing what was stored for it."""
+        self.put_many([(cmu_id, components)])
+
+    def put_many(self, items):
+        """Store (cmu_id, components) pairs under one lock. Returns the number stored."""
+        stored = 0
+        with self._locked():
+            segments = self._segments()
+            segment = segments[-1] if segments else 1
+            index_lines = []
+            seg_file = open(os.path.join(self.directory, _segment_name(segment)), "ab")
+            try:
+                offset = seg_file.seek(0, os.SEEK_END)
+                for cmu_id, components in items:
+                    components = list(components or [])
+                    data = _encode(cmu_id, components)
+                    if offset and offset + len(data) > self.segment_max_bytes:
+                        seg_file.close()
+                        segment += 1
+                        seg_file = open(os.path.join(self.directory, _segment_name(segment)), "ab")
+                        offset = 0
+                    seg_file.write(data)
+                    index_lines.append(f"{cmu_id}\t{segment}\t{offset}\t{len(data)}\t{len(components)}\n")
+                    self._entries[cmu_id] = (segment, offset, len(data), len(components))
+                    offset += len(data)
+                    stored += 1
+            finally:
+                # Segment bytes reach the file before the index lines that point at them
+                seg_file.close()
+            if index_lines:
+                with open(self.index_path, "ab") as index:
+                    # Drop a partial line left by a crashed writer before appending
+                    index.truncate(self._index_pos)
+                    index.write("".join(index_lines).encode("utf-8"))
+                    self._index_pos = index.tell()
+                st = os.stat(self.index_path)
+                self._index_id = (st.st_dev, st.st_ino)
+        return stored
+
+    def _swap_in(self, index_lines, entries, old_segments):
+        """Atomically replace the index, then remove the segments it no longer uses."""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write("".join(index_lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        st = os.stat(self.index_path)
+        self._entries = entries
+        self._index_id = (st.st_dev, st.st_ino)
+        self._index_pos = st.st_size
+        for number in old_segments:
+            try:
+                os.remove(os.path.join(self.directory, _segment_name(number)))
+            except FileNotFoundError:
+                pass
+
+    def compact(self):
+        """
+        Copy each CMU's live line into new segments (in CMU ID order), swap in the new
+        index and delete the old segments. Returns the stats before and after.
+        """
+        before = self.stats()
+        with self._locked():
+            old_segments = self._segments()
+            segment = (old_segments[-1] if old_segments else 0) + 1
+            entries, index_lines = {}, []
+            out = None
+            try:
+                for cmu_id in sorted(self._entries):
+                    data = self._read_entry(self._entries[cmu_id])
+                    if out is None or (out.tell() and out.tell() + len(data) > self.segment_max_bytes):
+                        if out:
+                            out.flush()
+                            os.fsync(out.fileno())
+                            out.close()
+                            segment += 1
+                        out = open(os.path.join(self.directory, _segment_name(segment)), "wb")
+                    offset = out.tell()
+                    out.write(data)
+                    count = self._entries[cmu_id][3]
+                    entries[cmu_id] = (segment, offset, len(data), count)
+                    index_lines.append(f"{cmu_id}\t{segment}\t{offset}\t{len(data)}\t{count}\n")
+            finally:
+                if out:
+                    out.flush()
+                    os.fsync(out.fileno())
+                    out.close()
+            self._swap_in(index_lines, entries, old_segments)
+        return {"before": before, "after": self.stats()}
+
+    def rebuild_index(self):
+        """
+        Rebuild the index by scanning every segment (the last line for a CMU wins). For
+        a lost or damaged index.tsv; returns the number of CMUs indexed.
+        """
+        with self._locked():
+            entries, index_lines = {}, []
+            for segment in self._segments():
+                with open(os.path.join(self.directory, _segment_name(segment)), "rb") as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            record = json.loads(line) if line.endswith(b"\n") else None
+                        except ValueError:
+                            record = None
+                        if isinstance(record, dict) and "cmu_id" in record:
+                            entries[record["cmu_id"]] = (
+                                segment, offset, len(line), len(record.get("components") or [])
+                            )
+                        offset += len(line)
+            for cmu_id, (segment, offset, length, count) in entries.items():
+                index_lines.append(f"{cmu_id}\t{segment}\t{offset}\t{length}\t{count}\n")
+            self._swap_in(index_lines, entries, [])
+        return len(entries)
+
+    # -- legacy shards -----------------------------------------------------
+
+    def import_shards(self, paths, batch_size=500):
+        """
+        Append the CMUs of components_*.json shards, streamed with
+        json_shards.iter_shard_components. Returns {'cmu_ids', 'components', 'errors'}.
+        """
+        from .json_shards import ShardFormatError, iter_shard_components
+
+        result = {"cmu_ids": 0, "components": 0, "errors": 0}
+        pending = []
+
+        def flush():
+            self.put_many(pending)
+            pending.clear()
+
+        for path in paths:
+            cmu_id, components = None, []
+            try:
+                for pair_cmu_id, component in iter_shard_components(path):
+                    if pair_cmu_id != cmu_id:
+                        if cmu_id is not None:
+                            pending.append((cmu_id, components))
+                            result["cmu_ids"] += 1
+                        cmu_id, components = pair_cmu_id, []
+                        if len(pending) >= batch_size:
+                            flush()
+                    if component is not None:
+                        components.append(component)
+                        result["components"] += 1
+            except (OSError, ShardFormatError) as e:
+                logger.error(f"Error reading {path}: {e}")
+                result["errors"] += 1
+            if cmu_id is not None:
+                pending.append((cmu_id, components))
+                result["cmu_ids"] += 1
+        flush()
+        return result
+
+    def export_shards(self, json_dir):
+        """
+        Write components_{prefix}.json shards (the layout the older maintenance commands
+        read) from the store, one CMU at a time. Returns {prefix: CMU count}.
+        """
+        self._refresh()
+        by_prefix = {}
+        for cmu_id in self._entries:
+            by_prefix.setdefault(cmu_id[0].upper() if cmu_id else "0", []).append(cmu_id)
+
+        written = {}
+        for prefix, cmu_ids in sorted(by_prefix.items()):
+            path = os.path.join(json_dir, f"components_{prefix}.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("{")
+                for i, cmu_id in enumerate(sorted(cmu_ids)):
+                    f.write(("," if i else "") + f"\n  {json.dumps(cmu_id)}: ")
+                    json.dump(self.get(cmu_id, []), f)
+                f.write("\n}\n")
+            os.replace(path + ".tmp", path)
+            written[prefix] = len(cmu_ids)
+        return written
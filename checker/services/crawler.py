@@ -0,0 +1,151 @@
+"""
+HTTP client for crawling the NESO CKAN datastore concurrently.
+
+crawl_to_database used to fetch one CMU page and then one component search per CMU,
+serially, sleeping between batches. DatastoreClient is shared by the worker threads
+of `crawl_to_database --workers N`, and for every request it:
+
+- takes a token from a TokenBucket (requests per second with a burst allowance), so
+  all the workers together stay under the API's rate limit
+- holds a slot of a semaphore for the duration of the request, which bounds the
+  requests in flight regardless of the number of workers
+- retries timeouts, connection errors, 429 and 5xx responses up to `retries` times
+  with exponential backoff and full jitter, honouring Retry-After when sent
+
+Every thread gets its own requests.Session (sessions are not thread-safe). The base
+URL is configurable so a crawl can run against `manage.py crawler_standin_server`.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DATASTORE_SEARCH_URL = "https://api.neso.energy/api/3/action/datastore_search"
+CMU_RESOURCE_ID = "25a5fa2e-873d-41c5-8aaf-fbc2b06d79e6"
+COMPONENT_RESOURCE_ID = "790f5fa0-f8eb-4d82-b98d-0d34d3e404e8"
+
+# Status codes worth retrying: rate limited, or a transient server-side failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CrawlError(Exception):
+    """A datastore request failed after all retries (or the API reported success=false)."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class DatastoreClient:
+    """Rate-limited, retrying datastore_search client shared by crawler worker threads."""
+
+    def __init__(self, base_url=DATASTORE_SEARCH_URL, rate=5.0, burst=None, max_in_flight=4,
+                 retries=4, timeout=30, backoff_base=0.5, backoff_cap=30.0):
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate, burst) if rate and rate > 0 else None
+        self.in_flight = threading.BoundedSemaphore(max(1, max_in_flight))
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "throttled_seconds": 0.0}
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _count(self, stat, amount=1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def _retry_after(self, response):
+        try:
+            return min(float(response.headers.get("Retry-After")), self.backoff_cap)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, params):
+        """GET base_url with params, with rate limiting, bounded concurrency and retries. Returns the parsed JSON."""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+            if self.bucket is not None:
+                self._count("throttled_seconds", self.bucket.acquire())
+
+            retry_after = None
+            with self.in_flight:
+                self._count("requests")
+                try:
+                    response = self._session().get(self.base_url, params=params, timeout=self.timeout)
+                    if response.status_code in RETRY_STATUS_CODES:
+                        retry_after = self._retry_after(response)
+                        last_error = CrawlError(f"HTTP {response.status_code}")
+                    else:
+                        response.raise_for_status()
+                        return response.json()
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    last_error = e
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # Other 4xx / undecodable body: retrying won't help
+                    self._count("failures")
+                    raise CrawlError(f"Request failed: {e}") from e
+
+            if attempt < self.retries:
+                delay = retry_after if retry_after is not None else backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                logger.debug(f"Retrying {params} in {delay:.2f}s after: {last_error}")
+                time.sleep(delay)
+
+        self._count("failures")
+        raise CrawlError(f"Giving up after {self.retries + 1} attempts: {last_error}")
+
+    def datastore_search(self, resource_id, **params):
+        """The `result` of a datastore_search call ({'records': [...], 'total': n, ...})."""
+        data = self.get(dict(params, resource_id=resource_id))
+        if not data.get("success"):
+            raise CrawlError(f"API request unsuccessful: {data.get('error', 'Unknown error')}")
+        return data.get("result", {})
+
+    def cmu_page(self, offset, limit, query=None):
+        params = {"limit": limit, "offset": offset}
+        if query:
+            params["q"] = query
+        return self.datastore_search(CMU_RESOURCE_ID, **params)
+
+    def components_for_cmu(self, cmu_id, limit=1000):
+        return self.datastore_search(COMPONENT_RESOURCE_ID, q=cmu_id, limit=limit).get("records", [])
@@ -9,17 +9,26 @@ import logging
 import glob
 from django.db.models import Q, Count
 from django.db import connection
+from django.core.paginator import EmptyPage, PageNotAnInteger
 import re
 import traceback
 import sys
+from array import array
 
-from ..utils import normalize, get_cache_key, get_json_path, ensure_directory_exists
+from ..utils import normalize, get_cache_key, get_json_path
 from ..models import Component
 
 # Import the postcode/area helper functions correctly
 from .postcode_helpers import get_all_postcodes_for_area, get_area_for_any_postcode
+from .pagination import CountingPaginator
+from .component_store import get_component_store
+from .data_version import versioned_cache_key
 logger = logging.getLogger(__name__)
 
+# Largest token index candidate set we'll pass to the database as a pk__in list
+# (SQLite caps bound parameters, and beyond this a plain scan is about as quick)
+MAX_INDEX_CANDIDATES = 10000
+
 
 # CMU DATA ACCESS FUNCTIONS
 
@@ -124,7 +133,8 @@ def get_cmu_dataframe():
         
         # Get data from database
         cmu_records = Component.objects.values(
-            'cmu_id', 'company_name', 'delivery_year', 'auction_name'
+            'cmu_id', 'company_name', 'delivery_year', 'auction_name',
+            'company_name_norm', 'cmu_id_norm'
         ).distinct()
         
         # Convert to a DataFrame for backward compatibility
@@ -135,15 +145,14 @@ def get_cmu_dataframe():
                 "Name of Applicant": record['company_name'],
                 "Full Name": record['company_name'],
                 "Delivery Year": record['delivery_year'],
-                "Auction Name": record['auction_name']
+                "Auction Name": record['auction_name'],
+                # Normalized fields for searching, precomputed in the database
+                "Normalized Full Name": record['company_name_norm'] or normalize(record['company_name']),
+                "Normalized CMU ID": record['cmu_id_norm'] or normalize(record['cmu_id']),
             })
         
         cmu_df = pd.DataFrame(df_data)
         
-        # Add normalized fields for searching
-        cmu_df["Normalized Full Name"] = cmu_df["Full Name"].apply(normalize)
-        cmu_df["Normalized CMU ID"] = cmu_df["CMU ID"].apply(normalize)
-        
         # Cache the mappings for future use
         cmu_to_company_mapping = {}
         for _, row in cmu_df.iterrows():
@@ -228,31 +237,14 @@ def get_component_data_from_json(cmu_id):
 
 def save_component_data_to_json(cmu_id, components):
     """
-    Save component data to JSON for a specific CMU ID.
+    Save component data to the offline component store for a specific CMU ID.
+    The components are appended to json_data/component_store (services/component_store.py)
+    rather than rewriting the whole components_{prefix}.json shard.
     Returns True if successful, False otherwise.
     """
     if not cmu_id:
         return False
 
-    # Get first character of CMU ID as folder name
-    prefix = cmu_id[0].upper()
-
-    # Create a directory for split files if it doesn't exist
-    json_dir = os.path.join(settings.BASE_DIR, 'json_data')
-    ensure_directory_exists(json_dir)
-
-    # Path for this specific CMU's components
-    json_path = os.path.join(json_dir, f'components_{prefix}.json')
-
-    # Initialize or load existing data
-    all_components = {}
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, 'r') as f:
-                all_components = json.load(f)
-        except Exception as e:
-            print(f"Error reading existing component data: {e}")
-
     # Get company name from mapping cache
     cmu_to_company_mapping = cache.get("cmu_to_company_mapping", {})
     company_name = cmu_to_company_mapping.get(cmu_id, "")
@@ -278,16 +270,12 @@ def save_component_data_to_json(cmu_id, components):
 
         updated_components.append(component)
 
-    # Add or update the components for this CMU ID
-    all_components[cmu_id] = updated_components
-
-    # Write the updated data back to the file
+    # Append the components for this CMU ID (replacing any stored earlier)
     try:
-        with open(json_path, 'w') as f:
-            json.dump(all_components, f, indent=2)
+        get_component_store().put(cmu_id, updated_components)
         return True
     except Exception as e:
-        print(f"Error saving component data to JSON: {e}")
+        logger.error(f"Error saving component data to the component store: {e}")
         return False
 
 
@@ -376,6 +364,107 @@ def detect_potential_duplicates(components):
     return duplicates
 
 
+def _get_search_terms(query):
+    """
+    Split a free-text query into the terms used by the multi-term search:
+    lowercase, first 3 terms only, terms shorter than 3 characters dropped.
+    """
+    query_terms = query.lower().split()
+
+    # For multi-term searches with many terms, limit the query complexity
+    if len(query_terms) > 3:
+        # Prioritize the first few terms for performance
+        query_terms = query_terms[:3]
+        logger.info(f"Limiting search to first 3 terms for query: '{query}'")
+
+    # Only use terms with at least 3 characters
+    return [term for term in query_terms if len(term) >= 3]
+
+
+def _build_multi_term_filter(query_terms):
+    """OR of icontains over the searchable fields for every term."""
+    query_filter = Q()
+    for term in query_terms:
+        query_filter |= (
+            Q(company_name__icontains=term) |
+            Q(location__icontains=term) |
+            Q(description__icontains=term) |
+            Q(cmu_id__icontains=term)
+        )
+    return query_filter
+
+
+def _resolve_candidates_from_index(query_terms, sort_order="desc"):
+    """
+    Resolve the components matching any of the terms from the in-process token index.
+    Returns a list of pks ordered by delivery year, or None if the index can't be used
+    (disabled, failed to build, or no usable terms - an empty filter matches everything).
+    """
+    if not query_terms:
+        return None
+
+    from .search_index import get_component_index
+
+    index = get_component_index()
+    if index is None:
+        return None
+    return index.order_pks(index.match_any(query_terms), sort_order)
+
+
+def _hydrate_component_page(pks):
+    """
+    Load the components for one page of primary keys in a single pk__in query and
+    return them as search-result dicts, in the order of `pks`.
+    """
+    from ..models import Component
+
+    pks = list(pks)
+    if not pks:
+        return []
+
+    components_by_pk = Component.objects.only(
+        "id", "cmu_id", "location", "description", "technology", "company_name",
+        "auction_name", "delivery_year", "status", "type", "component_id", "additional_data",
+    ).in_bulk(pks)
+
+    components = []
+    for pk in pks:
+        comp = components_by_pk.get(pk)
+        if comp is None:
+            # Deleted since the ids were cached
+            continue
+        # Create a dictionary representation
+        comp_dict = {
+            "CMU ID": comp.cmu_id,
+            "Location and Post Code": comp.location or '',
+            "Description of CMU Components": comp.description or '',
+            "Generating Technology Class": comp.technology or '',
+            "Company Name": comp.company_name or '',
+            "Auction Name": comp.auction_name or '',
+            "Delivery Year": comp.delivery_year or '',
+            "Status": comp.status or '',
+            "Type": comp.type or '',
+            "_id": comp.id,  # Use database ID (pk) for links
+            "component_id_str": comp.component_id or '' # Add the string component_id from the model field (might be source _id)
+        }
+        
+        # Add any additional data if available, AND try to get the actual Component ID
+        actual_component_id = None
+        if comp.additional_data:
+            for key, value in comp.additional_data.items():
+                if key not in comp_dict:
+                    comp_dict[key] = value
+                # Explicitly look for the key 'Component ID' from the source data
+                if key == "Component ID": 
+                    actual_component_id = value
+        
+        # Add the actual component ID if found
+        comp_dict["actual_component_id"] = actual_component_id or ''
+                    
+        components.append(comp_dict)
+    return components
+
+
 def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_order="desc"):
     """
     Fetch components for a given CMU ID using a multi-term search approach 
@@ -385,7 +474,6 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
     import logging
     from django.core.cache import cache
     from ..models import Component
-    from ..utils import get_cache_key
     
     logger = logging.getLogger(__name__)
     start_time = time.time()
@@ -394,20 +482,25 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
     # This helps with searches like "Tata Steel" which would otherwise return hundreds of components
     default_component_limit = 50  # Default max components to show initially
     
-    # Check cache first for performance
-    # Include sort_order in the cache key to ensure different sort orders have different cache entries
-    components_cache_key = get_cache_key(f"components_for_cmu_p{page}_s{per_page}_sort{sort_order}", cmu_id)
-    cached_components = cache.get(components_cache_key)
+    # Check cache first for performance.
+    # The cache holds the ordered primary keys of the whole result (not model instances),
+    # keyed by query + sort (and the data version) only, so every page and page size
+    # shares one entry.
+    components_cache_key = versioned_cache_key(f"component_pks_sort{sort_order}", cmu_id)
+    cached_result = cache.get(components_cache_key)
     
-    # If found in cache, apply pagination and return
-    if cached_components:
-        logger.info(f"Found {len(cached_components)} components in cache for '{cmu_id}'")
-        total_count = len(cached_components)
+    # If found in cache, slice out the page and hydrate just those rows
+    if cached_result:
+        total_count = cached_result["total_count"]
+        logger.info(f"Found {total_count} component ids in cache for '{cmu_id}'")
+        # Same page size cap the database path applies to company-name searches
+        if cached_result["page_size_limited"]:
+            per_page = min(per_page, default_component_limit)
         
         # Apply pagination
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
-        paginated_components = cached_components[start_idx:end_idx]
+        paginated_components = _hydrate_component_page(cached_result["pks"][start_idx:end_idx])
         
         # Add duplicate detection to metadata
         duplicates = detect_potential_duplicates(paginated_components)
@@ -415,7 +508,7 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
             "total_count": total_count,
             "page": page,
             "per_page": per_page,
-            "total_pages": (total_count + per_page - 1) // per_page,
+            "total_pages": (total_count + per_page - 1) // per_page if total_count > 0 else 1,
             "source": "cache",
             "processing_time": time.time() - start_time,
             "potential_duplicates": duplicates,
@@ -437,47 +530,50 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
         except:
             pass  # Some backends don't support timeout
         
+        # Candidate pks resolved from the in-memory token index (None = use database filters)
+        candidate_pks = None
+
         # First, check if this is a direct CMU ID search
         if ' ' not in cmu_id and (cmu_id.upper().startswith('CM') or cmu_id.upper().startswith('T-')):
-            # Direct CMU ID search - case insensitive  
-            queryset = Component.objects.filter(cmu_id__iexact=cmu_id)
+            # Direct CMU ID search - case insensitive, via the indexed normalized column
+            queryset = Component.objects.filter(cmu_id_norm=normalize(cmu_id))
             logger.info(f"Direct CMU ID search for: {cmu_id}")
         else:
             # Multi-term search approach - split query into terms
-            query_terms = cmu_id.lower().split()
-            
-            # Start with empty query
-            from django.db.models import Q
-            query_filter = Q()
-            
-            # For multi-term searches with many terms, limit the query complexity
-            if len(query_terms) > 3:
-                # Prioritize the first few terms for performance
-                query_terms = query_terms[:3]
-                logger.info(f"Limiting search to first 3 terms for query: '{cmu_id}'")
-            
-            # Process each search term independently
-            for term in query_terms:
-                if len(term) >= 3:  # Only use terms with at least 3 characters
-                    term_filter = (
-                        Q(company_name__icontains=term) | 
-                        Q(location__icontains=term) | 
-                        Q(description__icontains=term) |
-                        Q(cmu_id__icontains=term)
-                    )
-                    # Add each term with OR logic
-                    query_filter |= term_filter
-            
-            # Apply the combined filter
-            queryset = Component.objects.filter(query_filter)
-            logger.info(f"Multi-term search for: {cmu_id}")
-        
-        # Make the queryset distinct to avoid duplicates
-        queryset = queryset.distinct()
-        
-        # Get total count for pagination
-        total_count = queryset.count()
-        logger.info(f"Found {total_count} total components for query: {cmu_id}")
+            query_terms = _get_search_terms(cmu_id)
+
+            # Resolve candidates from the token index so the database is only hit by primary key
+            candidate_pks = _resolve_candidates_from_index(query_terms, sort_order)
+            if candidate_pks is not None:
+                # Ordered by delivery year already; keep the same 5000 cap as the database path
+                queryset = Component.objects.filter(pk__in=candidate_pks[:5000])
+                logger.info(f"Multi-term search for: {cmu_id} (token index, {len(candidate_pks)} candidates)")
+            else:
+                queryset = Component.objects.filter(_build_multi_term_filter(query_terms))
+                logger.info(f"Multi-term search for: {cmu_id}")
+
+        # Apply sorting based on sort_order (pk breaks ties so cached pages are stable)
+        if sort_order == "asc":
+            # Oldest first - ascending delivery year
+            queryset = queryset.order_by('delivery_year', 'pk')
+            logger.info("Sorting by delivery year (oldest first)")
+        else:
+            # Newest first - descending delivery year (default)
+            queryset = queryset.order_by('-delivery_year', 'pk')
+            logger.info("Sorting by delivery year (newest first)")
+
+        # Ordered primary keys for the whole result, capped at 5000: one narrow query that
+        # serves as both the count and the source of every page. Filters are on the
+        # component table only, so no DISTINCT is needed.
+        if candidate_pks is not None:
+            # Candidates are already unique and trimmed to 5000
+            total_count = len(candidate_pks)
+            ordered_pks = array('q', queryset.values_list('pk', flat=True))
+        else:
+            ordered_pks = array('q', queryset.values_list('pk', flat=True)[:5001])
+            total_count = len(ordered_pks)
+            ordered_pks = ordered_pks[:5000]
+        logger.info(f"Found {total_count if total_count <= 5000 else 'over 5000'} total components for query: {cmu_id}")
         
         # Convert to integer to avoid comparison issues
         total_count_int = int(total_count) if isinstance(total_count, (str, float)) else total_count
@@ -493,14 +589,15 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
                 logger.info(f"Query '{cmu_id}' appears to be a company name search with {company_match_count} matching companies")
         
         # If we have a very large result set, limit it further 
+        page_size_limited = False
         if total_count_int > 5000:
-            logger.warning(f"Very large result set ({total_count_int}) for query '{cmu_id}', limiting to 5000")
-            queryset = queryset[:5000]
-            total_count_int = min(total_count_int, 5000)
+            logger.warning(f"Very large result set (over 5000) for query '{cmu_id}', limiting to 5000")
+            total_count_int = 5000
         # For likely company searches, set a lower initial limit
         elif is_likely_company_search and per_page > default_component_limit:
             logger.info(f"Limiting initial component display to {default_component_limit} for company search '{cmu_id}'")
             per_page = default_component_limit
+            page_size_limited = True
         
         # Restore original timeout if we changed it
         try:
@@ -509,67 +606,25 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
         except:
             pass
         
-        # Apply sorting based on sort_order
-        if sort_order == "asc":
-            # Oldest first - ascending delivery year
-            queryset = queryset.order_by('delivery_year')
-            logger.info("Sorting by delivery year (oldest first)")
-        else:
-            # Newest first - descending delivery year (default)
-            queryset = queryset.order_by('-delivery_year')
-            logger.info("Sorting by delivery year (newest first)")
-        
-        # Apply pagination
+        # Apply pagination and fetch the display columns for this page only
         start = (page - 1) * per_page
         end = start + per_page
-        paginated_queryset = queryset[start:end]
-        
-        # Convert to list of dictionaries
-        components = []
-        for comp in paginated_queryset:
-            # Create a dictionary representation
-            comp_dict = {
-                "CMU ID": comp.cmu_id,
-                "Location and Post Code": comp.location or '',
-                "Description of CMU Components": comp.description or '',
-                "Generating Technology Class": comp.technology or '',
-                "Company Name": comp.company_name or '',
-                "Auction Name": comp.auction_name or '',
-                "Delivery Year": comp.delivery_year or '',
-                "Status": comp.status or '',
-                "Type": comp.type or '',
-                "_id": comp.id,  # Use database ID (pk) for links
-                "component_id_str": comp.component_id or '' # Add the string component_id from the model field (might be source _id)
-            }
-            
-            # Add any additional data if available, AND try to get the actual Component ID
-            actual_component_id = None
-            if comp.additional_data:
-                for key, value in comp.additional_data.items():
-                    if key not in comp_dict:
-                        comp_dict[key] = value
-                    # Explicitly look for the key 'Component ID' from the source data
-                    if key == "Component ID": 
-                        actual_component_id = value
-            
-            # Add the actual component ID if found
-            comp_dict["actual_component_id"] = actual_component_id or ''
-                        
-            components.append(comp_dict)
+        components = _hydrate_component_page(ordered_pks[start:end])
         
         logger.info(f"Returning {len(components)} components for page {page}")
         
-        # Cache results if not too large
-        if total_count_int <= 1000:  # Only cache reasonably sized results
-            # Store all component results (not just paginated) in the cache with the sort order
-            all_components = list(queryset)
-            cache.set(components_cache_key, all_components, 3600)  # 1 hour
+        # Cache the ordered ids (a few KB even at the 5000 cap)
+        if total_count_int <= 1000:
+            cache_timeout = 3600  # 1 hour
         elif total_count_int <= 2000:
-            all_components = list(queryset)
-            cache.set(components_cache_key, all_components, 1800)  # 30 minutes
-        elif total_count_int <= 5000:
-            all_components = list(queryset)
-            cache.set(components_cache_key, all_components, 600)   # 10 minutes
+            cache_timeout = 1800  # 30 minutes
+        else:
+            cache_timeout = 600   # 10 minutes
+        cache.set(components_cache_key, {
+            "pks": ordered_pks,
+            "total_count": total_count_int,
+            "page_size_limited": page_size_limited,
+        }, cache_timeout)
         
         # Add duplicate detection to metadata
         duplicates = detect_potential_duplicates(components)
@@ -664,66 +719,17 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100, sort_o
 def save_components_to_database(cmu_id, components):
     """
     Save components to the database.
-    This is called whenever we fetch components from the API.
+    This is called whenever we fetch components from the API. Components already
+    stored are skipped (see services/bulk_ingest.py).
     """
-    from django.db import transaction
-    from ..models import Component
-    
+    from .bulk_ingest import ingest_components
+
     if not components:
         return
-    
-    # Extract component_ids for efficient existence check
-    component_ids = [c.get("_id", "") for c in components if c.get("_id")]
-    
-    # Only do one database query to find all existing IDs
-    existing_ids = set()
-    if component_ids:
-        existing_ids = set(Component.objects.filter(
-            component_id__in=component_ids
-        ).values_list('component_id', flat=True))
-    
-    # Create list of new components only
-    new_components = []
-    for component in components:
-        component_id = component.get("_id", "")
-        
-        # Skip if we already have this component in the database
-        # FIXED THIS CONDITION - only skip if it's already in existing_ids
-        if component_id and component_id in existing_ids:
-            continue
-        
-        # --- Calculate derated_capacity_mw --- 
-        derated_capacity_mw = None
-        capacity_str = component.get("De-Rated Capacity")
-        if capacity_str is not None:
-            try:
-                derated_capacity_mw = float(capacity_str)
-            except (ValueError, TypeError):
-                pass # Keep as None if conversion fails
-        # --- End calculation ---
-        
-        # Extract standard fields
-        new_components.append(Component(
-            component_id=component_id,
-            cmu_id=cmu_id,
-            location=component.get("Location and Post Code", ""),
-            description=component.get("Description of CMU Components", ""),
-            technology=component.get("Generating Technology Class", ""),
-            company_name=component.get("Company Name", ""),
-            auction_name=component.get("Auction Name", ""),
-            delivery_year=component.get("Delivery Year", ""),
-            status=component.get("Status", ""),
-            type=component.get("Type", ""),
-            additional_data=component,
-            derated_capacity_mw=derated_capacity_mw # Set the new field
-        ))
-    
-    # Only do the bulk create if we have new components
-    if new_components:
-        # Use a transaction for better performance and atomicity
-        with transaction.atomic():
-            # Bulk create all components at once
-            Component.objects.bulk_create(new_components, ignore_conflicts=True)
+
+    result = ingest_components((cmu_id, component) for component in components)
+    if result["added"]:
+        logger.info(f"Saved {result['added']} new components for CMU {cmu_id}")
 
 
 def fetch_component_search_results(query, limit=1000, sort_order="desc"):
@@ -796,23 +802,16 @@ def get_accurate_total_count(query):
         # Use the same multi-term search logic as fetch_components_for_cmu_id
         if ' ' not in query and (query.upper().startswith('CM') or query.upper().startswith('T-')):
             # Direct CMU ID search
-            total_count = Component.objects.filter(cmu_id__iexact=query).count()
+            total_count = Component.objects.filter(cmu_id_norm=normalize(query)).count()
         else:
-            # Multi-term search
-            query_terms = query.lower().split()
-            query_filter = Q()
-            
-            for term in query_terms:
-                if len(term) >= 3:
-                    term_filter = (
-                        Q(company_name__icontains=term) | 
-                        Q(location__icontains=term) | 
-                        Q(description__icontains=term) |
-                        Q(cmu_id__icontains=term)
-                    )
-                    query_filter |= term_filter
-            
-            total_count = Component.objects.filter(query_filter).distinct().count()
+            # Multi-term search - answer from the token index when possible
+            query_terms = _get_search_terms(query)
+            candidate_pks = _resolve_candidates_from_index(query_terms)
+
+            if candidate_pks is not None:
+                total_count = len(candidate_pks)
+            else:
+                total_count = Component.objects.filter(_build_multi_term_filter(query_terms)).distinct().count()
             
         logger.info(f"Database reports {total_count} total matching components for '{query}' in {time.time() - start_time:.2f}s")
         return total_count
@@ -965,18 +964,20 @@ def get_components_from_database(cmu_id=None, component_id=None, location=None,
     Returns a tuple of (components list, total count).
     """
     import logging
-    from django.db.models import Q
-    
+    from django.db.models import Q, F
+
     # Import the enhanced postcode functions
     from .postcode_helpers import get_all_postcodes_for_area, get_area_for_any_postcode
     logger = logging.getLogger(__name__)
     
-    # Try importing PostgreSQL specific tools
+    # Try importing PostgreSQL specific tools. The import succeeds whenever psycopg2 is
+    # installed, so also check the database actually in use is PostgreSQL.
     try:
-        from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-        using_postgres = True
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        using_postgres = connection.vendor == 'postgresql'
     except ImportError:
         using_postgres = False
+    if not using_postgres:
         logger.warning("PostgreSQL specific search features not available. Falling back to basic icontains.")
 
     logger.info(f"DB Query: cmu={cmu_id}, comp={component_id}, loc={location}, company={company_name}, term={search_term}, page={page}, per_page={per_page}, sort={sort_order}")
@@ -985,12 +986,11 @@ def get_components_from_database(cmu_id=None, component_id=None, location=None,
     query_set = Component.objects.all()
     filters = Q()
     has_filter = False
-    vector = None # Initialize vector here
     query = None # Initialize query here
     rank_annotation = None # Initialize rank_annotation here
 
     if cmu_id:
-        filters &= Q(cmu_id__iexact=cmu_id)
+        filters &= Q(cmu_id_norm=normalize(cmu_id))
         has_filter = True
     
     if component_id:
@@ -1102,23 +1102,33 @@ def get_components_from_database(cmu_id=None, component_id=None, location=None,
 
             # --- Ranking Logic --- 
             if using_postgres:
-                # Define search vector and query for ranking
-                vector = SearchVector('company_name', 'location', 'description', 'cmu_id', config='english') # Added cmu_id to vector
+                # Query the stored, GIN-indexed search_vector column (kept current by a
+                # trigger) instead of rebuilding the vector for every row scanned
                 query = SearchQuery(search_term_lower, config='english')
-                # --- ANNOTATE FIRST --- 
-                query_set = query_set.annotate(searchvector=vector)
                 # Filter based on search query OR location expansion
-                filters = Q(searchvector=query) | location_expansion_filter
+                filters = Q(search_vector=query) | location_expansion_filter
                 # Annotate for ranking
-                rank_annotation = SearchRank(vector, query)
+                rank_annotation = SearchRank(F('search_vector'), query)
             else:
                 # Fallback for non-PostgreSQL: standard icontains OR location expansion
                 base_text_filter = (
-                    Q(company_name__icontains=search_term_lower) | 
-                    Q(location__icontains=search_term_lower) | 
-                    Q(description__icontains=search_term_lower) | 
+                    Q(company_name__icontains=search_term_lower) |
+                    Q(location__icontains=search_term_lower) |
+                    Q(description__icontains=search_term_lower) |
                     Q(cmu_id__icontains=search_term_lower)
                 )
+
+                # Narrow the scan with the token index: a row can only contain the whole
+                # term if it contains every word of it, so the intersection is a superset
+                # of the matches and the icontains filter just verifies that small set
+                from .search_index import get_component_index
+                index = get_component_index()
+                search_words = search_term_lower.split()
+                if index is not None and search_words:
+                    candidate_pks = index.match_all(search_words)
+                    if len(candidate_pks) <= MAX_INDEX_CANDIDATES:
+                        base_text_filter = Q(pk__in=candidate_pks) & base_text_filter
+
                 filters = base_text_filter | location_expansion_filter
 
             has_filter = True
@@ -1133,13 +1143,8 @@ def get_components_from_database(cmu_id=None, component_id=None, location=None,
         logger.warning("get_components_from_database called with no filters or search term. Returning empty.")
         return [], 0
 
-    # Apply distinct if complex filters were used
-    if has_filter:
-        query_set = query_set.distinct()
-    
-    # Get total count before applying pagination
-    total_count = query_set.count()
-    logger.info(f"Total matching records: {total_count}")
+    # No DISTINCT needed: every filter is on the component table itself, so rows are
+    # already unique (and DISTINCT would stop the page and total sharing one query)
     
     # Apply ordering based on sort_order
     # --- Modified Ordering: Prioritize Rank if available --- 
@@ -1158,15 +1163,25 @@ def get_components_from_database(cmu_id=None, component_id=None, location=None,
             query_set = query_set.order_by('-delivery_year')
     # --- End Modified Ordering ---
 
-    # Apply pagination if provided
+    # Fetch the page (or first `limit` rows) together with the total in one query
     if page is not None and per_page is not None:
-        start = (page - 1) * per_page
-        paginated_queryset = query_set[start:start + per_page]
-    # Apply limit if pagination not used
+        paginator = CountingPaginator(query_set, per_page)
+        page_number = page
     elif limit:
-        paginated_queryset = query_set[:limit]
+        paginator = CountingPaginator(query_set, limit)
+        page_number = 1
     else:
+        paginator = None
         paginated_queryset = query_set # Or apply a default limit?
+        total_count = query_set.count()
+
+    if paginator is not None:
+        try:
+            paginated_queryset = paginator.page(page_number).object_list
+        except (EmptyPage, PageNotAnInteger):
+            paginated_queryset = []
+        total_count = paginator.count
+    logger.info(f"Total matching records: {total_count}")
     
     # Execute query and convert to list of dictionaries
     components = []
@@ -0,0 +1,116 @@
+"""
+Data version stamp for HTTP caching of the read-only JSON and HTMX endpoints.
+
+The map data, CMU details, company year and auction component endpoints only change when
+components are written (crawls, JSON migration, capacity/geocoding updates, on-demand
+fetches from the API). Every one of those paths calls bump_data_version(), which
+increments the DataVersion row. Views wrapped in @versioned_response get:
+
+    ETag: "<view>-<schema>-<version>"   (If-None-Match -> 304 Not Modified)
+    Last-Modified: <time of the last bump>  (If-Modified-Since -> 304)
+    Cache-Control: public, max-age=DATA_HTTP_CACHE_MAX_AGE
+
+via django.views.decorators.http.condition, so a repeat request costs one cached
+version read instead of recomputing and re-sending the payload, and a CDN or browser
+cache can answer it outright within max-age.
+
+Server-side caches of component-derived results (auction component trees, map
+clusters, company summaries, CMU component pks) build their keys with
+versioned_cache_key(), so a bump makes them miss instead of serving pre-write data
+for the rest of their TTL.
+"""
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from ..models import DataVersion
+from ..utils import get_cache_key
+
+logger = logging.getLogger(__name__)
+
+COMPONENT_DATA = "components"
+
+# Bump when the output of a @versioned_response view changes shape (new deploy, same
+# data), so clients holding the old ETag don't keep getting 304s
+ETAG_SCHEMA_VERSION = 1
+
+# How long browsers / CDNs may reuse a response without revalidating
+DATA_HTTP_CACHE_MAX_AGE = getattr(settings, "DATA_HTTP_CACHE_MAX_AGE", 300)
+
+# The stamp is read on every conditional request; the short TTL bounds how long other
+# workers keep serving the previous version after a bump
+DATA_VERSION_CACHE_TTL = 10
+
+
+def _cache_key(name):
+    return get_cache_key("data_version", name)
+
+
+def bump_data_version(name=COMPONENT_DATA):
+    """Increment the version stamp (creating it if missing); call after writing the data."""
+    now = timezone.now()
+    with transaction.atomic():
+        updated = DataVersion.objects.filter(name=name).update(version=F("version") + 1, updated_at=now)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    DataVersion.objects.create(name=name, version=1, updated_at=now)
+            except IntegrityError:
+                DataVersion.objects.filter(name=name).update(version=F("version") + 1, updated_at=now)
+    # After commit, so no request can re-cache the old stamp before the new one is visible
+    transaction.on_commit(lambda: cache.delete(_cache_key(name)))
+    logger.info(f"Bumped data version '{name}'")
+
+
+def get_data_version(name=COMPONENT_DATA):
+    """(version, updated_at) of the stamp, or (0, None) before the first bump."""
+    key = _cache_key(name)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = DataVersion.objects.filter(name=name).values_list("version", "updated_at").first() or (0, None)
+        cache.set(key, stamp, DATA_VERSION_CACHE_TTL)
+    return stamp
+
+
+def versioned_cache_key(prefix, identifier, name=COMPONENT_DATA):
+    """get_cache_key() for a value derived from the `name` data, keyed on its current version."""
+    version, _ = get_data_version(name)
+    return get_cache_key(prefix, f"{identifier}|v{version}")
+
+
+def versioned_response(view_func=None, *, name=COMPONENT_DATA, max_age=None):
+    """
+    Decorator for views whose output only depends on the request and the `name` data:
+    answers conditional GETs with 304 and marks 200 responses publicly cacheable.
+    """
+    max_age = DATA_HTTP_CACHE_MAX_AGE if max_age is None else max_age
+
+    def decorator(func):
+        def etag(request, *args, **kwargs):
+            version, _ = get_data_version(name)
+            return f'"{func.__name__}-{ETAG_SCHEMA_VERSION}-{version}"'
+
+        def last_modified(request, *args, **kwargs):
+            return get_data_version(name)[1]
+
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(func)
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(response, public=True, max_age=max_age)
+            return response
+
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
@@ -0,0 +1,278 @@
+"""
+Incremental (delta) sync of CMURegistry and Component with the NESO datastore.
+
+A crawl re-fetches components one CMU search at a time and skips CMUs that already
+have rows, so changed records are never picked up. `manage.py delta_sync` instead
+pages through each datastore resource in `_id` order, SYNC_PAGE_SIZE records per
+request, and compares every record's content hash (bulk_ingest.record_hash) with the
+content_hash column:
+
+    new hash       -> insert
+    different hash -> update
+    same hash      -> nothing is written
+    stored but not seen in a complete scan -> delete
+
+Writes go through bulk_ingest, so capacity totals, the data version and the company
+directory stay in step. The datastore has no per-record modification time, so a
+changed record can only be found by reading it; the full comparison costs one request
+per page of records rather than one per CMU. With new_only, the SyncWatermark row
+(the highest _id seen and the number of records up to it) is used to start reading
+right after the last record seen, which fetches only appended records; if that
+record is no longer where it was (records before it were deleted), the sync falls
+back to a full comparison.
+
+Deletes are skipped when a scan ends early or the resource total changes during it,
+and held back when they would remove more than max_delete_fraction of the table (a
+truncated API response shouldn't empty the database).
+"""
+import logging
+import time
+
+from django.utils import timezone
+
+from ..models import CMURegistry, Component, SyncWatermark
+from .bulk_ingest import (
+    delete_cmu_registry,
+    delete_components,
+    ingest_components,
+    record_hash,
+    source_record,
+    upsert_cmu_registry,
+)
+from .company_directory import refresh_company_directory
+from .crawler import CMU_RESOURCE_ID, COMPONENT_RESOURCE_ID
+
+logger = logging.getLogger(__name__)
+
+# Records per datastore_search request (the API allows up to 32000)
+SYNC_PAGE_SIZE = 5000
+
+# Largest share of a table a sync may delete without allow_mass_delete
+MAX_DELETE_FRACTION = 0.05
+
+
+def _applicant(cmu_record):
+    return (cmu_record or {}).get("Name of Applicant") or (cmu_record or {}).get("Parent Company")
+
+
+def _new_summary(resource_id, mode):
+    return {
+        "resource_id": resource_id,
+        "mode": mode,
+        "fetched": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "deleted": 0,
+        "deletes_held_back": 0,
+        "errors": 0,
+        "complete": False,
+        "max_record_id": 0,
+        "record_count": 0,
+        "seconds": 0.0,
+    }
+
+
+def _start_offset(client, resource_id, watermark):
+    """
+    Offset of the first record after the watermark, or None when the watermark record
+    isn't at the offset it had (records before it were deleted or renumbered).
+    """
+    if not watermark or not watermark.record_count:
+        return None
+    result = client.datastore_search(resource_id, limit=1, offset=watermark.record_count - 1, sort="_id asc")
+    records = result.get("records") or []
+    if records and records[0].get("_id") == watermark.max_record_id:
+        return watermark.record_count
+    return None
+
+
+def scan_resource(client, resource_id, offset=0, page_size=SYNC_PAGE_SIZE, summary=None):
+    """
+    Yield pages (lists of records) of a datastore resource in _id order from `offset`.
+    Sets summary['complete'] when the scan reached the end and the resource total didn't
+    change during it, and tracks fetched / max_record_id / record_count.
+    """
+    summary = summary if summary is not None else _new_summary(resource_id, "scan")
+    total = None
+    while True:
+        result = client.datastore_search(resource_id, limit=page_size, offset=offset, sort="_id asc")
+        records = result.get("records") or []
+        page_total = result.get("total")
+        if total is None:
+            total = page_total
+        elif page_total != total:
+            logger.warning(f"{resource_id}: total changed from {total} to {page_total} during the scan")
+            total = page_total
+            summary["total_changed"] = True
+
+        if records:
+            offset += len(records)
+            summary["fetched"] += len(records)
+            summary["record_count"] = offset
+            ids = [record["_id"] for record in records if isinstance(record.get("_id"), int)]
+            if ids:
+                summary["max_record_id"] = max(summary["max_record_id"], max(ids))
+            yield records
+
+        if not records or len(records) < page_size or (total is not None and offset >= total):
+            break
+
+    summary["complete"] = not summary.get("total_changed") and (total is None or offset >= total)
+
+
+def _deletable(summary, stale, stored_count, allow_deletes, allow_mass_delete, max_delete_fraction):
+    """The stale keys to delete, recording held-back deletes in the summary."""
+    # Only a full scan sees every record; a new_only run never deletes
+    if not stale or not allow_deletes or summary["mode"] != "full":
+        return []
+    if not summary["complete"]:
+        logger.warning(f"{summary['resource_id']}: scan incomplete, not deleting {len(stale)} stale rows")
+        summary["deletes_held_back"] = len(stale)
+        return []
+    if not allow_mass_delete and len(stale) > max_delete_fraction * stored_count:
+        logger.warning(
+            f"{summary['resource_id']}: {len(stale)} of {stored_count} rows would be deleted "
+            f"(over {max_delete_fraction:.0%}); held back"
+        )
+        summary["deletes_held_back"] = len(stale)
+        return []
+    return sorted(stale)
+
+
+def _save_watermark(summary):
+    now = timezone.now()
+    defaults = {
+        "max_record_id": summary["max_record_id"],
+        "record_count": summary["record_count"],
+        "last_synced_at": now,
+        "last_summary": summary,
+    }
+    if summary["mode"] == "full" and summary["complete"]:
+        defaults["last_full_sync_at"] = now
+    SyncWatermark.objects.update_or_create(resource_id=summary["resource_id"], defaults=defaults)
+
+
+def _begin(client, resource_id, new_only):
+    """(summary, start offset) for a run, falling back to a full scan without a usable watermark."""
+    if new_only:
+        watermark = SyncWatermark.objects.filter(resource_id=resource_id).first()
+        offset = _start_offset(client, resource_id, watermark)
+        if offset is not None:
+            summary = _new_summary(resource_id, "new_only")
+            summary["max_record_id"] = watermark.max_record_id
+            summary["record_count"] = watermark.record_count
+            return summary, offset
+        logger.info(f"{resource_id}: no usable watermark, comparing every record")
+    return _new_summary(resource_id, "full"), 0
+
+
+def sync_cmu_registry(client, new_only=False, page_size=SYNC_PAGE_SIZE, dry_run=False, allow_deletes=True,
+                      allow_mass_delete=False, max_delete_fraction=MAX_DELETE_FRACTION, progress=None):
+    """
+    Sync CMURegistry with the CMU resource. Returns (summary, applicants) where
+    applicants is {cmu_id: applicant name} for the CMU records fetched.
+    """
+    started = time.time()
+    summary, offset = _begin(client, CMU_RESOURCE_ID, new_only)
+    stored = dict(CMURegistry.objects.values_list("cmu_id", "content_hash"))
+    seen = set()
+    applicants = {}
+
+    for records in scan_resource(client, CMU_RESOURCE_ID, offset, page_size, summary):
+        changed = []
+        for record in records:
+            cmu_id = record.get("CMU ID")
+            if not cmu_id:
+                summary["errors"] += 1
+                continue
+            seen.add(cmu_id)
+            applicants[cmu_id] = _applicant(record)
+            stored_hash = stored.get(cmu_id, False)
+            if stored_hash is False:
+                summary["inserted"] += 1
+            elif stored_hash != record_hash(record):
+                summary["updated"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            changed.append((cmu_id, record))
+        if changed and not dry_run:
+            upsert_cmu_registry(changed)
+        if progress:
+            progress(summary)
+
+    stale = _deletable(summary, set(stored) - seen, len(stored), allow_deletes, allow_mass_delete, max_delete_fraction)
+    summary["deleted"] = len(stale)
+    if stale and not dry_run:
+        delete_cmu_registry(stale)
+
+    summary["seconds"] = round(time.time() - started, 2)
+    if not dry_run:
+        _save_watermark(summary)
+    return summary, applicants
+
+
+def sync_components(client, applicants=None, new_only=False, page_size=SYNC_PAGE_SIZE, dry_run=False,
+                    allow_deletes=True, allow_mass_delete=False, max_delete_fraction=MAX_DELETE_FRACTION,
+                    progress=None):
+    """
+    Sync Component with the component resource. `applicants` ({cmu_id: name}, e.g. from
+    sync_cmu_registry) supplies the company for records without one, over the names in
+    CMURegistry. Returns the summary.
+    """
+    started = time.time()
+    summary, offset = _begin(client, COMPONENT_RESOURCE_ID, new_only)
+    company_names = {
+        cmu_id: _applicant(raw_data) for cmu_id, raw_data in CMURegistry.objects.values_list("cmu_id", "raw_data")
+    }
+    company_names.update(applicants or {})
+    stored = dict(
+        Component.objects.filter(component_id__isnull=False).values_list("component_id", "content_hash")
+    )
+    seen = set()
+    companies_touched = set()
+
+    for records in scan_resource(client, COMPONENT_RESOURCE_ID, offset, page_size, summary):
+        changed = []
+        for record in records:
+            cmu_id = record.get("CMU ID")
+            if not cmu_id or record.get("_id") in (None, ""):
+                summary["errors"] += 1
+                continue
+            component_id = str(record["_id"])
+            seen.add(component_id)
+            stored_hash = stored.get(component_id, False)
+            if stored_hash is False:
+                summary["inserted"] += 1
+            elif stored_hash != record_hash(source_record(record, company_names.get(cmu_id))):
+                summary["updated"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            changed.append((cmu_id, record))
+        if changed and not dry_run:
+            result = ingest_components(
+                changed, company_names=company_names, update_existing=True, refresh_companies=False
+            )
+            summary["errors"] += result["errors"]
+            companies_touched.update(result["companies"])
+        if progress:
+            progress(summary)
+
+    stale = _deletable(summary, set(stored) - seen, len(stored), allow_deletes, allow_mass_delete, max_delete_fraction)
+    summary["deleted"] = len(stale)
+    if stale and not dry_run:
+        companies_touched.update(delete_components(stale, refresh_companies=False)["companies"])
+
+    if companies_touched:
+        try:
+            refresh_company_directory(companies_touched)
+        except Exception as e:
+            logger.error(f"Error refreshing company directory: {e}")
+            summary["errors"] += 1
+
+    summary["seconds"] = round(time.time() - started, 2)
+    if not dry_run:
+        _save_watermark(summary)
+    return summary
@@ -0,0 +1,208 @@
+"""
+Streaming reads of the json_data/components_*.json shards.
+
+A shard is one JSON object mapping CMU IDs to lists of component records:
+
+    {"CMU1": [{...}, {...}], "CMU2": [...], ...}
+
+iter_shard_components() walks it with json.JSONDecoder.raw_decode over a buffer that
+is refilled in SHARD_READ_SIZE chunks, yielding one (cmu_id, component) pair at a time,
+so memory is bounded by the largest single component rather than the shard size.
+ingest_shard() feeds those pairs to bulk_ingest in fixed-size batches (one
+component_id__in prefetch and one upsert per batch). It only uses module-level state,
+so `migrate_json_to_db --workers N` can run it in separate processes, one shard each.
+"""
+import json
+import logging
+import os
+
+from .bulk_ingest import INGEST_BATCH_SIZE, ingest_components, record_hash
+
+logger = logging.getLogger(__name__)
+
+# Characters read from a shard at a time
+SHARD_READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class ShardFormatError(ValueError):
+    """The shard is not a JSON object of lists (or is truncated)."""
+
+
+class _ShardReader:
+    """Buffered cursor over a text file for raw_decode-based parsing."""
+
+    def __init__(self, f, read_size=SHARD_READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read another chunk, dropping what has been consumed. False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), '' at end of file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, *chars):
+        char = self.peek()
+        if char not in chars:
+            raise ShardFormatError(f"Expected {' or '.join(repr(c) for c in chars)}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ShardFormatError(f"Invalid or truncated JSON: {e}") from e
+            # A number running to the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_shard_components(path, read_size=SHARD_READ_SIZE):
+    """
+    Yield (cmu_id, component) pairs from a component shard in file order, without
+    loading the file. CMUs with no components (an empty list or null) yield
+    (cmu_id, None) once, so callers can still count them. Raises ShardFormatError on malformed input.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _ShardReader(f, read_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            cmu_id = reader.value()
+            if not isinstance(cmu_id, str):
+                raise ShardFormatError(f"Expected a CMU ID string, found {cmu_id!r}")
+            reader.expect(":")
+            if reader.peek() != "[":
+                # null / {} for a CMU with no components
+                if reader.value():
+                    raise ShardFormatError(f"Expected a list of components for {cmu_id}")
+                yield cmu_id, None
+            elif reader.expect("[") and reader.peek() == "]":
+                reader.pos += 1
+                yield cmu_id, None
+            else:
+                while True:
+                    yield cmu_id, reader.value()
+                    if reader.expect(",", "]") == "]":
+                        break
+            if reader.expect(",", "}") == "}":
+                break
+
+
+def ingest_shard(path, batch_size=INGEST_BATCH_SIZE, update_existing=True, dry_run=False, progress=None):
+    """
+    Stream one shard into the database in batches of `batch_size` components.
+    Components already stored are updated from the shard with update_existing, and
+    skipped otherwise. progress(stats) is called after every batch.
+
+    Returns a stats dict (cmu_ids_processed, components_found, components_added,
+    components_updated, components_skipped, errors, batches, companies) where companies
+    is the set of company names touched, for one company directory refresh at the end.
+    """
+    return ingest_pairs(
+        iter_shard_components(path), os.path.basename(path), batch_size, update_existing, dry_run, progress
+    )
+
+
+def ingest_pairs(pairs, name, batch_size=INGEST_BATCH_SIZE, update_existing=True, dry_run=False, progress=None):
+    """
+    ingest_shard() for any iterable of (cmu_id, component) pairs in CMU order, e.g.
+    the component store's entries; `name` labels the stats.
+    """
+    from ..models import Component
+
+    stats = {
+        "file": name,
+        "cmu_ids_processed": 0,
+        "components_found": 0,
+        "components_added": 0,
+        "components_updated": 0,
+        "components_skipped": 0,
+        "errors": 0,
+        "batches": 0,
+        "companies": set(),
+    }
+
+    def flush(batch):
+        if dry_run:
+            # One query for the batch to report what would be added, updated or skipped
+            records = {
+                str(r["_id"]): r for _, r in batch if isinstance(r, dict) and r.get("_id") not in (None, "")
+            }
+            stored = dict(
+                Component.objects.filter(component_id__in=list(records)).values_list("component_id", "content_hash")
+            )
+            for component_id, record in records.items():
+                if component_id not in stored:
+                    stats["components_added"] += 1
+                elif update_existing and stored[component_id] != record_hash(record):
+                    stats["components_updated"] += 1
+                else:
+                    stats["components_skipped"] += 1
+            stats["components_added"] += len(batch) - len(records)  # No _id: always inserted
+        else:
+            result = ingest_components(
+                batch, update_existing=update_existing, batch_size=batch_size, refresh_companies=False
+            )
+            stats["components_added"] += result["added"]
+            stats["components_updated"] += result["updated"]
+            stats["components_skipped"] += result["skipped"]
+            stats["errors"] += result["errors"]
+            stats["companies"].update(result["companies"])
+        stats["batches"] += 1
+        if progress:
+            progress(stats)
+
+    batch = []
+    last_cmu_id = None
+    try:
+        for cmu_id, component in pairs:
+            if cmu_id != last_cmu_id:
+                stats["cmu_ids_processed"] += 1
+                last_cmu_id = cmu_id
+            if component is None:
+                continue
+            stats["components_found"] += 1
+            batch.append((cmu_id, component))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except (OSError, ShardFormatError) as e:
+        # Components read before the error are still saved
+        logger.error(f"Error reading {name}: {e}")
+        stats["errors"] += 1
+        stats["error"] = str(e)
+    if batch:
+        flush(batch)
+    return stats
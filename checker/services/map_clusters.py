@@ -0,0 +1,254 @@
+"""
+Server-side grid clustering for the map.
+
+map_data_api sends every matching component (up to 5000, each with its description) and
+leaves the browser to cluster them. map_clusters_api instead buckets the components in
+the requested bounding box into a grid whose cell size follows the zoom level, with one
+grouped query (count, coordinate sums and technology per cell), and returns one feature
+per occupied cell. Individual points are only sent from MAP_CLUSTER_MAX_ZOOM upwards,
+so the payload at country-level zoom is bounded by the number of cells on screen.
+
+Point responses can also be compact (format=compact / binary): parallel coordinate, id
+and technology-code arrays with a technology dictionary, with no per-point title,
+description or URL. The map fetches those per marker from map_marker_api when a marker
+is clicked (marker_details).
+"""
+import json
+import logging
+import math
+import sys
+from array import array
+
+from django.conf import settings
+from django.db.models import Count, F, FloatField, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Floor
+
+logger = logging.getLogger(__name__)
+
+# From this zoom level up, individual components are returned instead of clusters
+MAP_CLUSTER_MAX_ZOOM = getattr(settings, 'MAP_CLUSTER_MAX_ZOOM', 13)
+
+# Grid cells per 256px map tile along each axis (4 -> roughly 64px cells on screen)
+MAP_CLUSTER_CELLS_PER_TILE = 4
+
+# Upper bound on cells in one response; the cell size doubles until the bbox fits
+MAP_CLUSTER_MAX_CELLS = 4096
+
+# Cap on individual points returned past MAP_CLUSTER_MAX_ZOOM
+MAP_POINT_LIMIT = getattr(settings, 'MAP_POINT_LIMIT', 2000)
+
+MAP_CLUSTER_CACHE_TTL = 300
+
+MIN_ZOOM, MAX_ZOOM = 0, 22
+
+# Fields needed to build a point feature (see component_feature)
+POINT_FIELDS = (
+    'id', 'cmu_id', 'location', 'technology', 'company_name',
+    'description', 'delivery_year', 'latitude', 'longitude',
+)
+
+
+def cell_size_for_zoom(zoom):
+    """Grid cell edge in degrees for a zoom level (a map tile spans 360 / 2**zoom degrees)."""
+    return 360.0 / (2 ** zoom) / MAP_CLUSTER_CELLS_PER_TILE
+
+
+def snap_bbox(bbox, cell_size):
+    """
+    Widen (south, west, north, east) outwards to whole grid cells, so every cell in the
+    response is complete and small pans map onto the same (cacheable) request.
+    """
+    south, west, north, east = bbox
+    return (
+        max(math.floor(south / cell_size) * cell_size, -90.0),
+        max(math.floor(west / cell_size) * cell_size, -180.0),
+        min(math.ceil(north / cell_size) * cell_size, 90.0),
+        min(math.ceil(east / cell_size) * cell_size, 180.0),
+    )
+
+
+def component_feature(component):
+    """GeoJSON point feature for one component (what map_data_api returns)."""
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [component.longitude, component.latitude]  # GeoJSON uses [lng, lat] order
+        },
+        'properties': {
+            'id': component.id,
+            'cmu_id': component.cmu_id,
+            'title': component.location or 'Unknown Location',
+            'technology': component.technology or 'Unknown',
+            'company': component.company_name or 'Unknown',
+            'description': component.description or '',
+            'delivery_year': component.delivery_year or '',
+            'detailUrl': f'/component/{component.id}/'
+        }
+    }
+
+
+def _cell_size(zoom, bbox):
+    cell_size = cell_size_for_zoom(zoom)
+    if bbox is None:
+        return cell_size
+    south, west, north, east = bbox
+    width = (east - west) % 360 or 360
+    while (north - south) / cell_size * width / cell_size > MAP_CLUSTER_MAX_CELLS:
+        cell_size *= 2
+    return cell_size
+
+
+def cluster_features(queryset, zoom, bbox=None):
+    """
+    Grid clusters for the components in `queryset` (already filtered to the viewport).
+    Returns (features, cell_size). Each feature is a Point at the centroid of its cell's
+    components with properties: cluster, count, technologies ({name: count}, largest first)
+    and bounds [south, west, north, east] of the cell, for zooming in on click.
+    """
+    cell_size = _cell_size(zoom, bbox)
+    cell = Value(cell_size, output_field=FloatField())
+
+    rows = (
+        queryset.annotate(
+            cell_x=Cast(Floor(F('longitude') / cell), IntegerField()),
+            cell_y=Cast(Floor(F('latitude') / cell), IntegerField()),
+        )
+        .values('cell_x', 'cell_y', 'technology')
+        .annotate(count=Count('id'), latitude_sum=Sum('latitude'), longitude_sum=Sum('longitude'))
+        .order_by()
+    )
+
+    cells = {}
+    for row in rows:
+        key = (row['cell_x'], row['cell_y'])
+        entry = cells.get(key)
+        if entry is None:
+            entry = cells[key] = {'count': 0, 'latitude_sum': 0.0, 'longitude_sum': 0.0, 'technologies': {}}
+        entry['count'] += row['count']
+        entry['latitude_sum'] += row['latitude_sum']
+        entry['longitude_sum'] += row['longitude_sum']
+        technology = row['technology'] or 'Unknown'
+        entry['technologies'][technology] = entry['technologies'].get(technology, 0) + row['count']
+
+    features = []
+    for (cell_x, cell_y), entry in sorted(cells.items()):
+        count = entry['count']
+        features.append({
+            'type': 'Feature',
+            'id': f"{zoom}:{cell_x}:{cell_y}",
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [
+                    round(entry['longitude_sum'] / count, 6),
+                    round(entry['latitude_sum'] / count, 6),
+                ]
+            },
+            'properties': {
+                'cluster': True,
+                'count': count,
+                'technologies': dict(sorted(entry['technologies'].items(), key=lambda item: (-item[1], item[0]))),
+                'bounds': [
+                    cell_y * cell_size, cell_x * cell_size,
+                    (cell_y + 1) * cell_size, (cell_x + 1) * cell_size,
+                ],
+            }
+        })
+    return features, cell_size
+
+
+def point_features(queryset, limit=MAP_POINT_LIMIT):
+    """Individual component features (at most `limit`), plus whether more matched."""
+    components = list(queryset.only(*POINT_FIELDS).order_by('id')[:limit + 1])
+    truncated = len(components) > limit
+    return [component_feature(component) for component in components[:limit]], truncated
+
+
+# --- Compact point formats ---
+
+# Fields needed for a compact point (see compact_points)
+COMPACT_FIELDS = ('id', 'longitude', 'latitude', 'technology')
+
+# Coordinates in compact JSON are rounded to this many decimals (~0.1m)
+COMPACT_COORDINATE_DECIMALS = 6
+
+MAP_FORMAT_GEOJSON = 'geojson'
+MAP_FORMAT_COMPACT = 'compact'
+MAP_FORMAT_BINARY = 'binary'
+MAP_FORMATS = (MAP_FORMAT_GEOJSON, MAP_FORMAT_COMPACT, MAP_FORMAT_BINARY)
+
+BINARY_MAGIC = b'CMAP'
+BINARY_VERSION = 1
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+
+
+def compact_points(queryset, limit):
+    """
+    Columnar points for the components in `queryset` (at most `limit`, in the queryset's
+    order): {'ids', 'lng', 'lat', 'tech'} parallel arrays, where tech holds indexes into
+    'technologies' ('Unknown' for components without one).
+    """
+    ids, lngs, lats, codes = [], [], [], []
+    technology_codes = {}
+    for component_id, longitude, latitude, technology in queryset.values_list(*COMPACT_FIELDS)[:limit]:
+        technology = technology or 'Unknown'
+        code = technology_codes.get(technology)
+        if code is None:
+            code = technology_codes[technology] = len(technology_codes)
+        ids.append(component_id)
+        lngs.append(round(longitude, COMPACT_COORDINATE_DECIMALS))
+        lats.append(round(latitude, COMPACT_COORDINATE_DECIMALS))
+        codes.append(code)
+    return {
+        'ids': ids,
+        'lng': lngs,
+        'lat': lats,
+        'tech': codes,
+        'technologies': list(technology_codes),
+    }
+
+
+def _typed(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def pack_compact_points(points, metadata):
+    """
+    Binary form of compact_points() output, for typed-array decoding in the browser.
+    Layout (little-endian):
+
+        4 bytes   b'CMAP'
+        uint32    header length H
+        H bytes   UTF-8 JSON {version, count, technologies, metadata}, space-padded so
+                  the arrays below start on a 4-byte boundary
+        float32   lng[count]
+        float32   lat[count]
+        uint32    ids[count]
+        uint16    tech[count]
+
+    float32 keeps coordinates to well under a metre at UK latitudes.
+    """
+    header = json.dumps({
+        'version': BINARY_VERSION,
+        'count': len(points['ids']),
+        'technologies': points['technologies'],
+        'metadata': metadata,
+    }).encode('utf-8')
+    header += b' ' * (-(len(BINARY_MAGIC) + 4 + len(header)) % 4)
+    return b''.join([
+        BINARY_MAGIC,
+        _typed('I', [len(header)]),
+        header,
+        _typed('f', points['lng']),
+        _typed('f', points['lat']),
+        _typed('I', points['ids']),
+        _typed('H', points['tech']),
+    ])
+
+
+def marker_details(component):
+    """The per-point properties left out of the compact formats (for map_marker_api)."""
+    return component_feature(component)['properties']
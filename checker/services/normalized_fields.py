@@ -0,0 +1,43 @@
+"""
+Backfill for the normalized lookup columns on Component (company_name_norm, cmu_id_norm).
+
+save() and bulk_create() keep them current; this covers rows written before the
+columns existed and anything changed through bulk_update()/QuerySet.update().
+"""
+import logging
+
+from django.db.models import Q
+
+from ..utils import normalize
+from .backfill import backfill_in_batches
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_normalized_fields(component_model=None, batch_size=2000, only_missing=True, progress=None):
+    """
+    Recompute company_name_norm/cmu_id_norm in pk-ordered batches, writing only rows
+    whose stored values differ. component_model lets migrations pass their historical
+    model. progress(processed, updated) is called after each batch.
+
+    Returns (rows_checked, rows_updated).
+    """
+    if component_model is None:
+        from ..models import Component
+        component_model = Component
+
+    queryset = component_model.objects.all()
+    if only_missing:
+        queryset = queryset.filter(Q(company_name_norm__isnull=True) | Q(cmu_id_norm__isnull=True))
+
+    checked, updated = backfill_in_batches(
+        queryset,
+        ('company_name', 'cmu_id'),
+        ('company_name_norm', 'cmu_id_norm'),
+        lambda company_name, cmu_id: (normalize(company_name), normalize(cmu_id)),
+        batch_size=batch_size,
+        progress=progress,
+    )
+
+    logger.info(f"Normalized field backfill: {checked} rows checked, {updated} updated")
+    return checked, updated
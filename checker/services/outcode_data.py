@@ -0,0 +1,429 @@
+"""
+Outcode dataset behind postcode_helpers: CSV import/export and offline enrichment from
+postcodes.io.
+
+CSV layout (header row required, one row per outcode; multi-valued columns use '|'):
+
+    outcode,latitude,longitude,admin_district,parliamentary_constituency,region,country
+    SW16,51.4205,-0.1285,Lambeth|Croydon|Merton,Streatham and Croydon North,London,England
+
+`manage.py load_outcodes` reads it into the Outcode table (default path OUTCODE_CSV_PATH).
+`manage.py enrich_outcodes` resolves the outcodes that appear in component locations
+through postcodes.io instead: sample full postcodes are sent to the bulk lookup
+(POST /postcodes, 100 per request) from a small thread pool, and outcodes with no
+resolvable sample fall back to GET /outcodes/<outcode>. Every request has a timeout.
+Neither runs in the request path.
+
+The bundled data_storage/outcodes.csv (loaded by migration 0017) was built without
+network access by `manage.py enrich_outcodes --offline`, from the component data
+itself: the centroid is the mean of the components' OS grid references, and
+admin_district holds the place names written just before the postcode in their
+locations (mostly post towns). Region, country and constituency are left empty;
+`enrich_outcodes --all` replaces the rows with postcodes.io data.
+"""
+import csv
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Component, Outcode
+from .postcode_helpers import POSTCODES_IO_BASE_URL, POSTCODES_IO_TIMEOUT, clear_outcode_index, split_postcode
+
+logger = logging.getLogger(__name__)
+
+OUTCODE_CSV_PATH = os.path.join(settings.BASE_DIR, 'data_storage', 'outcodes.csv')
+
+CSV_FIELDS = (
+    'outcode', 'latitude', 'longitude', 'admin_district',
+    'parliamentary_constituency', 'region', 'country',
+)
+LIST_FIELDS = ('admin_district', 'parliamentary_constituency')
+LIST_SEPARATOR = '|'
+
+# postcodes.io accepts at most 100 postcodes per bulk lookup
+POSTCODES_IO_BULK_LIMIT = 100
+
+# Full postcodes per outcode sent for resolution (districts are collected from all of them)
+SAMPLES_PER_OUTCODE = 5
+
+# A full UK postcode anywhere in a location string
+POSTCODE_IN_TEXT_RE = re.compile(r'\b([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][A-Z]{2})\b', re.IGNORECASE)
+
+# OS National Grid reference with the spaces removed: two letters, then an even number
+# of digits ("TQ 270 715" -> "TQ270715")
+GRID_REFERENCE_RE = re.compile(r'^([HJNOST])([A-HJ-Z])(\d{2,10})$')
+
+# Place names kept per outcode by the offline build (most frequent first)
+OFFLINE_PLACE_NAMES = 3
+
+# A place name: letters, spaces, hyphens, apostrophes and dots, at most three words
+PLACE_NAME_RE = re.compile(r"^[A-Za-z][A-Za-z.'\- ]*$")
+
+# Names written before a postcode that are not a district
+NOT_PLACE_NAMES = frozenset({
+    'united kingdom', 'uk', 'u.k.', 'great britain', 'gb', 'britain', 'england', 'scotland', 'wales',
+    'northern ireland', 'site', 'address', 'postcode', 'post code', 'tbc', 'various',
+})
+
+
+# --- CSV ---
+
+def _float(value):
+    try:
+        return float(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def read_outcodes_csv(path=OUTCODE_CSV_PATH):
+    """Rows of an outcode CSV as Outcode field dicts; malformed outcodes are skipped."""
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = [field for field in ('outcode',) if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} has no {', '.join(missing)} column")
+        for line in reader:
+            outcode, incode = split_postcode(line.get('outcode'))
+            if not outcode or incode:
+                logger.warning(f"Skipping malformed outcode {line.get('outcode')!r} in {path}")
+                continue
+            rows.append({
+                'outcode': outcode,
+                'latitude': _float(line.get('latitude')),
+                'longitude': _float(line.get('longitude')),
+                'admin_district': [v.strip() for v in (line.get('admin_district') or '').split(LIST_SEPARATOR) if v.strip()],
+                'parliamentary_constituency': [
+                    v.strip() for v in (line.get('parliamentary_constituency') or '').split(LIST_SEPARATOR) if v.strip()
+                ],
+                'region': (line.get('region') or '').strip(),
+                'country': (line.get('country') or '').strip(),
+            })
+    return rows
+
+
+def write_outcodes_csv(path=OUTCODE_CSV_PATH, rows=None):
+    """Write rows (default: the whole Outcode table) as an outcode CSV; returns the row count."""
+    if rows is None:
+        rows = Outcode.objects.order_by('outcode').values(*CSV_FIELDS)
+    count = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            row = {field: row.get(field) for field in CSV_FIELDS}
+            for field in LIST_FIELDS:
+                row[field] = LIST_SEPARATOR.join(row[field] or [])
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def save_outcodes(rows, replace=False):
+    """
+    Upsert Outcode rows (dicts as returned by read_outcodes_csv / enrich_outcodes); with
+    replace, outcodes not in `rows` are deleted. Returns the number of rows written.
+    """
+    rows = {row['outcode']: row for row in rows}
+    with transaction.atomic():
+        if replace:
+            Outcode.objects.exclude(outcode__in=list(rows)).delete()
+        Outcode.objects.bulk_create(
+            [Outcode(**row) for row in rows.values()],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['outcode'],
+            update_fields=[field for field in CSV_FIELDS if field != 'outcode'],
+        )
+    clear_outcode_index()
+    logger.info(f"Saved {len(rows)} outcodes (replace={replace})")
+    return len(rows)
+
+
+# --- Offline build from component data ---
+
+def _grid_letter(letter):
+    index = ord(letter) - ord('A')
+    return index - 1 if index > 7 else index  # The grid has no I
+
+
+def grid_reference_to_osgb(reference):
+    """(easting, northing) in metres for an OS grid reference, None if malformed."""
+    match = GRID_REFERENCE_RE.match(re.sub(r'\s+', '', (reference or '').upper()))
+    if not match or len(match.group(3)) % 2:
+        return None
+    first, second, digits = match.groups()
+    east, north = digits[:len(digits) // 2], digits[len(digits) // 2:]
+    l1, l2 = _grid_letter(first), _grid_letter(second)
+    square_e = ((l1 - 2) % 5) * 5 + (l2 % 5)
+    square_n = (19 - (l1 // 5) * 5) - (l2 // 5)
+    scale = 10 ** (5 - len(east))
+    # Centre of the square the reference names
+    return (
+        square_e * 100000 + int(east) * scale + scale / 2,
+        square_n * 100000 + int(north) * scale + scale / 2,
+    )
+
+
+# Airy 1830 ellipsoid and National Grid projection
+_AIRY_A, _AIRY_B = 6377563.396, 6356256.909
+_GRID_F0, _GRID_LAT0, _GRID_LON0 = 0.9996012717, math.radians(49), math.radians(-2)
+_GRID_E0, _GRID_N0 = 400000, -100000
+# GRS80 (WGS84) ellipsoid
+_WGS84_A, _WGS84_B = 6378137.0, 6356752.3141
+# OSGB36 -> WGS84 Helmert transformation (translations in m, scale in ppm, rotations in arc seconds)
+_HELMERT = {'tx': -446.448, 'ty': 125.157, 'tz': -542.060, 's': 20.4894, 'rx': -0.1502, 'ry': -0.2470, 'rz': -0.8421}
+
+
+def _osgb_to_airy_latlng(easting, northing):
+    """Inverse transverse Mercator onto the Airy ellipsoid (OS 'A guide to coordinate systems', C.2)."""
+    a, b, f0 = _AIRY_A, _AIRY_B, _GRID_F0
+    e2 = 1 - (b * b) / (a * a)
+    n = (a - b) / (a + b)
+
+    def meridional_arc(lat):
+        dlat, slat = lat - _GRID_LAT0, lat + _GRID_LAT0
+        return b * f0 * (
+            (1 + n + 1.25 * n ** 2 + 1.25 * n ** 3) * dlat
+            - (3 * n + 3 * n ** 2 + 21 / 8 * n ** 3) * math.sin(dlat) * math.cos(slat)
+            + (15 / 8 * n ** 2 + 15 / 8 * n ** 3) * math.sin(2 * dlat) * math.cos(2 * slat)
+            - 35 / 24 * n ** 3 * math.sin(3 * dlat) * math.cos(3 * slat)
+        )
+
+    lat, arc = _GRID_LAT0, 0.0
+    while True:
+        lat = (northing - _GRID_N0 - arc) / (a * f0) + lat
+        arc = meridional_arc(lat)
+        if abs(northing - _GRID_N0 - arc) < 0.00001:
+            break
+
+    sin_lat, tan_lat = math.sin(lat), math.tan(lat)
+    sec_lat = 1 / math.cos(lat)
+    nu = a * f0 / math.sqrt(1 - e2 * sin_lat ** 2)
+    rho = a * f0 * (1 - e2) / (1 - e2 * sin_lat ** 2) ** 1.5
+    eta2 = nu / rho - 1
+    t2, t4, t6 = tan_lat ** 2, tan_lat ** 4, tan_lat ** 6
+
+    vii = tan_lat / (2 * rho * nu)
+    viii = tan_lat / (24 * rho * nu ** 3) * (5 + 3 * t2 + eta2 - 9 * t2 * eta2)
+    ix = tan_lat / (720 * rho * nu ** 5) * (61 + 90 * t2 + 45 * t4)
+    x = sec_lat / nu
+    xi = sec_lat / (6 * nu ** 3) * (nu / rho + 2 * t2)
+    xii = sec_lat / (120 * nu ** 5) * (5 + 28 * t2 + 24 * t4)
+    xiia = sec_lat / (5040 * nu ** 7) * (61 + 662 * t2 + 1320 * t4 + 720 * t6)
+
+    de = easting - _GRID_E0
+    return (
+        lat - vii * de ** 2 + viii * de ** 4 - ix * de ** 6,
+        _GRID_LON0 + x * de - xi * de ** 3 + xii * de ** 5 - xiia * de ** 7,
+    )
+
+
+def _airy_to_wgs84(lat, lng):
+    """Helmert transformation of an Airy (OSGB36) position at height 0 to WGS84, in degrees."""
+    a, b = _AIRY_A, _AIRY_B
+    e2 = 1 - (b * b) / (a * a)
+    nu = a / math.sqrt(1 - e2 * math.sin(lat) ** 2)
+    x1 = nu * math.cos(lat) * math.cos(lng)
+    y1 = nu * math.cos(lat) * math.sin(lng)
+    z1 = (1 - e2) * nu * math.sin(lat)
+
+    h = _HELMERT
+    scale = 1 + h['s'] * 1e-6
+    rx, ry, rz = (math.radians(h[k] / 3600) for k in ('rx', 'ry', 'rz'))
+    x2 = h['tx'] + scale * x1 - rz * y1 + ry * z1
+    y2 = h['ty'] + rz * x1 + scale * y1 - rx * z1
+    z2 = h['tz'] - ry * x1 + rx * y1 + scale * z1
+
+    a, b = _WGS84_A, _WGS84_B
+    e2 = 1 - (b * b) / (a * a)
+    p = math.sqrt(x2 * x2 + y2 * y2)
+    lat = math.atan2(z2, p * (1 - e2))
+    while True:
+        nu = a / math.sqrt(1 - e2 * math.sin(lat) ** 2)
+        next_lat = math.atan2(z2 + e2 * nu * math.sin(lat), p)
+        if abs(next_lat - lat) < 1e-12:
+            break
+        lat = next_lat
+    return math.degrees(next_lat), math.degrees(math.atan2(y2, x2))
+
+
+def grid_reference_to_latlng(reference):
+    """WGS84 (latitude, longitude) of an OS grid reference, None if malformed."""
+    point = grid_reference_to_osgb(reference)
+    if point is None:
+        return None
+    return _airy_to_wgs84(*_osgb_to_airy_latlng(*point))
+
+
+def _place_before(location, start):
+    """The comma-separated part of `location` just before index `start`, if it reads as a place name."""
+    name = location[:start].rstrip(' ,.').rsplit(',', 1)[-1].strip()
+    if not name or len(name.split()) > 3 or not PLACE_NAME_RE.match(name) or name.lower() in NOT_PLACE_NAMES:
+        return None
+    return name.title()
+
+
+def outcodes_from_locations(locations):
+    """
+    Outcode rows (as read_outcodes_csv returns them) from (location, OS grid reference)
+    pairs, with no network access: the centroid is the mean of the grid references of
+    the locations naming the outcode, admin_district their most frequent place names.
+    """
+    points = defaultdict(list)
+    places = defaultdict(Counter)
+    for location, grid_reference in locations:
+        if not location:
+            continue
+        for match in POSTCODE_IN_TEXT_RE.finditer(location):
+            outcode = match.group(1).upper()
+            place = _place_before(location, match.start())
+            if place:
+                places[outcode][place] += 1
+            outcode_points = points[outcode]
+            point = grid_reference_to_latlng(grid_reference) if grid_reference else None
+            if point:
+                outcode_points.append(point)
+
+    rows = []
+    for outcode in sorted(points):
+        outcode_points = points[outcode]
+        rows.append({
+            'outcode': outcode,
+            'latitude': round(sum(lat for lat, _ in outcode_points) / len(outcode_points), 5) if outcode_points else None,
+            'longitude': round(sum(lng for _, lng in outcode_points) / len(outcode_points), 5) if outcode_points else None,
+            'admin_district': [name for name, _ in places[outcode].most_common(OFFLINE_PLACE_NAMES)],
+            'parliamentary_constituency': [],
+            'region': '',
+            'country': '',
+        })
+    return rows
+
+
+def locations_in_components():
+    """(location, OS grid reference) for every component with a location."""
+    rows = Component.objects.exclude(location__isnull=True).exclude(location='').values_list('location', 'additional_data')
+    for location, additional_data in rows.iterator(chunk_size=2000):
+        yield location, (additional_data or {}).get('OS Grid Reference')
+
+
+# --- Enrichment from postcodes.io ---
+
+def postcodes_in_components(samples=SAMPLES_PER_OUTCODE):
+    """{outcode: [up to `samples` full postcodes]} found in component locations."""
+    found = defaultdict(set)
+    for location in Component.objects.exclude(location__isnull=True).values_list('location', flat=True).iterator():
+        for outcode, incode in POSTCODE_IN_TEXT_RE.findall(location):
+            outcode = outcode.upper()
+            if len(found[outcode]) < samples:
+                found[outcode].add(f"{outcode} {incode.upper()}")
+    return {outcode: sorted(postcodes) for outcode, postcodes in found.items()}
+
+
+def _bulk_lookup(session, postcodes, timeout):
+    response = session.post(f"{POSTCODES_IO_BASE_URL}/postcodes", json={'postcodes': postcodes}, timeout=timeout)
+    response.raise_for_status()
+    return [item.get('result') for item in response.json().get('result') or [] if item.get('result')]
+
+
+def _outcode_lookup(session, outcode, timeout):
+    response = session.get(f"{POSTCODES_IO_BASE_URL}/outcodes/{outcode}", timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json().get('result')
+
+
+def _merge_postcode(row, result):
+    """Fold one postcodes.io postcode result into an outcode row."""
+    for field in LIST_FIELDS:
+        value = result.get(field)
+        if value and value not in row[field]:
+            row[field].append(value)
+    row['region'] = row['region'] or result.get('region') or ''
+    row['country'] = row['country'] or result.get('country') or ''
+    if result.get('latitude') is not None and result.get('longitude') is not None:
+        row['_points'].append((result['latitude'], result['longitude']))
+
+
+def _first(value):
+    """Outcode results list every region/country the outcode touches; keep the first."""
+    if isinstance(value, list):
+        return value[0] if value else ''
+    return value or ''
+
+
+def enrich_outcodes(outcodes=None, workers=4, timeout=POSTCODES_IO_TIMEOUT, progress=None):
+    """
+    Resolve outcodes through postcodes.io. `outcodes`: {outcode: [sample full postcodes]}
+    (default: postcodes_in_components()). Returns (rows, unresolved_outcodes): rows are
+    ready for save_outcodes(), unresolved_outcodes covers unknown outcodes and failed
+    requests. progress(done, total) is called as each batch of requests completes.
+    """
+    outcodes = postcodes_in_components() if outcodes is None else outcodes
+    rows = {
+        outcode: {
+            'outcode': outcode, 'latitude': None, 'longitude': None, 'admin_district': [],
+            'parliamentary_constituency': [], 'region': '', 'country': '', '_points': [],
+        }
+        for outcode in outcodes
+    }
+    unresolved_outcodes = set()
+
+    samples = [postcode for postcodes in outcodes.values() for postcode in postcodes]
+    chunks = [samples[i:i + POSTCODES_IO_BULK_LIMIT] for i in range(0, len(samples), POSTCODES_IO_BULK_LIMIT)]
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        # Full postcodes, 100 per request
+        futures = {executor.submit(_bulk_lookup, session, chunk, timeout): chunk for chunk in chunks}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                for result in future.result():
+                    row = rows.get(result.get('outcode'))
+                    if row is not None:
+                        _merge_postcode(row, result)
+            except Exception as e:
+                logger.error(f"Bulk postcode lookup failed for {len(futures[future])} postcodes: {e}")
+            if progress:
+                progress(done, len(futures))
+
+        # Outcodes no sample resolved (or that had no samples): ask for the outcode itself
+        pending = [outcode for outcode, row in rows.items() if not row['_points'] and not row['admin_district']]
+        futures = {executor.submit(_outcode_lookup, session, outcode, timeout): outcode for outcode in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            outcode = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Outcode lookup failed for {outcode}: {e}")
+                unresolved_outcodes.add(outcode)
+                result = None
+            if result:
+                row = rows[outcode]
+                for field in LIST_FIELDS:
+                    row[field] = [value for value in result.get(field) or [] if value]
+                row['region'] = _first(result.get('region'))
+                row['country'] = _first(result.get('country'))
+                row['latitude'], row['longitude'] = result.get('latitude'), result.get('longitude')
+            if progress:
+                progress(done, len(futures))
+
+    resolved = []
+    for outcode, row in rows.items():
+        points = row.pop('_points')
+        if points:
+            row['latitude'] = sum(lat for lat, _ in points) / len(points)
+            row['longitude'] = sum(lng for _, lng in points) / len(points)
+        if row['admin_district'] or row['region'] or row['latitude'] is not None:
+            resolved.append(row)
+        elif outcode not in unresolved_outcodes:
+            unresolved_outcodes.add(outcode)
+    return resolved, sorted(unresolved_outcodes)
@@ -0,0 +1,414 @@
+"""
+Pagination that gets a page and its total in one query.
+
+Django's Paginator runs COUNT(*) for the total and then a second, sliced query for the
+page rows, so the whole filter is evaluated twice per page. CountingPaginator annotates
+the sliced query with COUNT(*) OVER () and reads the total off the first row it fetches.
+
+For very large result sets an "estimate" count mode is available: on PostgreSQL the
+planner's row estimate from EXPLAIN is used once it is above the cap, and on other
+databases the count stops at the cap and is shown as e.g. "5000+".
+
+KeysetPaginator is for the long ranked lists (de-rated capacity, companies, technologies,
+a company's components) that people and crawlers page all the way through. It never uses
+OFFSET: each page seeks past the (sort value, id) of the previous page's last row, and
+the position is carried in an opaque cursor token, so page 500 costs the same as page 1.
+"""
+import base64
+import binascii
+import json
+import logging
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Count, F, Q, QuerySet, Window
+from django.db.models.query import ModelIterable, ValuesIterable
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODE_EXACT = "exact"
+COUNT_MODE_ESTIMATE = "estimate"
+
+# Above this many rows an estimated/capped count is good enough for the UI
+DEFAULT_COUNT_CAP = 5000
+
+_TOTAL_ANNOTATION = "window_total_count"
+
+
+def estimate_count(queryset, cap=DEFAULT_COUNT_CAP):
+    """
+    Return (count, is_estimate) for a queryset without a full COUNT(*) when it is large.
+
+    PostgreSQL: the planner's row estimate if it exceeds `cap`, else (None, False) so the
+    caller can count exactly. Other databases: a count that stops at cap + 1 rows, so
+    results above the cap come back as (cap, True).
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+
+    if connection.vendor == "postgresql":
+        try:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimated_rows = int(plan[0]["Plan"]["Plan Rows"])
+            if estimated_rows > cap:
+                return estimated_rows, True
+            return None, False
+        except Exception as e:
+            logger.warning(f"Could not read planner estimate, counting instead: {e}")
+            return None, False
+
+    count = queryset[:cap + 1].count()
+    if count > cap:
+        return cap, True
+    return count, False
+
+
+class CountingPaginator(Paginator):
+    """
+    Paginator that fetches the page rows and the total count in a single query.
+
+    count_mode="estimate" uses estimate_count() for result sets above count_cap.
+    Lists (already-materialized results) and DISTINCT querysets, where a window count
+    would count the rows before de-duplication, fall back to Django's behaviour.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 count_mode=COUNT_MODE_EXACT, count_cap=DEFAULT_COUNT_CAP):
+        super().__init__(object_list, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+        self.count_mode = count_mode
+        self.count_cap = count_cap
+        self.count_is_estimate = False
+        self._estimate_checked = False
+
+    @property
+    def _single_query(self):
+        return (
+            isinstance(self.object_list, QuerySet)
+            and not self.object_list.query.distinct
+            and self.object_list._iterable_class in (ModelIterable, ValuesIterable)
+        )
+
+    def _page_number(self, number):
+        """The type/lower-bound half of validate_number, which needs no count."""
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def _set_count(self, count):
+        # Paginator.count is a cached_property; seed it so num_pages etc. don't query
+        self.__dict__["count"] = count
+
+    def _check_estimate(self):
+        if self._estimate_checked or self.count_mode != COUNT_MODE_ESTIMATE:
+            return
+        self._estimate_checked = True
+        if not isinstance(self.object_list, QuerySet):
+            return
+        count, is_estimate = estimate_count(self.object_list, self.count_cap)
+        if is_estimate or count is not None:
+            self.count_is_estimate = is_estimate
+            self._set_count(count)
+
+    @property
+    def display_count(self):
+        """The total as shown to users, e.g. "5000+" or "~120,000" when it is not exact."""
+        if not self.count_is_estimate:
+            return f"{self.count:,}"
+        if self.count == self.count_cap:
+            return f"{self.count_cap:,}+"
+        return f"~{self.count:,}"
+
+    def page(self, number):
+        number = self._page_number(number)
+        self._check_estimate()
+
+        # Exact total already known (estimate mode) or no window possible: Django's path
+        if "count" in self.__dict__ or not self._single_query:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        rows = list(
+            self.object_list.annotate(**{_TOTAL_ANNOTATION: Window(expression=Count("*"))})
+            [bottom:bottom + self.per_page + self.orphans]
+        )
+
+        if rows:
+            first = rows[0]
+            total = first[_TOTAL_ANNOTATION] if isinstance(first, dict) else getattr(first, _TOTAL_ANNOTATION)
+            self._set_count(total)
+            for row in rows:
+                if isinstance(row, dict):
+                    row.pop(_TOTAL_ANNOTATION, None)
+        elif number == 1:
+            # Nothing at all
+            self._set_count(0)
+        # else: past the end; self.count falls back to a COUNT query for the error below
+
+        number = self.validate_number(number)
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(rows[:top - bottom], number, self)
+
+    def get_page(self, number):
+        """Like Paginator.get_page (first page if invalid, last if out of range), without a separate count."""
+        try:
+            number = self._page_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = 1
+        try:
+            return self.page(number)
+        except EmptyPage:
+            return self.page(self.num_pages)
+
+
+# --- Keyset (seek) pagination ---
+
+CURSOR_NEXT = "n"
+CURSOR_PREV = "p"
+CURSOR_LAST = "l"
+
+
+def encode_cursor(data):
+    """Opaque, URL-safe token for a cursor dict."""
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); raises ValueError for anything that isn't a cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(data, dict) or data.get("d") not in (CURSOR_NEXT, CURSOR_PREV, CURSOR_LAST):
+        raise ValueError("Invalid cursor")
+    for name in ("o", "t"):
+        value = data.get(name)
+        # bool is an int subclass, but never a position or a total
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError(f"Invalid cursor: {name} must be a non-negative integer")
+    return data
+
+
+class KeysetPage:
+    """One page from KeysetPaginator; mirrors the parts of Django's Page the templates use."""
+
+    def __init__(self, object_list, paginator, has_previous, has_next, next_cursor, prev_cursor,
+                 last_cursor, offset, total_count, count_is_estimate):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.last_cursor = last_cursor
+        # 0-based position of the first row, when known (a cursor carries it along)
+        self.offset = offset
+        self.total_count = total_count
+        self.count_is_estimate = count_is_estimate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def start_index(self):
+        if self.offset is None or not self.object_list:
+            return None
+        return self.offset + 1
+
+    @property
+    def end_index(self):
+        if self.offset is None:
+            return None
+        return self.offset + len(self.object_list)
+
+    @property
+    def display_count(self):
+        """The total as shown to users ("5000+" / "~120,000" when not exact), or None if not counted."""
+        if self.total_count is None:
+            return None
+        if not self.count_is_estimate:
+            return f"{self.total_count:,}"
+        if self.total_count == self.paginator.count_cap:
+            return f"{self.total_count:,}+"
+        return f"~{self.total_count:,}"
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a queryset ordered by (sort_field, key_field).
+
+    sort_field may be a model field or an annotation (e.g. a Sum on a values() queryset)
+    and may contain NULLs, which always sort last. key_field must be unique within the
+    queryset ("pk" for model rows, the grouped field for values() aggregates). Pages are
+    fetched with per_page + 1 rows to know whether there is another page; "previous"
+    runs the same seek with the ordering reversed.
+
+    with_total counts the rows on the first page only (capped, see estimate_count) and
+    carries the result inside the cursors, so later pages don't count again.
+    """
+
+    def __init__(self, queryset, per_page, sort_field, descending=False, key_field="pk",
+                 with_total=True, count_cap=DEFAULT_COUNT_CAP):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.sort_field = sort_field
+        self.descending = descending
+        self.key_field = key_field
+        self.with_total = with_total
+        self.count_cap = count_cap
+        # Ties a cursor to the ordering it was made for
+        self.signature = f"{'-' if descending else ''}{sort_field},{key_field}"
+
+    # --- Ordering and seek filters ---
+
+    def _ordering(self, reverse=False):
+        sort = F(self.sort_field)
+        key = F(self.key_field)
+        # Forward: sort value in the chosen direction with NULLs last, then key ascending.
+        # Reverse is the exact mirror image (NULLs first, key descending).
+        if not reverse:
+            sort = sort.desc(nulls_last=True) if self.descending else sort.asc(nulls_last=True)
+            return [sort, key.asc()]
+        sort = sort.asc(nulls_first=True) if self.descending else sort.desc(nulls_first=True)
+        return [sort, key.desc()]
+
+    def _after(self, value, key):
+        """Rows that come after (value, key) in forward order."""
+        field, key_field = self.sort_field, self.key_field
+        if value is None:
+            return Q(**{f"{field}__isnull": True, f"{key_field}__gt": key})
+        beyond = f"{field}__lt" if self.descending else f"{field}__gt"
+        return (
+            Q(**{beyond: value})
+            | Q(**{field: value, f"{key_field}__gt": key})
+            | Q(**{f"{field}__isnull": True})
+        )
+
+    def _before(self, value, key):
+        """Rows that come before (value, key) in forward order."""
+        field, key_field = self.sort_field, self.key_field
+        if value is None:
+            return Q(**{f"{field}__isnull": False}) | Q(**{f"{field}__isnull": True, f"{key_field}__lt": key})
+        ahead = f"{field}__gt" if self.descending else f"{field}__lt"
+        return Q(**{ahead: value}) | Q(**{field: value, f"{key_field}__lt": key})
+
+    def _field_value(self, name, value):
+        """A cursor value converted by the sort/key field (or annotation) it is compared with."""
+        if value is None:
+            return None
+        annotation = self.queryset.query.annotations.get(name)
+        try:
+            if annotation is not None:
+                output_field = annotation.output_field
+            else:
+                opts = self.queryset.model._meta
+                output_field = opts.pk if name == "pk" else opts.get_field(name)
+        except (FieldDoesNotExist, FieldError):
+            # Related lookups ("company__name") are compared as they are
+            return value
+        try:
+            return output_field.to_python(value)
+        except ValidationError as e:
+            raise ValueError(f"Invalid cursor value for {name}: {e.messages[0]}")
+
+    def _cursor_position(self, data):
+        """(sort value, key) of a next/previous cursor, checked against the field types."""
+        if data.get("k") is None:
+            raise ValueError("Cursor has no key")
+        return self._field_value(self.sort_field, data.get("v")), self._field_value(self.key_field, data["k"])
+
+    def _row_position(self, row):
+        if isinstance(row, dict):
+            return row[self.sort_field], row[self.key_field]
+        return getattr(row, self.sort_field), getattr(row, self.key_field)
+
+    def _count(self):
+        count, is_estimate = estimate_count(self.queryset, self.count_cap)
+        if count is None:
+            count = self.queryset.order_by().count()
+        return count, is_estimate
+
+    # --- Pages ---
+
+    def _cursor(self, direction, row, offset, total, is_estimate):
+        value, key = self._row_position(row)
+        return encode_cursor({
+            "d": direction, "s": self.signature, "v": value, "k": key,
+            "o": offset, "t": total, "e": is_estimate,
+        })
+
+    def get_page(self, cursor=None):
+        """The page for a cursor token; a missing or invalid token gives the first page."""
+        data = position = None
+        if cursor:
+            try:
+                data = decode_cursor(cursor)
+                if data.get("s") != self.signature:
+                    raise ValueError("Cursor is for a different ordering")
+                if data["d"] != CURSOR_LAST:
+                    position = self._cursor_position(data)
+            except ValueError as e:
+                logger.info(f"Ignoring cursor, starting from the first page: {e}")
+                data = None
+
+        if data is None:
+            direction, offset = CURSOR_NEXT, 0
+            total, is_estimate = self._count() if self.with_total else (None, False)
+        else:
+            direction, offset = data["d"], data.get("o")
+            total, is_estimate = data.get("t"), bool(data.get("e"))
+
+        queryset = self.queryset
+        if direction == CURSOR_NEXT:
+            if data is not None:
+                queryset = queryset.filter(self._after(*position))
+            rows = list(queryset.order_by(*self._ordering())[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous, has_next = data is not None, has_more
+        else:
+            if direction == CURSOR_PREV:
+                queryset = queryset.filter(self._before(*position))
+            rows = list(queryset.order_by(*self._ordering(reverse=True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_previous, has_next = has_more, direction == CURSOR_PREV
+            if direction == CURSOR_LAST:
+                # The last page ends at the total, when the total is exact
+                offset = total - len(rows) if total is not None and not is_estimate else None
+            if not has_previous:
+                offset = 0
+
+        next_cursor = prev_cursor = last_cursor = None
+        if rows and has_next:
+            last_cursor = encode_cursor({"d": CURSOR_LAST, "s": self.signature, "t": total, "e": is_estimate})
+            next_offset = offset + len(rows) if offset is not None else None
+            next_cursor = self._cursor(CURSOR_NEXT, rows[-1], next_offset, total, is_estimate)
+        if rows and has_previous:
+            prev_offset = max(offset - self.per_page, 0) if offset is not None else None
+            prev_cursor = self._cursor(CURSOR_PREV, rows[0], prev_offset, total, is_estimate)
+
+        return KeysetPage(
+            rows, self, has_previous, has_next, next_cursor, prev_cursor, last_cursor,
+            offset, total, is_estimate,
+        )
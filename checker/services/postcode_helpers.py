@@ -1,9 +1,24 @@
+"""
+Postcode / outcode lookups for location searches.
+
+These used to call postcodes.io synchronously (with no timeout) from the search request
+path, once per search term. They are now answered from the Outcode table (filled from
+the bundled data_storage/outcodes.csv by migration 0017, reloaded with
+`manage.py load_outcodes`, refreshed offline with `manage.py enrich_outcodes`, see
+outcode_data.py), which is held in process memory as a dict: a lookup is a dictionary
+access. postcodes.io is not called from the request path unless POSTCODES_IO_FALLBACK
+= True is set in settings, in which case an empty table falls back to it with
+POSTCODES_IO_TIMEOUT and a warning is logged once.
+"""
 import json
-import os
 import logging
-from functools import lru_cache
-from django.conf import settings
+import math
+import re
+import threading
+import time
+
 import requests
+from django.conf import settings
 from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
@@ -11,179 +26,213 @@ logger = logging.getLogger(__name__)
 # Base URL for the postcodes.io API
 POSTCODES_IO_BASE_URL = "https://api.postcodes.io"
 
-def validate_postcode(postcode):
-    """Validates a postcode using the postcodes.io API."""
+# Seconds before a postcodes.io request is abandoned
+POSTCODES_IO_TIMEOUT = getattr(settings, "POSTCODES_IO_TIMEOUT", 5)
+
+# Call postcodes.io from the request path when no outcode table is loaded
+POSTCODES_IO_FALLBACK = getattr(settings, "POSTCODES_IO_FALLBACK", False)
+
+# Workers re-read the outcode table this often, to pick up `load_outcodes` runs
+OUTCODE_INDEX_TTL = 3600
+
+# Outward code, then (optionally) the inward code: "SW1A 1AA", "M1", "EC2A4NE"
+UK_POSTCODE_RE = re.compile(r"^([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][A-Z]{2})?$")
+
+_outcode_index = None
+_outcode_index_loaded_at = 0.0
+_outcode_index_lock = threading.Lock()
+_fallback_warned = False
+
+
+def split_postcode(postcode):
+    """(outcode, incode) of a UK postcode or outcode, incode None for a bare outcode; (None, None) if malformed."""
     if not postcode or not isinstance(postcode, str):
+        return None, None
+    match = UK_POSTCODE_RE.match(postcode.strip().upper())
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def get_outcode_index():
+    """{outcode: details} for every row of the Outcode table, reloaded every OUTCODE_INDEX_TTL seconds."""
+    global _outcode_index, _outcode_index_loaded_at
+    if _outcode_index is not None and time.time() - _outcode_index_loaded_at < OUTCODE_INDEX_TTL:
+        return _outcode_index
+
+    with _outcode_index_lock:
+        if _outcode_index is None or time.time() - _outcode_index_loaded_at >= OUTCODE_INDEX_TTL:
+            from ..models import Outcode
+
+            index = {}
+            try:
+                for row in Outcode.objects.values():
+                    outcode = row.pop("outcode")
+                    row.pop("updated_at", None)
+                    index[outcode] = row
+            except Exception as e:
+                # e.g. the table doesn't exist yet; retry on the next reload
+                logger.error(f"Error loading outcode table: {e}")
+            _outcode_index = index
+            _outcode_index_loaded_at = time.time()
+            logger.info(f"Loaded {len(index)} outcodes")
+    return _outcode_index
+
+
+def clear_outcode_index():
+    """Drop this process's copy of the outcode table (after loading new data)."""
+    global _outcode_index
+    with _outcode_index_lock:
+        _outcode_index = None
+
+
+def _api_get(path):
+    """JSON result of a postcodes.io GET, None when not found."""
+    response = requests.get(f"{POSTCODES_IO_BASE_URL}{path}", timeout=POSTCODES_IO_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json().get("result")
+
+
+def _use_api_fallback():
+    """Whether to ask postcodes.io with no outcode table loaded; warns the first time it does."""
+    global _fallback_warned
+    if not POSTCODES_IO_FALLBACK:
         return False
-    
-    postcode_cleaned = postcode.strip().upper().replace(" ", "")
-    cache_key = f"postcode_validation_{postcode_cleaned}"
-    is_valid = cache.get(cache_key)
-    
-    if is_valid is None:
+    if not _fallback_warned:
+        _fallback_warned = True
+        logger.warning(
+            "Outcode table is empty, falling back to postcodes.io for postcode lookups; "
+            "run `manage.py load_outcodes` or `manage.py enrich_outcodes` to answer them offline"
+        )
+    return True
+
+
+def _api_fallback(cache_key, path, default, timeout=3600 * 24):
+    """Cached postcodes.io lookup for when there is no outcode table (POSTCODES_IO_FALLBACK)."""
+    result = cache.get(cache_key)
+    if result is None:
         try:
-            response = requests.get(f"{POSTCODES_IO_BASE_URL}/postcodes/{postcode_cleaned}/validate")
-            response.raise_for_status() # Raise an exception for bad status codes
-            is_valid = response.json().get("result", False)
-            cache.set(cache_key, is_valid, timeout=3600 * 24) # Cache for 24 hours
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API Error validating postcode {postcode}: {e}")
-            is_valid = False # Assume invalid on API error
-        except json.JSONDecodeError as e:
-            logger.error(f"API response decode error validating postcode {postcode}: {e}")
-            is_valid = False
-
-    return is_valid
+            result = _api_get(path)
+            cache.set(cache_key, result if result is not None else default, timeout=timeout)
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            logger.error(f"API Error for {path}: {e}")
+            return default
+    return result if result is not None else default
+
+
+def validate_postcode(postcode):
+    """
+    Whether `postcode` is a well-formed full UK postcode in a known outcode. With no
+    outcode table loaded postcodes.io is asked (only the format is checked with
+    POSTCODES_IO_FALLBACK off).
+    """
+    outcode, incode = split_postcode(postcode)
+    if not outcode or not incode:
+        return False
+
+    index = get_outcode_index()
+    if index:
+        return outcode in index
+    if _use_api_fallback():
+        return bool(_api_fallback(f"postcode_validation_{outcode}{incode}", f"/postcodes/{outcode}{incode}/validate", False))
+    return True
+
+
+def _distance_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371000 * 2 * math.asin(math.sqrt(a))
+
 
 def get_nearest_postcodes(postcode, limit=5, radius=1000):
-     """Gets nearest postcodes for a given valid postcode."""
-     if not validate_postcode(postcode):
-         return []
-
-     postcode_cleaned = postcode.strip().upper().replace(" ", "")
-     cache_key = f"nearest_postcodes_{postcode_cleaned}_{limit}_{radius}"
-     nearest = cache.get(cache_key)
-
-     if nearest is None:
-         try:
-             # First, lookup the postcode to get its details (needed if input is just outcode)
-             lookup_response = requests.get(f"{POSTCODES_IO_BASE_URL}/postcodes/{postcode_cleaned}")
-             lookup_response.raise_for_status()
-             postcode_details = lookup_response.json().get("result")
-
-             if not postcode_details:
-                 logger.warning(f"Could not find details for postcode: {postcode_cleaned}")
-                 return []
-
-             # Now find nearest using the full postcode from lookup if available
-             response = requests.get(f"{POSTCODES_IO_BASE_URL}/postcodes/{postcode_cleaned}/nearest", params={'limit': limit, 'radius': radius})
-             response.raise_for_status()
-             results = response.json().get("result")
-             nearest = [pc["postcode"] for pc in results if pc] if results else []
-             cache.set(cache_key, nearest, timeout=3600 * 6) # Cache for 6 hours
-         except requests.exceptions.RequestException as e:
-             logger.error(f"API Error getting nearest postcodes for {postcode}: {e}")
-             nearest = []
-         except json.JSONDecodeError as e:
-             logger.error(f"API response decode error getting nearest postcodes {postcode}: {e}")
-             nearest = []
-         except Exception as e: # Catch unexpected errors during lookup/nearest
-             logger.error(f"Unexpected error getting nearest postcodes for {postcode}: {e}")
-             nearest = []
-             
-     return nearest
+    """
+    Outcodes whose centroids lie within `radius` metres of the centroid of the postcode's
+    outcode, nearest first (the outcode itself included). The offline table has no
+    full-postcode coordinates, so this works at outcode level.
+    """
+    outcode, _ = split_postcode(postcode)
+    origin = get_outcode_index().get(outcode) if outcode else None
+    if not origin or origin.get("latitude") is None or origin.get("longitude") is None:
+        return []
 
-def get_outcode_details(outcode):
-    """Gets details for an outcode, including potential admin districts."""
-    if not outcode or not isinstance(outcode, str):
-        return None
+    nearby = []
+    for other, details in get_outcode_index().items():
+        if details.get("latitude") is None or details.get("longitude") is None:
+            continue
+        distance = _distance_m(origin["latitude"], origin["longitude"], details["latitude"], details["longitude"])
+        if distance <= radius:
+            nearby.append((distance, other))
+    return [other for _, other in sorted(nearby)[:limit]]
 
-    outcode_cleaned = outcode.strip().upper()
-    cache_key = f"outcode_details_{outcode_cleaned}"
-    details = cache.get(cache_key)
 
-    if details is None:
-        try:
-            response = requests.get(f"{POSTCODES_IO_BASE_URL}/outcodes/{outcode_cleaned}")
-            response.raise_for_status()
-            result_data = response.json().get("result")
-            # Extract relevant details, e.g., admin district or region
-            if result_data:
-                 details = {
-                     "admin_district": result_data.get("admin_district", []),
-                     "parliamentary_constituency": result_data.get("parliamentary_constituency", []),
-                     "region": result_data.get("region") # Added region
-                 }
-                 cache.set(cache_key, details, timeout=3600 * 24) # Cache for 24 hours
-            else:
-                 details = {} # No details found
-                 cache.set(cache_key, details, timeout=3600) # Cache negative result shorter
-
-        except requests.exceptions.RequestException as e:
-            if e.response is not None and e.response.status_code == 404:
-                 logger.debug(f"Outcode {outcode_cleaned} not found via API.")
-                 details = {} # Treat 404 as not found
-                 cache.set(cache_key, details, timeout=3600) 
-            else:
-                 logger.error(f"API Error getting details for outcode {outcode_cleaned}: {e}")
-                 details = None # Indicate error
-        except json.JSONDecodeError as e:
-            logger.error(f"API response decode error getting outcode details {outcode_cleaned}: {e}")
-            details = None
-
-    return details
+def get_outcode_details(outcode):
+    """
+    Gets details for an outcode: admin districts, parliamentary constituencies and
+    region. {} when the outcode is unknown or, with no outcode table loaded, on an API error.
+    """
+    outcode_cleaned, _ = split_postcode(outcode)
+    if not outcode_cleaned:
+        return None if not outcode or not isinstance(outcode, str) else {}
+
+    index = get_outcode_index()
+    if index:
+        details = index.get(outcode_cleaned)
+        if details is None:
+            return {}
+        return {
+            "admin_district": list(details["admin_district"]),
+            "parliamentary_constituency": list(details["parliamentary_constituency"]),
+            "region": details["region"] or None,
+        }
+
+    if not _use_api_fallback():
+        return {}
+    result = _api_fallback(f"outcode_details_{outcode_cleaned}", f"/outcodes/{outcode_cleaned}", {})
+    if not result:
+        return {}
+    return {
+        "admin_district": result.get("admin_district") or [],
+        "parliamentary_constituency": result.get("parliamentary_constituency") or [],
+        "region": result.get("region"),
+    }
+
 
 def get_all_postcodes_for_area(area_name):
     """
-    Gets postcode prefixes associated with a given area name.
-    NOTE: postcodes.io doesn't directly map area names to postcodes.
-    This function is now less effective and primarily relies on outcode lookups.
-    It might return related outcodes based on administrative areas if the area_name matches.
-    Consider using geocoding or postcode lookup for better results.
+    Gets postcode prefixes associated with a given area name. Only outcodes are
+    recognised: a known outcode ("SW16") is returned as itself, anything else gives [].
     """
-    # This function is difficult to implement reliably with postcodes.io
-    # as it doesn't have a direct "area name -> postcodes" endpoint.
-    # We could try geocoding the area name to coordinates, then reverse geocode,
-    # but that's complex and prone to ambiguity.
-    # For now, we'll return an empty list, as the old JSON logic is removed.
-    # The search logic should perhaps rely more on direct postcode/outcode matching.
-    logger.warning(f"get_all_postcodes_for_area('{area_name}') called - this function has limited effectiveness with the API.")
-    
-    # --- Attempt using outcode lookup based on area name as a potential outcode ---
-    # Check if the area_name might be an outcode (e.g., "SW1A")
     details = get_outcode_details(area_name)
     if details:
-        # If it is a valid outcode, return it.
-        # We could potentially expand this using nearest neighbour outcodes if needed.
         logger.debug(f"Treating '{area_name}' as an outcode.")
         return [area_name.strip().upper()]
-
-    # If not an outcode, we can't reliably get postcodes for a general area name easily.
     return []
 
+
 def get_area_for_any_postcode(postcode):
     """
-    Gets administrative area(s) or region associated with a given postcode 
-    (primarily looks at the outcode part). Returns a list of potential area names.
+    Gets administrative area(s) or region associated with a given postcode
+    (from its outcode part). Returns a list of potential area names.
     """
     if not postcode or not isinstance(postcode, str):
-        return [] # Return empty list for invalid input
-
-    postcode_cleaned = postcode.strip().upper()
-    outcode = postcode_cleaned.split(' ')[0]
-    
-    cache_key = f"area_for_postcode_{outcode}" # Cache based on outcode
-    areas = cache.get(cache_key)
-
-    if areas is None:
-        areas = []
-        details = get_outcode_details(outcode)
-        
-        if details:
-            # Collect potential area names from details
-            if details.get("admin_district"):
-                areas.extend(details["admin_district"])
-            if details.get("parliamentary_constituency"):
-                 areas.extend(details["parliamentary_constituency"])
-            if details.get("region") and details["region"] not in areas: # Add region if distinct
-                 areas.append(details["region"])
-            
-            # Remove duplicates
-            areas = list(set(a for a in areas if a)) # Ensure unique and non-empty strings
-            
-            if areas:
-                 logger.debug(f"Found areas {areas} for postcode '{postcode}' (outcode '{outcode}')")
-                 cache.set(cache_key, areas, timeout=3600 * 24) # Cache for 24h
-            else:
-                 logger.debug(f"No specific admin areas found for outcode '{outcode}', caching empty.")
-                 cache.set(cache_key, [], timeout=3600) # Cache empty result shorter
-        else:
-            # Error occurred in get_outcode_details or outcode not found
-             logger.debug(f"Could not retrieve details for outcode '{outcode}'.")
-             cache.set(cache_key, [], timeout=3600) # Cache empty result shorter
-
-    # Ensure return is always a list
-    return areas if areas is not None else []
-
-# Add __init__.py if it doesn't exist (important for services to be a package)
-# This should ideally be done separately if needed, but let's assume it exists for now. 
\ No newline at end of file
+        return []
+
+    outcode = postcode.strip().upper().split(' ')[0]
+    details = get_outcode_details(outcode)
+    if not details:
+        return []
+
+    # Collect potential area names from details
+    areas = list(details.get("admin_district") or [])
+    areas.extend(details.get("parliamentary_constituency") or [])
+    if details.get("region"):
+        areas.append(details["region"])
+
+    # Unique, non-empty, in first-seen order
+    areas = list(dict.fromkeys(a for a in areas if a))
+    if areas:
+        logger.debug(f"Found areas {areas} for postcode '{postcode}' (outcode '{outcode}')")
+    return areas
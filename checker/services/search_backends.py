@@ -0,0 +1,116 @@
+"""
+Search backend abstraction for substring ("icontains") searches over Component.
+
+- PostgreSQL with pg_trgm: trigram GIN indexes on UPPER(location/company_name/description/
+  cmu_id/technology), which is exactly the expression Django's icontains/istartswith
+  generate, so the plain ORM lookups become index scans (migrations 0008 and 0018
+  create the indexes).
+- SQLite with FTS5: an external-content FTS5 table using the trigram tokenizer,
+  kept in sync with checker_component by triggers (also migration 0008). Matches
+  are resolved through the FTS table and joined back by rowid.
+- Anything else: plain icontains.
+
+Use get_search_backend().contains_filter(term, fields) wherever a Q of
+field__icontains lookups was built by hand.
+"""
+import logging
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# Fields with a trigram index on PostgreSQL
+TRIGRAM_FIELDS = ('location', 'company_name', 'description', 'cmu_id', 'technology')
+
+# Columns of the SQLite FTS5 table (see migration 0008)
+FTS_TABLE = 'checker_component_fts'
+FTS_FIELDS = ('company_name', 'location', 'description', 'cmu_id', 'technology')
+
+# The trigram tokenizer can't match anything shorter than one trigram
+FTS_MIN_TERM_LENGTH = 3
+
+
+class BasicSearchBackend:
+    """Plain icontains lookups - always correct, scans the table."""
+    name = "basic"
+
+    def contains_filter(self, term, fields):
+        """Q matching rows where any of `fields` contains `term` (case-insensitive)."""
+        query_filter = Q()
+        for field in fields:
+            query_filter |= Q(**{f"{field}__icontains": term})
+        return query_filter
+
+    def startswith_filter(self, term, field):
+        return Q(**{f"{field}__istartswith": term})
+
+
+class TrigramSearchBackend(BasicSearchBackend):
+    """
+    PostgreSQL + pg_trgm. Django compiles icontains to UPPER(col::text) LIKE UPPER(%s),
+    and the trigram GIN indexes are built on that same expression, so the standard
+    lookups are index-assisted for any term of 3+ characters.
+    """
+    name = "pg_trgm"
+
+
+class Fts5SearchBackend(BasicSearchBackend):
+    """SQLite FTS5 (trigram tokenizer) lookups for indexed fields, icontains for the rest."""
+    name = "fts5"
+
+    def contains_filter(self, term, fields):
+        fts_fields = [field for field in fields if field in FTS_FIELDS]
+        other_fields = [field for field in fields if field not in FTS_FIELDS]
+
+        if len(term) < FTS_MIN_TERM_LENGTH or not fts_fields:
+            return super().contains_filter(term, fields)
+
+        # FTS5 column filter + quoted phrase; with the trigram tokenizer a phrase
+        # matches as a case-insensitive substring, the same as icontains
+        phrase = term.replace('"', '""')
+        match_expression = f'{{{" ".join(fts_fields)}}} : "{phrase}"'
+        query_filter = Q(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [match_expression],
+        ))
+        if other_fields:
+            query_filter |= super().contains_filter(term, other_fields)
+        return query_filter
+
+    def startswith_filter(self, term, field):
+        if len(term) < FTS_MIN_TERM_LENGTH or field not in FTS_FIELDS:
+            return super().startswith_filter(term, field)
+        # Use the FTS table to narrow the candidates, then check the prefix on that small set
+        return self.contains_filter(term, [field]) & super().startswith_filter(term, field)
+
+
+_backend = None
+
+
+def _detect_backend():
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                if cursor.fetchone():
+                    return TrigramSearchBackend()
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                if cursor.fetchone():
+                    return Fts5SearchBackend()
+    except Exception as e:
+        logger.error(f"Error detecting search backend, using basic icontains: {e}")
+    return BasicSearchBackend()
+
+
+def get_search_backend():
+    """Return the search backend for the current database (detected once per process)."""
+    global _backend
+    if _backend is None:
+        _backend = _detect_backend()
+        logger.info(f"Using '{_backend.name}' component search backend")
+    return _backend
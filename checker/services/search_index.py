@@ -0,0 +1,357 @@
+"""
+Per-process inverted token index over the searchable Component text fields.
+
+Every search term used to become an OR of `icontains` filters over company_name,
+location, description and cmu_id, which is a full table scan on SQLite (and on
+Postgres without trigram indexes) - and we ran it twice, once for the count and
+once for the page. This index maps each whitespace-separated token to a sorted
+array of Component primary keys so candidates can be resolved in memory and the
+database is only hit by primary key.
+
+Because search terms never contain whitespace, a term is a substring of a field
+exactly when it is a substring of one of that field's tokens. Matching terms
+against the token vocabulary therefore reproduces `icontains` semantics. The
+vocabulary itself is indexed by trigram, so a term of 3+ characters only checks
+the tokens that contain all of its trigrams instead of every token.
+
+Rows written by other processes are picked up by the periodic refresh through the
+updated_at watermark. Every path that writes INDEXED_FIELDS or delivery_year sets
+updated_at (save(), and bulk_ingest's upserts list it in their update fields);
+the bulk_update()/update() paths that don't (backfill_in_batches,
+populate_derated_capacity) only write derived columns the index doesn't read. A new
+bulk path that changes indexed text without updated_at would not be seen here until
+the next restart.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+
+logger = logging.getLogger(__name__)
+
+# Fields that make up the searchable text of a component
+INDEXED_FIELDS = ('company_name', 'location', 'description', 'cmu_id')
+
+# How often (seconds) to look for rows changed by other processes (crawlers, bulk imports)
+REFRESH_INTERVAL = getattr(settings, 'COMPONENT_TOKEN_INDEX_REFRESH_SECONDS', 60)
+
+# Set COMPONENT_TOKEN_INDEX_ENABLED = False to always search with database filters
+INDEX_ENABLED = getattr(settings, 'COMPONENT_TOKEN_INDEX_ENABLED', True)
+
+# Number of term -> pk set lookups to remember between vocabulary changes
+TERM_CACHE_SIZE = 256
+
+# Length of the vocabulary n-grams; shorter terms scan the vocabulary
+GRAM_SIZE = 3
+
+
+def tokenize(*values):
+    """Split field values into a set of lowercase, whitespace-separated tokens."""
+    tokens = set()
+    for value in values:
+        if value:
+            tokens.update(str(value).lower().split())
+    return tokens
+
+
+def token_grams(token):
+    """The distinct GRAM_SIZE-character substrings of a token."""
+    return {token[i:i + GRAM_SIZE] for i in range(len(token) - GRAM_SIZE + 1)}
+
+
+class ComponentTokenIndex:
+    """
+    token -> sorted array of Component pks, plus the reverse mapping needed to
+    update a row in place when it changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}        # token -> array('q') of pks, sorted
+        self._grams = {}           # trigram -> set of tokens containing it
+        self._doc_tokens = {}      # pk -> tuple of tokens currently indexed for it
+        self._delivery_years = {}  # pk -> delivery_year, used to order candidates
+        self._term_cache = {}      # term -> frozenset of pks (cleared when the vocabulary changes)
+        self._watermark = None     # max(updated_at) seen so far
+        self._built = False
+        self._last_refresh = 0.0
+
+    # ------------------------------------------------------------------
+    # Building and maintenance
+    # ------------------------------------------------------------------
+
+    def build(self):
+        """Build the index from scratch from the Component table."""
+        from ..models import Component
+
+        start_time = time.time()
+        postings = {}
+        doc_tokens = {}
+        delivery_years = {}
+        watermark = None
+
+        rows = Component.objects.order_by().values_list(
+            'id', *INDEXED_FIELDS, 'delivery_year', 'updated_at'
+        ).iterator(chunk_size=5000)
+
+        for row in rows:
+            pk = row[0]
+            tokens = tuple(tokenize(*row[1:5]))
+            doc_tokens[pk] = tokens
+            delivery_years[pk] = row[5] or ''
+            for token in tokens:
+                postings.setdefault(token, []).append(pk)
+            if row[6] and (watermark is None or row[6] > watermark):
+                watermark = row[6]
+
+        # Rows come back in arbitrary order, so sort each posting list once
+        postings = {token: array('q', sorted(pks)) for token, pks in postings.items()}
+        grams = {}
+        for token in postings:
+            for gram in token_grams(token):
+                grams.setdefault(gram, set()).add(token)
+
+        with self._lock:
+            self._postings = postings
+            self._grams = grams
+            self._doc_tokens = doc_tokens
+            self._delivery_years = delivery_years
+            self._term_cache = {}
+            self._watermark = watermark
+            self._built = True
+            self._last_refresh = time.monotonic()
+
+        logger.info(
+            f"Built component token index: {len(doc_tokens)} components, "
+            f"{len(postings)} tokens in {time.time() - start_time:.2f}s"
+        )
+
+    def refresh(self):
+        """
+        Apply rows changed since the last build/refresh. Inserts and updates are
+        found through the updated_at watermark; deletions made by other processes
+        are detected by comparing row counts. The count and the new watermark come
+        from one aggregate, and only rows up to that watermark are applied, so both
+        describe the same state of the table.
+        """
+        from ..models import Component
+
+        with self._lock:
+            watermark = self._watermark
+            self._last_refresh = time.monotonic()
+
+        snapshot = Component.objects.order_by().aggregate(count=Count('id'), latest=Max('updated_at'))
+
+        changed = Component.objects.order_by().values_list(
+            'id', *INDEXED_FIELDS, 'delivery_year', 'updated_at'
+        )
+        if watermark is not None:
+            # >= rather than > so rows written in the same instant are not missed;
+            # re-indexing an unchanged row is harmless
+            changed = changed.filter(updated_at__gte=watermark)
+        if snapshot['latest'] is not None:
+            # Later writes are left for the next refresh, past the new watermark
+            changed = changed.filter(updated_at__lte=snapshot['latest'])
+
+        updated = 0
+        for row in changed.iterator(chunk_size=5000):
+            self._index_row(row[0], row[1:5], row[5])
+            updated += 1
+        if snapshot['latest'] is not None and (watermark is None or snapshot['latest'] > watermark):
+            watermark = snapshot['latest']
+
+        removed = 0
+        if snapshot['count'] != len(self._doc_tokens):
+            live_pks = set(Component.objects.values_list('id', flat=True))
+            for pk in [pk for pk in self._doc_tokens if pk not in live_pks]:
+                self.remove(pk)
+                removed += 1
+
+        with self._lock:
+            self._watermark = watermark
+
+        if updated or removed:
+            logger.info(f"Refreshed component token index: {updated} rows re-indexed, {removed} removed")
+
+    def ensure_fresh(self):
+        """Build on first use, then refresh at most every REFRESH_INTERVAL seconds."""
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+        elif time.monotonic() - self._last_refresh >= REFRESH_INTERVAL:
+            self.refresh()
+
+    def index_component(self, component):
+        """(Re)index a single saved Component instance."""
+        if not self._built:
+            return
+        values = [getattr(component, field) for field in INDEXED_FIELDS]
+        self._index_row(component.pk, values, component.delivery_year)
+
+    def remove(self, pk):
+        """Drop a component from the index."""
+        with self._lock:
+            old_tokens = self._doc_tokens.pop(pk, ())
+            self._delivery_years.pop(pk, None)
+            for token in old_tokens:
+                self._discard_posting(token, pk)
+            if old_tokens:
+                self._term_cache = {}
+
+    def _index_row(self, pk, values, delivery_year):
+        new_tokens = tokenize(*values)
+        with self._lock:
+            old_tokens = set(self._doc_tokens.get(pk, ()))
+            for token in old_tokens - new_tokens:
+                self._discard_posting(token, pk)
+            for token in new_tokens - old_tokens:
+                posting = self._postings.get(token)
+                if posting is None:
+                    self._postings[token] = array('q', [pk])
+                    for gram in token_grams(token):
+                        self._grams.setdefault(gram, set()).add(token)
+                else:
+                    pos = bisect_left(posting, pk)
+                    if pos == len(posting) or posting[pos] != pk:
+                        posting.insert(pos, pk)
+            self._doc_tokens[pk] = tuple(new_tokens)
+            self._delivery_years[pk] = delivery_year or ''
+            if old_tokens != new_tokens:
+                self._term_cache = {}
+
+    def _discard_posting(self, token, pk):
+        posting = self._postings.get(token)
+        if posting is None:
+            return
+        pos = bisect_left(posting, pk)
+        if pos < len(posting) and posting[pos] == pk:
+            del posting[pos]
+        if not posting:
+            del self._postings[token]
+            for gram in token_grams(token):
+                tokens = self._grams.get(gram)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._grams[gram]
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def pks_for_term(self, term):
+        """All pks whose indexed text contains `term` (case-insensitive substring)."""
+        term = term.lower()
+        with self._lock:
+            cached = self._term_cache.get(term)
+            if cached is not None:
+                return cached
+
+            result = set()
+            for token in self._tokens_containing(term):
+                result.update(self._postings[token])
+            result = frozenset(result)
+
+            if len(self._term_cache) >= TERM_CACHE_SIZE:
+                self._term_cache.pop(next(iter(self._term_cache)))
+            self._term_cache[term] = result
+            return result
+
+    def _tokens_containing(self, term):
+        """Vocabulary tokens that contain `term`; call with the lock held."""
+        if len(term) < GRAM_SIZE:
+            # Too short for a trigram: scan the vocabulary (still far smaller than the rows)
+            return [token for token in self._postings if term in token]
+        gram_sets = []
+        for gram in token_grams(term):
+            tokens = self._grams.get(gram)
+            if not tokens:
+                return []
+            gram_sets.append(tokens)
+        # Having every trigram is necessary, not sufficient ("aaaa" vs the token "aaa")
+        gram_sets.sort(key=len)
+        candidates = gram_sets[0].intersection(*gram_sets[1:])
+        return [token for token in candidates if term in token]
+
+    def match_any(self, terms):
+        """Union of the pks matching each term (OR semantics)."""
+        result = set()
+        for term in terms:
+            result |= self.pks_for_term(term)
+        return result
+
+    def match_all(self, terms):
+        """Intersection of the pks matching each term (AND semantics)."""
+        result = None
+        for term in terms:
+            pks = self.pks_for_term(term)
+            result = set(pks) if result is None else result & pks
+            if not result:
+                break
+        return result or set()
+
+    def order_pks(self, pks, sort_order="desc"):
+        """Order pks by delivery year (newest first by default), then pk for stability."""
+        years = self._delivery_years
+        return sorted(pks, key=lambda pk: (years.get(pk, ''), pk), reverse=(sort_order != "asc"))
+
+    def stats(self):
+        return {
+            "built": self._built,
+            "components": len(self._doc_tokens),
+            "tokens": len(self._postings),
+            "trigrams": len(self._grams),
+            "postings": sum(len(p) for p in self._postings.values()),
+            "watermark": self._watermark,
+        }
+
+
+# One index per worker process
+_component_index = ComponentTokenIndex()
+
+
+def get_component_index():
+    """
+    Return the process-wide index, building or refreshing it as needed.
+    Returns None if the index is disabled or cannot be built, in which case
+    callers should fall back to database filters.
+    """
+    if not INDEX_ENABLED:
+        return None
+    try:
+        _component_index.ensure_fresh()
+        return _component_index
+    except Exception as e:
+        logger.error(f"Component token index unavailable, falling back to database search: {e}")
+        return None
+
+
+def _component_saved(sender, instance, **kwargs):
+    try:
+        _component_index.index_component(instance)
+    except Exception as e:
+        logger.error(f"Error updating token index for component {instance.pk}: {e}")
+
+
+def _component_deleted(sender, instance, **kwargs):
+    try:
+        _component_index.remove(instance.pk)
+    except Exception as e:
+        logger.error(f"Error removing component {instance.pk} from token index: {e}")
+
+
+def connect_signals():
+    """
+    Keep the index in step with saves/deletes made by this process. Bulk
+    operations bypass signals and are picked up by the periodic refresh.
+    """
+    from ..models import Component
+
+    post_save.connect(_component_saved, sender=Component, dispatch_uid="component_token_index_save")
+    post_delete.connect(_component_deleted, sender=Component, dispatch_uid="component_token_index_delete")
@@ -0,0 +1,216 @@
+"""
+Spatial access path for viewport (bounding box) queries on geocoded components.
+
+Component.latitude / longitude used to be plain unindexed floats, so every map pan was a
+full table scan on top of the technology / year filters. There are now three ways into
+the table:
+
+- a composite (latitude, longitude) index for the plain range filter
+- Component.geohash, the base32 geohash of the coordinates (set on save() and
+  bulk_create()), indexed on its own and behind technology. A bounding box is covered by
+  a handful of geohash prefixes, and each prefix is a contiguous key range
+  (geohash >= prefix AND geohash < prefix + '{'), so the index narrows both coordinates
+  at once. The exact bounds are still applied on top, the prefixes only select candidates.
+- on PostgreSQL, a GiST index on point(longitude, latitude) (see migration 0013), queried
+  with point <@ box, which needs no PostGIS.
+
+bbox_filter() picks the path for the current database; `manage.py benchmark_map_viewport`
+compares them against table size.
+"""
+import logging
+import math
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .backfill import backfill_in_batches
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_GEOHASH_BITS = (16, 8, 4, 2, 1)
+
+# Stored precision: 9 characters is a cell of roughly 5m x 5m
+GEOHASH_PRECISION = 9
+
+# Upper bound on prefix ranges per query; the prefix length is the longest that stays under it
+GEOHASH_MAX_PREFIXES = 16
+
+# Sorts after every character of the geohash alphabet, so prefix + this ends the prefix range
+_GEOHASH_RANGE_END = '{'
+
+# Viewport strategies understood by bbox_filter (the benchmark compares them)
+STRATEGY_BOUNDS = 'bounds'
+STRATEGY_GEOHASH = 'geohash'
+STRATEGY_GIST = 'gist'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a coordinate, or None when either part is missing."""
+    if latitude is None or longitude is None:
+        return None
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    char_index = 0
+    even = True  # Bits alternate longitude, latitude, starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                char_index |= _GEOHASH_BITS[bit]
+                lng_range[0] = mid
+            else:
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                char_index |= _GEOHASH_BITS[bit]
+                lat_range[0] = mid
+            else:
+                lat_range[1] = mid
+        even = not even
+        if bit < 4:
+            bit += 1
+        else:
+            chars.append(GEOHASH_ALPHABET[char_index])
+            bit = 0
+            char_index = 0
+    return ''.join(chars)
+
+
+def _geohash_cell_size(precision):
+    """(latitude, longitude) size in degrees of a geohash cell at this precision."""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def _split_dateline(bbox):
+    south, west, north, east = bbox
+    if east < west:
+        return [(south, west, north, 180.0), (south, -180.0, north, east)]
+    return [bbox]
+
+
+def _cell_ranges(bbox, precision):
+    """Grid index ranges (rows, columns) of the geohash cells at `precision` covering bbox."""
+    lat_size, lng_size = _geohash_cell_size(precision)
+    south, west, north, east = bbox
+    rows = range(
+        math.floor((max(south, -90.0) + 90.0) / lat_size),
+        min(math.floor((min(north, 90.0) + 90.0) / lat_size), 2 ** ((precision * 5) // 2) - 1) + 1,
+    )
+    columns = range(
+        math.floor((max(west, -180.0) + 180.0) / lng_size),
+        min(math.floor((min(east, 180.0) + 180.0) / lng_size), 2 ** ((precision * 5 + 1) // 2) - 1) + 1,
+    )
+    return rows, columns
+
+
+def covering_geohash_prefixes(bbox, max_prefixes=GEOHASH_MAX_PREFIXES):
+    """
+    Geohash prefixes whose cells together cover (south, west, north, east), using the
+    longest prefix length that needs at most max_prefixes cells. Returns [] when even
+    single-character cells would need more (the box is most of the world).
+    """
+    boxes = _split_dateline(bbox)
+    best = []
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cells = []
+        for box in boxes:
+            rows, columns = _cell_ranges(box, precision)
+            cells.extend((row, column) for row in rows for column in columns)
+        if len(cells) > max_prefixes:
+            break
+        lat_size, lng_size = _geohash_cell_size(precision)
+        best = sorted({
+            # Encode the cell centre to get the cell's geohash
+            encode_geohash(-90.0 + (row + 0.5) * lat_size, -180.0 + (column + 0.5) * lng_size, precision)
+            for row, column in cells
+        })
+    return best
+
+
+def geohash_prefix_filter(prefixes):
+    """Q matching geohashes that start with any of the prefixes, as index-friendly ranges."""
+    condition = Q()
+    for prefix in prefixes:
+        condition |= Q(geohash__gte=prefix, geohash__lt=prefix + _GEOHASH_RANGE_END)
+    return condition
+
+
+def bounds_filter(bbox):
+    """Q for components inside (south, west, north, east) on the raw columns; west > east wraps the dateline."""
+    south, west, north, east = bbox
+    latitude = Q(latitude__gte=south, latitude__lte=north)
+    if east < west:
+        return latitude & (Q(longitude__gte=west) | Q(longitude__lte=east))
+    return latitude & Q(longitude__gte=west, longitude__lte=east)
+
+
+def _gist_filter(bbox):
+    """point <@ box condition that the PostgreSQL GiST index from migration 0013 serves."""
+    table = connection.ops.quote_name('checker_component')
+    point = f"point({table}.longitude, {table}.latitude)"
+    condition = Q()
+    for south, west, north, east in _split_dateline(bbox):
+        condition |= Q(RawSQL(
+            f"{point} <@ box(point(%s, %s), point(%s, %s))",
+            [west, south, east, north],
+            output_field=BooleanField(),
+        ))
+    return condition
+
+
+def default_strategy():
+    return STRATEGY_GIST if connection.vendor == 'postgresql' else STRATEGY_GEOHASH
+
+
+def bbox_filter(bbox, strategy=None):
+    """
+    Q for components inside (south, west, north, east) using the spatial index for this
+    database (or `strategy`, one of the STRATEGY_* names). Always includes the exact
+    bounds, so every strategy matches the same rows.
+    """
+    strategy = strategy or default_strategy()
+    condition = bounds_filter(bbox)
+    if strategy == STRATEGY_GIST:
+        return _gist_filter(bbox) & condition
+    if strategy == STRATEGY_GEOHASH:
+        prefixes = covering_geohash_prefixes(bbox)
+        if prefixes:
+            return geohash_prefix_filter(prefixes) & condition
+    return condition
+
+
+def backfill_geohashes(component_model=None, batch_size=2000, only_missing=True, progress=None):
+    """
+    Set Component.geohash from the coordinates in pk-ordered batches, writing only rows
+    whose stored value differs. component_model lets migrations pass their historical
+    model; progress(checked, updated) is called after each batch.
+
+    Returns (rows_checked, rows_updated).
+    """
+    if component_model is None:
+        from ..models import Component
+        component_model = Component
+
+    queryset = component_model.objects.all()
+    if only_missing:
+        queryset = queryset.filter(geohash__isnull=True, latitude__isnull=False, longitude__isnull=False)
+
+    checked, updated = backfill_in_batches(
+        queryset,
+        ('latitude', 'longitude'),
+        ('geohash',),
+        lambda latitude, longitude: (encode_geohash(latitude, longitude),),
+        batch_size=batch_size,
+        progress=progress,
+    )
+
+    logger.info(f"Geohash backfill: {checked} rows checked, {updated} updated")
+    return checked, updated
@@ -0,0 +1,269 @@
+"""
+Materialized statistics for the /statistics/ page.
+
+The page used to run ~15 aggregate queries per hit (grouped counts and sums by company
+and technology, the same groupings again for the charts, several Component.objects.count()
+calls and .count() on grouped querysets to decide on an "Other" bucket). All of those
+figures only change when components are ingested, so rebuild_statistics_snapshot()
+collects the full distributions once (from the capacity totals tables, see
+capacity_totals.py) and stores them in a StatisticsSnapshot row, and the page sorts /
+slices them in Python from a single row read (or the cache).
+
+Rebuilt by `manage.py build_statistics_snapshot` and at the end of the ingest commands.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Sum
+
+from ..models import (
+    CompanyCapacityTotal,
+    Component,
+    StatisticsSnapshot,
+    TechnologyCapacityTotal,
+    YearTechnologyCapacityTotal,
+)
+from ..utils import get_cache_key, normalize
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of StatisticsSnapshot.data changes; older rows are then rebuilt
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# Older snapshots kept for comparison / rollback
+SNAPSHOT_KEEP = 5
+
+# Tries at claiming the next version when concurrent rebuilds collide on it
+SNAPSHOT_VERSION_ATTEMPTS = 5
+
+# The snapshot only changes on rebuild (which clears this key), so it can be cached for a while
+SNAPSHOT_CACHE_TTL = 600
+SNAPSHOT_CACHE_KEY = get_cache_key("statistics_snapshot", "latest")
+
+# Components listed in the "Top by De-Rated Capacity" section
+TOP_DERATED_LIMIT = 20
+
+# Page limits (same as the live queries used)
+COMPANY_LIMIT = 25
+TECH_DISPLAY_LIMIT = 25
+CHART_LIMIT = 10
+
+
+def _totals_rows(model, field):
+    """Rows for one capacity totals table (see capacity_totals.py), blank group excluded."""
+    return [
+        {field: total.pk, "count": total.component_count, "total_capacity": total.total_capacity}
+        for total in model.objects.exclude(pk="").filter(component_count__gt=0).order_by(field)
+    ]
+
+
+def _year_rows():
+    """Per delivery year, rolled up from the year x technology totals."""
+    rows = (
+        YearTechnologyCapacityTotal.objects.exclude(delivery_year="")
+        .values("delivery_year")
+        .annotate(
+            count=Sum("component_count"),
+            capacity_count=Sum("capacity_component_count"),
+            total_capacity=Sum("total_capacity_mw"),
+        )
+        .filter(count__gt=0)
+        .order_by("delivery_year")
+    )
+    return [
+        {
+            "delivery_year": row["delivery_year"],
+            "count": row["count"],
+            "total_capacity": row["total_capacity"] if row["capacity_count"] else None,
+        }
+        for row in rows
+    ]
+
+
+def compute_statistics():
+    """Every figure the statistics page shows, as a JSON-serializable dict."""
+    totals = Component.objects.aggregate(
+        components=Count("id"),
+        cmus=Count("cmu_id", distinct=True),
+        total_capacity_mw=Sum("derated_capacity_mw"),
+        max_component_id=Max("id"),
+    )
+
+    companies = _totals_rows(CompanyCapacityTotal, "company_name")
+    technologies = _totals_rows(TechnologyCapacityTotal, "technology")
+    years = _year_rows()
+
+    top_derated_components = [
+        {
+            "id": row["id"],
+            "location": row["location"],
+            "company_name": row["company_name"],
+            "derated_capacity": row["derated_capacity_mw"],
+        }
+        for row in Component.objects.exclude(derated_capacity_mw__isnull=True)
+        .order_by("-derated_capacity_mw", "id")
+        .values("id", "location", "company_name", "derated_capacity_mw")[:TOP_DERATED_LIMIT]
+    ]
+
+    return {
+        "totals": {
+            "components": totals["components"],
+            "cmus": totals["cmus"],
+            "companies": len(companies),
+            "technologies": len(technologies),
+            "total_capacity_mw": totals["total_capacity_mw"] or 0,
+        },
+        "max_component_id": totals["max_component_id"],
+        "companies": companies,
+        "technologies": technologies,
+        "years": years,
+        "top_derated_components": top_derated_components,
+    }
+
+
+def rebuild_statistics_snapshot():
+    """Compute the statistics, store them as the next snapshot version and return it."""
+    start_time = time.time()
+    data = compute_statistics()
+    build_seconds = time.time() - start_time
+    max_component_id = data.pop("max_component_id")
+
+    with transaction.atomic():
+        for attempt in range(SNAPSHOT_VERSION_ATTEMPTS):
+            latest_version = StatisticsSnapshot.objects.aggregate(latest=Max("version"))["latest"] or 0
+            try:
+                # The savepoint lets a concurrent rebuild that took this version fall back to the next one
+                with transaction.atomic():
+                    snapshot = StatisticsSnapshot.objects.create(
+                        version=latest_version + 1,
+                        schema_version=SNAPSHOT_SCHEMA_VERSION,
+                        data=data,
+                        component_count=data["totals"]["components"],
+                        max_component_id=max_component_id,
+                        build_seconds=build_seconds,
+                    )
+                break
+            except IntegrityError:
+                if attempt == SNAPSHOT_VERSION_ATTEMPTS - 1:
+                    raise
+                logger.info(f"Statistics snapshot v{latest_version + 1} taken by a concurrent rebuild, retrying")
+        # Drop all but the newest SNAPSHOT_KEEP snapshots
+        stale_versions = list(
+            StatisticsSnapshot.objects.order_by("-version")
+            .values_list("version", flat=True)[SNAPSHOT_KEEP:]
+        )
+        if stale_versions:
+            StatisticsSnapshot.objects.filter(version__in=stale_versions).delete()
+
+    cache.delete(SNAPSHOT_CACHE_KEY)
+    logger.info(
+        f"Built statistics snapshot v{snapshot.version} for {snapshot.component_count} components "
+        f"in {build_seconds:.2f}s"
+    )
+    return snapshot
+
+
+def get_statistics_snapshot(build_if_missing=True):
+    """
+    The newest snapshot, from the cache or one row read. With build_if_missing, a snapshot
+    is built on the spot when there is none yet (or the newest uses an older schema).
+    """
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = StatisticsSnapshot.objects.order_by("-version").first()
+    if snapshot is None or snapshot.schema_version != SNAPSHOT_SCHEMA_VERSION:
+        if not build_if_missing:
+            return None
+        logger.warning("No current statistics snapshot, building one now")
+        snapshot = rebuild_statistics_snapshot()
+
+    cache.set(SNAPSHOT_CACHE_KEY, snapshot, SNAPSHOT_CACHE_TTL)
+    return snapshot
+
+
+def _ranked(rows, sort_key, order):
+    """Rows with a value for sort_key, sorted by it (ties by name order, as stored)."""
+    rows = [row for row in rows if row[sort_key] is not None]
+    return sorted(rows, key=lambda row: row[sort_key], reverse=order == "desc")
+
+
+def _chart(rows, label_key, value_key):
+    """Top CHART_LIMIT labels/values by value_key, plus an 'Other' bucket for the rest."""
+    ranked = _ranked(rows, value_key, "desc")
+    labels = [row[label_key] for row in ranked[:CHART_LIMIT]]
+    values = [float(row[value_key]) if value_key == "total_capacity" else row[value_key]
+              for row in ranked[:CHART_LIMIT]]
+    if len(ranked) > CHART_LIMIT:
+        other = sum(row[value_key] for row in ranked[CHART_LIMIT:])
+        labels.append("Other")
+        values.append(float(other) if value_key == "total_capacity" else other)
+    return labels, values
+
+
+def statistics_context(snapshot, company_sort="count", company_order="desc", tech_sort="count", tech_order="desc"):
+    """Template context for statistics.html built from a snapshot (no queries)."""
+    data = snapshot.data
+    totals = data["totals"]
+    total_components = totals["components"]
+
+    def percentage(count):
+        return (count / total_components) * 100 if total_components > 0 and count else 0
+
+    # Top companies by component count or total capacity
+    company_sort_key = "count" if company_sort == "count" else "total_capacity"
+    top_companies_data = []
+    for company in _ranked(data["companies"], company_sort_key, company_order)[:COMPANY_LIMIT]:
+        company = dict(company, company_id=normalize(company["company_name"]))
+        if company_sort == "count":
+            company["percentage"] = percentage(company["count"])
+        top_companies_data.append(company)
+
+    # Technology distribution (percentages are of component counts, shown for the count sort)
+    tech_sort_key = "count" if tech_sort == "count" else "total_capacity"
+    show_all_techs = totals["technologies"] <= TECH_DISPLAY_LIMIT
+    tech_distribution = _ranked(data["technologies"], tech_sort_key, tech_order)
+    if not show_all_techs:
+        tech_distribution = tech_distribution[:TECH_DISPLAY_LIMIT]
+    tech_distribution = [
+        dict(tech, percentage=percentage(tech["count"]) if tech_sort == "count" else 0)
+        for tech in tech_distribution
+    ]
+
+    # Every delivery year, oldest first
+    year_distribution = [dict(year, percentage=percentage(year["count"])) for year in data["years"]]
+
+    company_count_chart_labels, company_count_chart_values = _chart(data["companies"], "company_name", "count")
+    company_capacity_chart_labels, company_capacity_chart_values = _chart(data["companies"], "company_name", "total_capacity")
+    tech_chart_labels, tech_chart_values = _chart(data["technologies"], "technology", "count")
+    tech_capacity_chart_labels, tech_capacity_chart_values = _chart(data["technologies"], "technology", "total_capacity")
+
+    return {
+        'top_companies_data': top_companies_data,
+        'company_sort': company_sort,
+        'company_order': company_order,
+        'tech_distribution': tech_distribution,
+        'tech_sort': tech_sort,
+        'tech_order': tech_order,
+        'year_distribution': year_distribution,
+        'top_derated_components': data["top_derated_components"],
+        'total_components': total_components,
+        'total_cmus': totals["cmus"],
+        'total_companies': totals["companies"],
+        'show_all_techs': show_all_techs,
+        # Chart Data
+        'company_count_chart_labels': company_count_chart_labels,
+        'company_count_chart_values': company_count_chart_values,
+        'company_capacity_chart_labels': company_capacity_chart_labels,
+        'company_capacity_chart_values': company_capacity_chart_values,
+        'tech_chart_labels': tech_chart_labels,
+        'tech_chart_values': tech_chart_values,
+        'tech_capacity_chart_labels': tech_capacity_chart_labels,
+        'tech_capacity_chart_values': tech_capacity_chart_values,
+        # Snapshot stamp
+        'snapshot_version': snapshot.version,
+        'snapshot_created_at': snapshot.created_at,
+    }
@@ -1,3 +1,291 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .management.commands.crawler_standin_server import Command as StandInCommand
+from .management.commands.crawler_standin_server import DatastoreStandIn, _handler_for
+from .models import Component, TechnologyCapacityTotal
+from .services.bulk_ingest import ingest_components
+from .services.capacity_totals import diff_capacity_totals
+from .services.company_directory import get_company_name_variations, get_company_summaries
+from .services.crawler import CMU_RESOURCE_ID, COMPONENT_RESOURCE_ID, CrawlError, DatastoreClient, TokenBucket
+from .services.search_index import ComponentTokenIndex
+from .services.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .services.outcode_data import grid_reference_to_latlng, grid_reference_to_osgb, outcodes_from_locations
+
+
+class ScriptedStandIn(DatastoreStandIn):
+    """Stand-in that answers with queued (status, headers) failures first and can fail chosen CMUs."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scripted = []
+        self.failing_cmu_ids = set()
+        self.cmu_page_offsets = []
+
+    def handle(self, params):
+        with self.lock:
+            scripted = self.scripted.pop(0) if self.scripted else None
+            if params.get("resource_id") == CMU_RESOURCE_ID and params.get("limit") != "0":
+                self.cmu_page_offsets.append(int(params.get("offset") or 0))
+        if scripted:
+            status, headers = scripted
+            return status, headers, {"success": False, "error": {"message": "Scripted failure"}}
+        if params.get("resource_id") == COMPONENT_RESOURCE_ID and params.get("q") in self.failing_cmu_ids:
+            # A 4xx other than 429 isn't retried, so the fetch fails at once
+            return 400, {}, {"success": False, "error": {"message": "Scripted CMU failure"}}
+        return super().handle(params)
+
+
+class StandInServerTestCase(TestCase):
+    """Serves a ScriptedStandIn on an ephemeral port for the duration of each test."""
+
+    synthetic_cmus = 3
+
+    def setUp(self):
+        cmu_records, component_records = StandInCommand().synthetic_records(self.synthetic_cmus, seed=1)
+        self.standin = ScriptedStandIn(cmu_records, component_records)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(self.standin, False))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}/api/3/action/datastore_search"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class DatastoreClientTests(StandInServerTestCase):
+    def datastore_client(self, **kwargs):
+        return DatastoreClient(self.api_url, rate=0, backoff_base=0.01, backoff_cap=1.0, **kwargs)
+
+    def test_retries_503_then_succeeds(self):
+        self.standin.scripted = [(503, {}), (503, {})]
+        client = self.datastore_client(retries=2)
+        records = client.cmu_page(0, 10)["records"]
+        self.assertEqual(len(records), self.synthetic_cmus)
+        self.assertEqual(client.stats["retries"], 2)
+        self.assertEqual(client.stats["failures"], 0)
+
+    def test_gives_up_after_retries(self):
+        self.standin.scripted = [(503, {}), (503, {})]
+        client = self.datastore_client(retries=1)
+        with self.assertRaises(CrawlError):
+            client.cmu_page(0, 10)
+        self.assertEqual(client.stats["requests"], 2)
+        self.assertEqual(client.stats["failures"], 1)
+
+    def test_429_waits_for_retry_after(self):
+        self.standin.scripted = [(429, {"Retry-After": "0.25"})]
+        client = self.datastore_client(retries=2)
+        with mock.patch("checker.services.crawler.time.sleep") as sleep:
+            client.cmu_page(0, 10)
+        sleep.assert_called_once_with(0.25)
+        self.assertEqual(client.stats["retries"], 1)
+
+    def test_retry_after_is_capped(self):
+        self.standin.scripted = [(429, {"Retry-After": "120"})]
+        client = self.datastore_client(retries=1)
+        with mock.patch("checker.services.crawler.time.sleep") as sleep:
+            client.cmu_page(0, 10)
+        sleep.assert_called_once_with(1.0)
+
+
+class TokenBucketTests(TestCase):
+    def test_throughput_is_limited_to_rate_after_burst(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(12):
+            bucket.acquire()
+        elapsed = time.monotonic() - start
+        # Two tokens from the burst, then ten more at 20 per second
+        self.assertGreaterEqual(elapsed, 0.45)
+        self.assertLess(elapsed, 1.5)
+
+    def test_burst_is_immediate(self):
+        bucket = TokenBucket(rate=1, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            self.assertEqual(bucket.acquire(), 0.0)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+class ConcurrentCrawlResumeTests(StandInServerTestCase):
+    synthetic_cmus = 6
+
+    def setUp(self):
+        super().setUp()
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        settings_override = override_settings(BASE_DIR=self.base_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def crawl(self, **options):
+        call_command(
+            "crawl_to_database", workers=2, rate=0, retries=0, batch_size=2, api_url=self.api_url,
+            stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def checkpoint(self):
+        with open(os.path.join(self.base_dir.name, "checkpoints", "crawler_checkpoint.json")) as f:
+            return json.load(f)
+
+    def test_resume_skips_completed_pages_and_refetches_failed_ones(self):
+        # STANDIN00003 is on the page at offset 2 (two CMUs per page)
+        self.standin.failing_cmu_ids = {"STANDIN00003"}
+        self.crawl()
+
+        checkpoint = self.checkpoint()
+        self.assertEqual(checkpoint["offset"], 2)
+        self.assertEqual(checkpoint["completed_offsets"], [4])
+        self.assertEqual(checkpoint["workers"], {})
+        self.assertFalse(Component.objects.filter(cmu_id="STANDIN00003").exists())
+        self.assertTrue(Component.objects.filter(cmu_id="STANDIN00005").exists())
+
+        self.standin.failing_cmu_ids = set()
+        self.standin.cmu_page_offsets = []
+        self.crawl(resume=True)
+
+        # Page 0 is below the checkpoint offset and page 4 is in completed_offsets
+        self.assertEqual(self.standin.cmu_page_offsets, [2])
+        self.assertTrue(Component.objects.filter(cmu_id="STANDIN00003").exists())
+        self.assertEqual(self.checkpoint()["offset"], 6)
+
+    def test_failed_component_write_is_not_completed(self):
+        with mock.patch(
+            "checker.management.commands.crawl_to_database.ingest_components", side_effect=RuntimeError("db down")
+        ):
+            self.crawl()
+        checkpoint = self.checkpoint()
+        self.assertEqual(checkpoint["offset"], 0)
+        self.assertEqual(checkpoint["completed_offsets"], [])
+
+
+class IngestCapacityTotalsTests(TestCase):
+    def record(self, component_id, technology, capacity):
+        return {
+            "_id": component_id,
+            "Company Name": "Totals Energy Ltd",
+            "Generating Technology Class": technology,
+            "Delivery Year": "2026",
+            "De-Rated Capacity": str(capacity),
+        }
+
+    def test_overwrite_and_insert_keep_totals_in_step(self):
+        ingest_components([("CMU1", self.record(1, "DSR", 1.5)), ("CMU1", self.record(2, "DSR", 2.0))])
+        # One batch that overwrites component 1 (moving it to another technology) and inserts component 3
+        result = ingest_components(
+            [("CMU1", self.record(1, "Battery Storage", 4.0)), ("CMU1", self.record(3, "DSR", 0.5))],
+            update_existing=True,
+        )
+        self.assertEqual((result["added"], result["updated"]), (1, 1))
+        self.assertEqual(diff_capacity_totals(), [])
+        dsr = TechnologyCapacityTotal.objects.get(technology="DSR")
+        self.assertEqual((dsr.component_count, dsr.total_capacity_mw), (2, 2.5))
+
+
+class VersionedCacheTests(TestCase):
+    def test_company_summary_cache_misses_after_a_write(self):
+        record = {"_id": 1, "Company Name": "Cached Energy Ltd", "De-Rated Capacity": "1.0"}
+        ingest_components([("CMU1", record)])
+        self.assertEqual(get_company_summaries(["Cached Energy Ltd"])["Cached Energy Ltd"]["component_count"], 1)
+
+        # Bumps the data version, so the cached summary is not served for the rest of its TTL
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_components([("CMU1", dict(record, _id=2))])
+        self.assertEqual(get_company_summaries(["Cached Energy Ltd"])["Cached Energy Ltd"]["component_count"], 2)
+
+    def test_unknown_company_is_cached_as_a_miss(self):
+        self.assertEqual(get_company_name_variations("nosuchenergyltd"), (None, []))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_company_name_variations("nosuchenergyltd"), (None, []))
+
+
+class KeysetCursorTests(TestCase):
+    def setUp(self):
+        Component.objects.bulk_create([
+            Component(component_id=str(i), cmu_id="CMU1", derated_capacity_mw=float(i)) for i in range(1, 6)
+        ])
+        self.paginator = KeysetPaginator(Component.objects.all(), 2, "derated_capacity_mw")
+
+    def tampered(self, **changes):
+        data = decode_cursor(self.paginator.get_page().next_cursor)
+        return encode_cursor(dict(data, **changes))
+
+    def test_next_cursor_continues(self):
+        page = self.paginator.get_page(self.paginator.get_page().next_cursor)
+        self.assertEqual([c.derated_capacity_mw for c in page], [3.0, 4.0])
+        self.assertEqual(page.offset, 2)
+
+    def test_invalid_cursor_values_give_the_first_page(self):
+        for changes in ({"o": "2"}, {"t": [5]}, {"o": True}, {"v": "not a number"}, {"k": "abc"}, {"k": None}):
+            with self.subTest(changes=changes):
+                page = self.paginator.get_page(self.tampered(**changes))
+                self.assertEqual([c.derated_capacity_mw for c in page], [1.0, 2.0])
+                self.assertEqual(page.offset, 0)
+                self.assertFalse(page.has_previous)
+
+
+class ComponentTokenIndexTests(TestCase):
+    def setUp(self):
+        self.index = ComponentTokenIndex()
+        self.first = Component.objects.create(
+            component_id="1", cmu_id="CMU1", company_name="Flexitricity Ltd", location="Aberdeen AB10 1XX"
+        )
+        self.index.build()
+
+    def test_substring_terms_match_like_icontains(self):
+        self.assertEqual(self.index.pks_for_term("TRICITY"), {self.first.pk})
+        self.assertEqual(self.index.pks_for_term("ab"), {self.first.pk})
+        self.assertEqual(self.index.pks_for_term("aaaa"), frozenset())
+        self.assertEqual(self.index.pks_for_term("tricityx"), frozenset())
+
+    def test_refresh_applies_bulk_writes(self):
+        # bulk_create skips the post_save signal, so only the watermark refresh sees it
+        Component.objects.bulk_create([
+            Component(component_id="2", cmu_id="CMU2", company_name="Gridbeyond Ltd", location="Leeds LS1 1AA")
+        ])
+        self.index.refresh()
+        self.assertEqual(len(self.index.pks_for_term("gridbeyond")), 1)
+
+        Component.objects.filter(component_id="1").delete()
+        self.index.refresh()
+        self.assertEqual(self.index.pks_for_term("tricity"), frozenset())
+        self.assertNotIn("tri", self.index._grams)
+
+
+class OfflineOutcodeBuildTests(TestCase):
+    def test_grid_reference_to_osgb(self):
+        # Centre of the 1 m square named by a ten-figure reference
+        self.assertEqual(grid_reference_to_osgb("TG 51409 13177"), (651409.5, 313177.5))
+        self.assertEqual(grid_reference_to_osgb("NN1665071250"), (216650.5, 771250.5))
+        self.assertIsNone(grid_reference_to_osgb("TQ 3008 804"))
+        self.assertIsNone(grid_reference_to_osgb("not a reference"))
+
+    def test_grid_reference_to_latlng(self):
+        # Trafalgar Square
+        lat, lng = grid_reference_to_latlng("TQ 30080 80430")
+        self.assertAlmostEqual(lat, 51.5082, places=3)
+        self.assertAlmostEqual(lng, -0.1238, places=3)
+
+    def test_outcodes_from_locations(self):
+        rows = outcodes_from_locations([
+            ("1 High Street, Streatham, SW16 1AA", "TQ 30080 71430"),
+            ("Unit 2, Streatham, SW16 2BB", "TQ 30080 71430"),
+            ("Depot, United Kingdom, SW16 3CC", None),
+            ("Somewhere without a postcode", "TQ 30080 71430"),
+        ])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["outcode"], "SW16")
+        self.assertEqual(rows[0]["admin_district"], ["Streatham"])
+        self.assertAlmostEqual(rows[0]["latitude"], 51.427, places=2)
@@ -16,7 +16,7 @@ urlpatterns = [
     path("api/auction-components/<str:company_id>/<str:year>/<str:auction_name>/",
          views.htmx_auction_components, name="htmx_auction_components"),
     path("api/cmu-details/<str:cmu_id>/",
-         views.get_cmu_details, name="htmx_cmu_details"),
+         views.htmx_cmu_details, name="htmx_cmu_details"),
 
     # Component detail page - use integer primary key
     path("component/<int:pk>/",
@@ -31,10 +31,14 @@ urlpatterns = [
     # Map view and API
     path('map/', views.map_view, name='map_view'),
     path('api/map-data/', views.map_data_api, name='map_data_api'),
+    path('api/map-clusters/', views.map_clusters_api, name='map_clusters_api'),
+    path('api/map-marker/<int:component_id>/', views.map_marker_api, name='map_marker_api'),
 
     # Debug/admin endpoints
     path("debug/mapping-cache/",
          views.debug_mapping_cache, name="debug_mapping_cache"),
+    path("debug/cache-stats/",
+         views.debug_cache_stats, name="debug_cache_stats"),
 
     # API endpoint for getting auction components
     path("api/auction-components/<str:company_id>/<str:year>/<str:auction_name>/", views.auction_components, name="auction_components_api"),
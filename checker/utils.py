@@ -112,7 +112,7 @@ def format_location_list(locations, components):
             delivery_year = component.get("Delivery Year", "")
             
             # Get both types of IDs
-            system_id = component.get("_id", "")[:8] if component.get("_id") else ""
+            system_id = str(component.get("_id", ""))[:8] if component.get("_id") else ""
             component_id_value = component.get("Component ID", "") if component.get("Component ID") else ""
 
             # Extract auction year and type
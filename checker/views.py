@@ -5,7 +5,6 @@ import urllib.parse
 from django.conf import settings
 import os
 import json
-import glob
 from django.db.models import Count, Q, Sum
 # Remove Component import from here
 # Remove unused checker import
@@ -13,8 +12,15 @@ from django.db.models import Count, Q, Sum
 
 # Import service functions first
 from .services.company_search import search_companies_service, get_company_years, get_cmu_details, company_detail # Import company_detail only once
+from .services.company_search import build_auction_component_tree, AUCTION_TREE_CACHE_TTL
 from .services.component_search import search_components_service
 from .services.component_detail import get_component_details
+from .services.company_directory import get_company_name_variations
+from .services.pagination import CountingPaginator, KeysetPaginator
+from .services import map_clusters
+from .services.map_clusters import component_feature
+from .services.spatial import bbox_filter
+from .services.data_version import versioned_cache_key, versioned_response
 from .utils import safe_url_param, from_url_param, normalize
 from .services.data_access import get_component_data_from_json, get_json_path, fetch_components_for_cmu_id
 
@@ -95,6 +101,7 @@ def search_components(request):
 
 
 @require_http_methods(["GET"])
+@versioned_response
 def htmx_company_years(request, company_id, year, auction_name=None):
     """HTMX endpoint for lazy loading company year details"""
     # Convert year and auction_name from URL format (underscores) back to spaces
@@ -107,6 +114,14 @@ def htmx_company_years(request, company_id, year, auction_name=None):
     return HttpResponse(years_html)
 
 
+@require_http_methods(["GET"])
+@versioned_response
+def htmx_cmu_details(request, cmu_id):
+    """HTMX endpoint for lazy loading CMU details"""
+    cmu_html = get_cmu_details(cmu_id)
+    return HttpResponse(cmu_html)
+
+
 @require_http_methods(["GET"])
 def component_detail(request, pk):
     """View function for component details page"""
@@ -114,6 +129,7 @@ def component_detail(request, pk):
 
 
 @require_http_methods(["GET"])
+@versioned_response
 def htmx_auction_components(request, company_id, year, auction_name):
     """HTMX endpoint for loading components for a specific auction"""
     start_time = time.time()
@@ -129,15 +145,8 @@ def htmx_auction_components(request, company_id, year, auction_name):
 
         logger.info(f"Parameters after conversion: company_id='{company_id}', year='{year}', auction_name='{auction_name}'")
 
-        # --- Find all company name variations ---
-        all_company_names = Component.objects.values_list('company_name', flat=True).distinct()
-        company_name_variations = []
-        primary_company_name = None # For display/logging if needed
-        for name in all_company_names:
-            if name and normalize(name) == company_id:
-                company_name_variations.append(name)
-                if primary_company_name is None:
-                    primary_company_name = name
+        # --- Find all company name variations (company directory lookup) ---
+        primary_company_name, company_name_variations = get_company_name_variations(company_id)
 
         if not company_name_variations:
             return HttpResponse(f"<div class='alert alert-warning'>Company not found matching ID: {company_id}</div>")
@@ -179,13 +188,53 @@ def htmx_auction_components(request, company_id, year, auction_name):
         logger.critical(f"FINAL QUERY FILTER (Strict): {base_query}")
         # --- End Build Query ---
 
-        # --- Execute Query ---
-        components = Component.objects.filter(base_query).order_by('cmu_id', 'location')
-        logger.info(f"Specific query found {components.count()} components.")
+        # --- Execute Query (one ordered fetch, cached per company/year/auction) ---
+        cache_key = versioned_cache_key("htmx_auction_components", f"{company_id}|{year}|{auction_name}")
+        components_by_cmu = cache.get(cache_key)
+        if components_by_cmu is None:
+            tree = build_auction_component_tree(base_query)
+
+            # Fetch Registry Data for ALL relevant CMU IDs
+            all_cmu_ids_in_results = [cmu_id for cmu_id in tree if cmu_id]
+            registry_capacity_map = {}
+            if all_cmu_ids_in_results: # Check if the list is not empty
+                registry_entries = CMURegistry.objects.filter(cmu_id__in=all_cmu_ids_in_results).only('cmu_id', 'raw_data')
+                for entry in registry_entries:
+                    try:
+                        raw_data = entry.raw_data or {}
+                        capacity_str = raw_data.get("De-Rated Capacity")
+                        # Added check for 'n/a' string comparison
+                        if capacity_str and isinstance(capacity_str, str) and capacity_str.lower() != 'n/a':
+                             registry_capacity_map[entry.cmu_id] = float(capacity_str)
+                        elif isinstance(capacity_str, (int, float)): # Handle if it's already a number
+                             registry_capacity_map[entry.cmu_id] = float(capacity_str)
+                    except (ValueError, TypeError, json.JSONDecodeError) as parse_error:
+                        logger.warning(f"Could not parse capacity from registry raw_data for CMU {entry.cmu_id}: {parse_error}")
+            logger.info(f"Fetched registry capacity for {len(registry_capacity_map)} CMUs potentially needed.")
+
+            # Organize components by CMU ID (for the template)
+            components_by_cmu = {}
+            for cmu_id, locations in tree.items():
+                registry_capacity = registry_capacity_map.get(cmu_id)
+                components_by_cmu[cmu_id] = [
+                    {
+                        'id': comp['id'],
+                        'location': comp['location'],
+                        'description': comp['description'],
+                        'technology': comp['technology'],
+                        'component_id': comp['component_id'],
+                        # Pass both capacities to the template
+                        'component_capacity': comp['derated_capacity_mw'],
+                        'registry_capacity': registry_capacity,
+                    }
+                    for location_components in locations.values()
+                    for comp in location_components
+                ]
+            cache.set(cache_key, components_by_cmu, AUCTION_TREE_CACHE_TTL)
         # --- End Execute Query ---
 
         # --- Handle No Results ---
-        if not components.exists():
+        if not components_by_cmu:
             return HttpResponse(f"""
                 <div class='alert alert-info'>
                     <p>No components found for this auction: {auction_name}</p>
@@ -194,49 +243,7 @@ def htmx_auction_components(request, company_id, year, auction_name):
             """)
         # --- End Handle No Results ---
 
-        # --- Process Results (Fetch Registry, Organize, Render) ---
-        # Fetch Registry Data for ALL relevant CMU IDs
-        all_cmu_ids_in_results = list(set([c.cmu_id for c in components if c.cmu_id])) # Get all unique CMU IDs from query results
-        registry_capacity_map = {}
-        if all_cmu_ids_in_results: # Check if the list is not empty
-            registry_entries = CMURegistry.objects.filter(cmu_id__in=all_cmu_ids_in_results) # Query based on all IDs
-            for entry in registry_entries:
-                try:
-                    raw_data = entry.raw_data or {}
-                    capacity_str = raw_data.get("De-Rated Capacity")
-                    # Added check for 'n/a' string comparison
-                    if capacity_str and isinstance(capacity_str, str) and capacity_str.lower() != 'n/a':
-                         registry_capacity_map[entry.cmu_id] = float(capacity_str)
-                    elif isinstance(capacity_str, (int, float)): # Handle if it's already a number
-                         registry_capacity_map[entry.cmu_id] = float(capacity_str)
-                except (ValueError, TypeError, json.JSONDecodeError) as parse_error:
-                    logger.warning(f"Could not parse capacity from registry raw_data for CMU {entry.cmu_id}: {parse_error}")
-        logger.info(f"Fetched registry capacity for {len(registry_capacity_map)} CMUs potentially needed.") # Log adjusted message
-
-        # Organize components by CMU ID (for the template)
-        components_by_cmu = {}
-        for comp in components:
-            # Get both capacities explicitly
-            component_capacity = comp.derated_capacity_mw # From the Component object
-            registry_capacity = registry_capacity_map.get(comp.cmu_id) # Get from the map populated above
-
-            comp_data = {
-                'id': comp.id,
-                'location': comp.location,
-                'description': comp.description,
-                'technology': comp.technology,
-                'component_id': comp.component_id,
-                # Pass both capacities to the template
-                'component_capacity': component_capacity,
-                'registry_capacity': registry_capacity,
-                 # Add other fields needed by the template if any
-            }
-            
-            if comp.cmu_id not in components_by_cmu:
-                 components_by_cmu[comp.cmu_id] = []
-            components_by_cmu[comp.cmu_id].append(comp_data)
-        
-        logger.info(f"Organized {components.count()} components into {len(components_by_cmu)} CMU groups for template.")
+        logger.info(f"Organized {sum(len(comps) for comps in components_by_cmu.values())} components into {len(components_by_cmu)} CMU groups for template.")
 
         # Render the component list HTML
         context = {
@@ -264,6 +271,16 @@ def htmx_auction_components(request, company_id, year, auction_name):
 
     return HttpResponse(html_content)
 
+def debug_cache_stats(request):
+    """Debug view showing this worker's cache hit/miss counters (tiered cache only)"""
+    from django.core.cache import caches
+    from django.http import JsonResponse
+
+    default_cache = caches["default"]
+    if not hasattr(default_cache, "stats"):
+        return JsonResponse({"backend": type(default_cache).__name__, "stats": None})
+    return JsonResponse({"backend": type(default_cache).__name__, "pid": os.getpid(), "stats": default_cache.stats()})
+
 def debug_mapping_cache(request):
     """Debug view to examine the cached CMU ID to company name mapping"""
     from django.core.cache import cache
@@ -361,7 +378,8 @@ def debug_company_components(request):
         })
     
     # Get CMU dataframe to find all CMU IDs for this company
-    from .services.company_search import get_cmu_dataframe
+    from .services.data_access import get_cmu_dataframe
+    from .services.component_store import get_component_store
     cmu_df, _ = get_cmu_dataframe()
     
     if cmu_df is None:
@@ -384,8 +402,7 @@ def debug_company_components(request):
     # Get all CMU IDs for this company
     cmu_ids = company_records["CMU ID"].unique().tolist()
     
-    # Check each JSON file for components
-    json_dir = os.path.join(settings.BASE_DIR, 'json_data')
+    # Check each CMU ID for components
     all_components = {}
     found_count = 0
     missing_count = 0
@@ -415,33 +432,28 @@ def debug_company_components(request):
                 "components": []
             }
     
-    # Also search through all JSON files for any components with this company name
+    # Also search the component store (where crawls save components) for any components with this company name
     found_in_files = []
-    json_files = glob.glob(os.path.join(json_dir, 'components_*.json'))
-    
-    for json_file in json_files:
-        try:
-            with open(json_file, 'r') as f:
-                file_components = json.load(f)
-                
-            for file_cmu_id, cmu_components in file_components.items():
-                if file_cmu_id in all_components:
-                    continue  # Already processed this CMU ID
-                    
-                for component in cmu_components:
-                    if isinstance(component, dict) and component.get("Company Name") == company_name:
-                        if file_cmu_id not in all_components:
-                            all_components[file_cmu_id] = {
-                                "file_path": json_file,
-                                "file_exists": True,
-                                "component_count": len(cmu_components),
-                                "components": cmu_components,
-                                "note": "Found by company name, not in CMU dataframe"
-                            }
-                            found_in_files.append(file_cmu_id)
-                        break
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
+    store = get_component_store()
+
+    try:
+        for store_cmu_id, cmu_components in store.items():
+            if store_cmu_id in all_components:
+                continue  # Already processed this CMU ID
+
+            for component in cmu_components:
+                if isinstance(component, dict) and component.get("Company Name") == company_name:
+                    all_components[store_cmu_id] = {
+                        "file_path": store.directory,
+                        "file_exists": True,
+                        "component_count": len(cmu_components),
+                        "components": cmu_components,
+                        "note": "Found by company name, not in CMU dataframe"
+                    }
+                    found_in_files.append(store_cmu_id)
+                    break
+    except Exception as e:
+        print(f"Error reading the component store: {e}")
     
     return render(request, "checker/debug_components.html", {
         "company_name": company_name,
@@ -494,6 +506,7 @@ def debug_cache(request, cmu_id):
     return JsonResponse(debug_info)
 
 
+@versioned_response
 def auction_components(request, company_id, year, auction_name):
     """
     API endpoint for fetching components for a specific auction
@@ -745,17 +758,11 @@ def fetch_components_for_cmu_id(cmu_id, limit=None, page=1, per_page=100):
 
 
 def statistics_view(request):
-    """View function for displaying database statistics"""
-    from .utils import normalize
-    from django.db.models import Count, Q, Sum # Ensure Sum is imported
+    """View function for displaying database statistics (rendered from the latest statistics snapshot)"""
+    from .services.statistics_snapshot import get_statistics_snapshot, statistics_context
     import logging # Add logging
     logger = logging.getLogger(__name__)
     
-    # Adjust limits
-    COMPANY_LIMIT = 25 # Changed from 50
-    TECH_LIMIT = 25    # Stays at 25
-    DERATED_LIMIT = 20 # Limit for the new list
-    
     # --- Determine Company Sort Method --- 
     company_sort = request.GET.get('company_sort', 'count') # Default to count
     company_order = request.GET.get('company_order', 'desc') # Default to descending
@@ -763,46 +770,7 @@ def statistics_view(request):
         company_sort = 'count' # Fallback to default
     if company_order not in ['asc', 'desc']:
         company_order = 'desc' # Fallback to default
-        
-    # Determine DB sort prefix
-    db_sort_prefix = '-' if company_order == 'desc' else ''
-        
-    # --- Fetch Top Companies based on Sort Method --- 
-    top_companies_data = []
-    if company_sort == 'count':
-        # Sort by Component Count
-        sort_field = f"{db_sort_prefix}count"
-        top_companies_data = Component.objects.exclude(company_name__isnull=True) \
-                                 .exclude(company_name='') \
-                                 .values('company_name') \
-                                 .annotate(count=Count('id')) \
-                                 .order_by(sort_field)[:COMPANY_LIMIT]
-        # Add company_id and calculate percentage for display
-        total_components_for_pct = Component.objects.count() # Need total for percentage
-        for company in top_companies_data:
-            company['company_id'] = normalize(company['company_name'])
-            if total_components_for_pct > 0:
-                 company['percentage'] = (company['count'] / total_components_for_pct) * 100
-            else:
-                 company['percentage'] = 0
-        logger.info(f"Fetched top {len(top_companies_data)} companies sorted by count ({company_order}).")
-    else: 
-        # Sort by Total De-rated Capacity
-        sort_field = f"{db_sort_prefix}total_capacity"
-        top_companies_data = Component.objects.exclude(company_name__isnull=True) \
-                                 .exclude(company_name='') \
-                                 .exclude(derated_capacity_mw__isnull=True) \
-                                 .values('company_name') \
-                                 .annotate(total_capacity=Sum('derated_capacity_mw')) \
-                                 .order_by(sort_field)[:COMPANY_LIMIT]
-        # Add company_id for links
-        for company in top_companies_data:
-            company['company_id'] = normalize(company['company_name'])
-        logger.info(f"Fetched top {len(top_companies_data)} companies sorted by total capacity ({company_order}).")
-        
-    top_companies_data = list(top_companies_data) # Convert queryset to list
 
-    # --- Technology Distribution Logic --- 
     # Determine Technology Sort Method
     tech_sort = request.GET.get('tech_sort', 'count') # Default to count
     tech_order = request.GET.get('tech_order', 'desc') # Default to descending
@@ -810,183 +778,15 @@ def statistics_view(request):
         tech_sort = 'count'
     if tech_order not in ['asc', 'desc']:
         tech_order = 'desc'
-    tech_db_sort_prefix = '-' if tech_order == 'desc' else ''
-
-    # Count total distinct technologies (only needed for show_all check now)
-    total_distinct_tech_count = Component.objects.values('technology').distinct().count()
-    TECH_DISPLAY_LIMIT = 25
-    show_all_techs = total_distinct_tech_count <= TECH_DISPLAY_LIMIT
-
-    # Base query excluding nulls/empties
-    base_tech_query = Component.objects.exclude(technology__isnull=True).exclude(technology='')
-
-    # Annotate and order based on sort selection
-    if tech_sort == 'count':
-        tech_queryset = base_tech_query.values('technology') \
-                                     .annotate(count=Count('id')) \
-                                     .order_by(f'{tech_db_sort_prefix}count')
-        logger.info(f"Fetching technologies sorted by count ({tech_order}).")
-    else: # tech_sort == 'capacity'
-        # Exclude components with null capacity for this sort
-        tech_queryset = base_tech_query.exclude(derated_capacity_mw__isnull=True) \
-                                     .values('technology') \
-                                     .annotate(total_capacity=Sum('derated_capacity_mw')) \
-                                     .order_by(f'{tech_db_sort_prefix}total_capacity')
-        logger.info(f"Fetching technologies sorted by total capacity ({tech_order}).")
-
-    # Apply limit if not showing all
-    if not show_all_techs:
-        tech_distribution = tech_queryset[:TECH_DISPLAY_LIMIT]
-        logger.info(f"Displaying top {TECH_DISPLAY_LIMIT} technologies.")
-    else:
-        tech_distribution = tech_queryset
-        logger.info(f"Displaying all {tech_distribution.count()} technologies.")
-
-    # Get delivery year distribution - include all years
-    year_distribution = Component.objects.exclude(delivery_year__isnull=True) \
-                                 .exclude(delivery_year='') \
-                                 .values('delivery_year') \
-                                 .annotate(count=Count('id')) \
-                                 .order_by('delivery_year')  # Order by year ascending
-    
-    # --- New: Get Top Components by De-Rated Capacity (Using DB Field) --- 
-    top_derated_components = []
-    try:
-        # Fetch top N components directly from the database, ordered by the new field
-        # Exclude null values as they cannot be meaningfully ranked
-        top_derated_components = Component.objects.exclude(derated_capacity_mw__isnull=True) \
-                                            .order_by('-derated_capacity_mw') \
-                                            .values('id', 'location', 'company_name', 'derated_capacity_mw')[:DERATED_LIMIT]
-        
-        # Convert QuerySet to list of dicts (if needed for template consistency)
-        top_derated_components = list(top_derated_components)
-        
-        # Rename key for template compatibility
-        for comp in top_derated_components:
-             comp['derated_capacity'] = comp.pop('derated_capacity_mw')
-            
-        logger.info(f"Fetched top {len(top_derated_components)} components by de-rated capacity using database field.")
-        
-    except Exception as e:
-        logger.error(f"Error fetching de-rated capacity ranking using DB field: {e}")
-    # --- End New Section --- 
-
-    # Get total counts
-    total_components = Component.objects.count()
-    total_cmus = Component.objects.values('cmu_id').distinct().count()
-    total_companies = Component.objects.exclude(company_name__isnull=True) \
-                              .exclude(company_name='') \
-                              .values('company_name').distinct().count()
-    
-    # Calculate percentages for visual representation and add normalized company IDs
-    for company in top_companies_data:
-        company['company_id'] = normalize(company['company_name'])
-        
-    # Re-enable percentage calculation for tech distribution (always based on count for now)
-    total_components_for_pct = Component.objects.count()
-    for tech in tech_distribution:
-        # If sorting by capacity, we need to add the component count separately if needed for display
-        # For simplicity, let's just calculate percentage based on total components count
-        # We might need to re-query the count if sorting by capacity and count is needed.
-        # For now, let's assume count is implicitly available or not strictly required for percentage display.
-        # A potential improvement: add count annotation even when sorting by capacity.
-        # Simplified approach: Calculate percentage based on total components if count field exists
-        current_count = tech.get('count', 0) # Get count if available
-        if total_components_for_pct > 0 and current_count > 0:
-            tech['percentage'] = (current_count / total_components_for_pct) * 100
-        else:
-            tech['percentage'] = 0 # Default if count is missing or total is zero
-        
-    for year in year_distribution:
-        if total_components_for_pct > 0:
-            year['percentage'] = (year['count'] / total_components_for_pct) * 100
-        else:
-             year['percentage'] = 0
-    
-    # --- Prepare Data for Charts --- #
-    # Top Companies (limit to e.g., 10 for readability in chart, plus 'Other')
-    CHART_LIMIT = 10
-    
-    # Company Chart Data (by Count)
-    company_count_chart_data = Component.objects.exclude(company_name__isnull=True).exclude(company_name='') \
-                                     .values('company_name') \
-                                     .annotate(count=Count('id')) \
-                                     .order_by('-count')
-    company_count_chart_labels = [c['company_name'] for c in company_count_chart_data[:CHART_LIMIT]]
-    company_count_chart_values = [c['count'] for c in company_count_chart_data[:CHART_LIMIT]]
-    # Add 'Other' category if needed
-    if company_count_chart_data.count() > CHART_LIMIT:
-        other_count = sum(c['count'] for c in company_count_chart_data[CHART_LIMIT:])
-        company_count_chart_labels.append('Other')
-        company_count_chart_values.append(other_count)
-
-    # Company Chart Data (by Capacity)
-    company_capacity_chart_data = Component.objects.exclude(company_name__isnull=True).exclude(company_name='') \
-                                        .exclude(derated_capacity_mw__isnull=True) \
-                                        .values('company_name') \
-                                        .annotate(total_capacity=Sum('derated_capacity_mw')) \
-                                        .order_by('-total_capacity')
-    company_capacity_chart_labels = [c['company_name'] for c in company_capacity_chart_data[:CHART_LIMIT]]
-    company_capacity_chart_values = [float(c['total_capacity']) for c in company_capacity_chart_data[:CHART_LIMIT]] # Ensure float
-    # Add 'Other' category if needed
-    if company_capacity_chart_data.count() > CHART_LIMIT:
-        other_capacity = sum(float(c['total_capacity']) for c in company_capacity_chart_data[CHART_LIMIT:])
-        company_capacity_chart_labels.append('Other')
-        company_capacity_chart_values.append(other_capacity)
-
-    # Technology Chart Data (by Count)
-    tech_chart_data = Component.objects.exclude(technology__isnull=True).exclude(technology='') \
-                          .values('technology') \
-                          .annotate(count=Count('id')) \
-                          .order_by('-count')
-    tech_chart_labels = [t['technology'] for t in tech_chart_data[:CHART_LIMIT]]
-    tech_chart_values = [t['count'] for t in tech_chart_data[:CHART_LIMIT]]
-    # Add 'Other' category if needed
-    if tech_chart_data.count() > CHART_LIMIT:
-        other_tech_count = sum(t['count'] for t in tech_chart_data[CHART_LIMIT:])
-        tech_chart_labels.append('Other')
-        tech_chart_values.append(other_tech_count)
-
-    # Technology Chart Data (by Capacity)
-    tech_capacity_chart_data = Component.objects.exclude(technology__isnull=True).exclude(technology='') \
-                                   .exclude(derated_capacity_mw__isnull=True) \
-                                   .values('technology') \
-                                   .annotate(total_capacity=Sum('derated_capacity_mw')) \
-                                   .order_by('-total_capacity')
-    tech_capacity_chart_labels = [t['technology'] for t in tech_capacity_chart_data[:CHART_LIMIT]]
-    tech_capacity_chart_values = [float(t['total_capacity']) for t in tech_capacity_chart_data[:CHART_LIMIT]] # Ensure float
-    # Add 'Other' category if needed
-    if tech_capacity_chart_data.count() > CHART_LIMIT:
-        other_tech_capacity = sum(float(t['total_capacity']) for t in tech_capacity_chart_data[CHART_LIMIT:])
-        tech_capacity_chart_labels.append('Other')
-        tech_capacity_chart_values.append(other_tech_capacity)
-
-    # --- End Chart Data Preparation ---
 
-    context = {
-        'top_companies_data': top_companies_data, # Use the fetched data
-        'company_sort': company_sort, # Pass sort method to template
-        'company_order': company_order, # Pass sort order to template
-        'tech_distribution': tech_distribution,
-        'tech_sort': tech_sort, # Pass tech sort params
-        'tech_order': tech_order,
-        'year_distribution': year_distribution,
-        'top_derated_components': top_derated_components, # Add new list to context
-        'total_components': total_components,
-        'total_cmus': total_cmus,
-        'total_companies': total_companies,
-        'show_all_techs': show_all_techs, # Add flag to context
-        # Chart Data
-        'company_count_chart_labels': company_count_chart_labels,
-        'company_count_chart_values': company_count_chart_values,
-        'company_capacity_chart_labels': company_capacity_chart_labels,
-        'company_capacity_chart_values': company_capacity_chart_values,
-        'tech_chart_labels': tech_chart_labels,
-        'tech_chart_values': tech_chart_values,
-        # New Tech Capacity Chart Data
-        'tech_capacity_chart_labels': tech_capacity_chart_labels,
-        'tech_capacity_chart_values': tech_capacity_chart_values,
-    }
+    # All distributions, totals and chart data come from one precomputed snapshot
+    # (rebuilt by `manage.py build_statistics_snapshot` and after ingest runs)
+    snapshot = get_statistics_snapshot()
+    context = statistics_context(snapshot, company_sort, company_order, tech_sort, tech_order)
+    logger.info(
+        f"Statistics rendered from snapshot v{snapshot.version} "
+        f"(companies by {company_sort} {company_order}, technologies by {tech_sort} {tech_order})"
+    )
     
     return render(request, "checker/statistics.html", context)
 
@@ -1446,24 +1246,17 @@ def technology_search_results(request, technology_name_encoded):
         # Query components filtered by technology (case-insensitive)
         component_queryset = Component.objects.filter(technology__iexact=technology_name)
         
-        # Apply database sorting only for date field                                
-        if sort_field == "date":
-            component_queryset = component_queryset.order_by(db_sort_field)
-                                          
-        total_component_count = component_queryset.count()
-        logger.info(f"Found {total_component_count} components for technology '{technology_name}'")
-        
         # Apply sorting
         if sort_field in ["date", "derated_capacity"]:
-             # Apply DB sorting for indexed fields
-            component_queryset = component_queryset.order_by(db_sort_field)
+             # Apply DB sorting for indexed fields; the page and total come back in one query
+            component_queryset = component_queryset.order_by(db_sort_field, 'pk')
             logger.info(f"Applying DB sort: {db_sort_field}")
-            paginator = Paginator(component_queryset, per_page)
+            paginator = CountingPaginator(component_queryset, per_page)
         else:
             # Fetch all components if sorting by non-indexed field (MW/Connection Capacity)
             # This might still be slow for large technologies, consider adding Connection Capacity to DB too if needed.
-            logger.info(f"Fetching all {total_component_count} components for Python sort: {sort_field}")
             all_components = list(component_queryset)
+            logger.info(f"Fetched all {len(all_components)} components for Python sort: {sort_field}")
             
             if sort_field == "mw":
                 # Sort by MW (Connection Capacity) in Python
@@ -1493,6 +1286,8 @@ def technology_search_results(request, technology_name_encoded):
             
         # Get the object list for the current page
         components_list = list(components_page.object_list)
+        total_component_count = paginator.count
+        logger.info(f"Found {total_component_count} components for technology '{technology_name}'")
         
     except Exception as e:
         error_message = f"Error fetching components for technology: {e}"
@@ -1567,10 +1362,8 @@ def technology_search_results(request, technology_name_encoded):
 @require_http_methods(["GET"])
 def derated_capacity_list(request):
     """Displays a full, paginated list of components ranked by De-rated Capacity."""
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    
     logger.info("Full De-rated Capacity list requested")
-    page = request.GET.get("page", 1)
+    cursor = request.GET.get("cursor")
     sort_order_param = request.GET.get("sort", "desc") # Default to descending (largest first)
     if sort_order_param not in ["asc", "desc"]:
         sort_order_param = "desc" # Fallback to default if invalid value
@@ -1578,10 +1371,6 @@ def derated_capacity_list(request):
     per_page = 50
     start_time = time.time()
     
-    # Determine database sort order based on parameter
-    db_sort_prefix = '-' if sort_order_param == 'desc' else ''
-    db_sort_field = f'{db_sort_prefix}derated_capacity_mw'
-    
     all_processed_components = []
     error_message = None
     total_count = 0
@@ -1590,20 +1379,16 @@ def derated_capacity_list(request):
     try:
         # Query the database directly using the new field, excluding nulls
         component_queryset = Component.objects.exclude(derated_capacity_mw__isnull=True) \
-                                          .order_by(db_sort_field) \
                                           .only('id', 'location', 'company_name', 'derated_capacity_mw')
-                                          
-        total_count = component_queryset.count()
-        logger.info(f"Found {total_count} components with de-rated capacity, sorting by {db_sort_field}")
         
-        # Apply pagination directly to the queryset
-        paginator = Paginator(component_queryset, per_page)
-        try:
-            components_page = paginator.page(page)
-        except PageNotAnInteger:
-            components_page = paginator.page(1)
-        except EmptyPage:
-            components_page = paginator.page(paginator.num_pages)
+        # Keyset pagination on (derated_capacity_mw, id): deep pages cost the same as the first
+        paginator = KeysetPaginator(
+            component_queryset, per_page, 'derated_capacity_mw',
+            descending=sort_order_param == 'desc',
+        )
+        components_page = paginator.get_page(cursor)
+        total_count = components_page.total_count or 0
+        logger.info(f"Found {components_page.display_count} components with de-rated capacity, sorting {sort_order_param}")
             
         # Prepare data for the template (rename field)
         all_processed_components = []
@@ -1622,8 +1407,6 @@ def derated_capacity_list(request):
         all_processed_components = []
         total_count = 0
         components_page = None 
-        paginator = Paginator([], per_page) # Empty paginator
-        components_page = paginator.page(1)
     
     api_time = time.time() - start_time
     
@@ -1631,18 +1414,13 @@ def derated_capacity_list(request):
         # Use the processed list for the current page object
         "page_obj": components_page,
         "object_list": all_processed_components, # Pass the formatted list
-        "paginator": paginator,
         "total_count": total_count,
         "api_time": api_time,
         "error": error_message,
         "sort_order": sort_order_param, # Pass sort order to template
-        # Add other necessary context variables if the template requires them
-        "page": components_page.number if components_page else 1, 
         "per_page": per_page,
-        "total_pages": paginator.num_pages,
-        "has_prev": components_page.has_previous() if components_page else False,
-        "has_next": components_page.has_next() if components_page else False,
-        "page_range": paginator.get_elided_page_range(number=components_page.number if components_page else 1, on_each_side=1, on_ends=1)
+        "has_prev": components_page.has_previous if components_page else False,
+        "has_next": components_page.has_next if components_page else False,
     }
 
     return render(request, "checker/derated_capacity_list.html", context)
@@ -1650,12 +1428,11 @@ def derated_capacity_list(request):
 @require_http_methods(["GET"])
 def company_capacity_list(request):
     """Displays a full, paginated list of companies ranked by total De-rated Capacity."""
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    from django.db.models import Sum
+    from .models import CompanyCapacityTotal
     from .utils import normalize
     
     logger.info("Full Company list by Total Capacity requested")
-    page = request.GET.get("page", 1)
+    cursor = request.GET.get("cursor")
     sort_order_param = request.GET.get("sort", "desc") # Default to descending (largest first)
     if sort_order_param not in ["asc", "desc"]:
         sort_order_param = "desc" # Fallback to default
@@ -1663,40 +1440,31 @@ def company_capacity_list(request):
     per_page = 50 # Companies per page
     start_time = time.time()
     
-    # Determine database sort order based on parameter
-    db_sort_prefix = '-' if sort_order_param == 'desc' else ''
-    db_sort_field = f'{db_sort_prefix}total_capacity'
-    
     company_list = []
     error_message = None
     total_count = 0
     companies_page = None
-    paginator = None
     
     try:
-        # Query companies ranked by total capacity (similar to statistics view)
-        company_queryset = Component.objects.exclude(company_name__isnull=True) \
-                                    .exclude(company_name='') \
-                                    .exclude(derated_capacity_mw__isnull=True) \
-                                    .values('company_name') \
-                                    .annotate(total_capacity=Sum('derated_capacity_mw')) \
-                                    .order_by(db_sort_field)
-                                    
-        total_count = company_queryset.count()
-        logger.info(f"Found {total_count} companies with de-rated capacity, sorting by {db_sort_field}")
+        # Companies with at least one de-rated capacity, from the incrementally maintained
+        # capacity totals (an indexed read instead of a grouped Sum over all components)
+        company_queryset = CompanyCapacityTotal.objects.exclude(company_name='') \
+                                    .filter(capacity_component_count__gt=0) \
+                                    .values('company_name', 'total_capacity_mw')
         
-        # Apply pagination directly to the queryset
-        paginator = Paginator(company_queryset, per_page)
-        try:
-            companies_page = paginator.page(page)
-        except PageNotAnInteger:
-            companies_page = paginator.page(1)
-        except EmptyPage:
-            companies_page = paginator.page(paginator.num_pages)
+        # Keyset pagination on (total_capacity_mw, company_name)
+        paginator = KeysetPaginator(
+            company_queryset, per_page, 'total_capacity_mw',
+            descending=sort_order_param == 'desc', key_field='company_name',
+        )
+        companies_page = paginator.get_page(cursor)
+        total_count = companies_page.total_count or 0
+        logger.info(f"Found {companies_page.display_count} companies with de-rated capacity, sorting {sort_order_param}")
             
         # Prepare data for the template (add company_id)
         company_list = []
         for comp_data in companies_page.object_list:
+            comp_data['total_capacity'] = comp_data.pop('total_capacity_mw')
              # Normalize company name to create an ID for the link
             comp_data['company_id'] = normalize(comp_data['company_name'])
             company_list.append(comp_data)
@@ -1708,68 +1476,54 @@ def company_capacity_list(request):
         company_list = []
         total_count = 0
         companies_page = None 
-        paginator = Paginator([], per_page) # Empty paginator
-        companies_page = paginator.page(1)
     
     api_time = time.time() - start_time
     
     context = {
         "page_obj": companies_page,
         "object_list": company_list, # Pass the processed list for the current page
-        "paginator": paginator,
         "total_count": total_count,
         "api_time": api_time,
         "error": error_message,
         "sort_order": sort_order_param, # Pass sort order to template
         # Pagination context variables
-        "page": companies_page.number if companies_page else 1, 
         "per_page": per_page,
-        "total_pages": paginator.num_pages if paginator else 0,
-        "has_prev": companies_page.has_previous() if companies_page else False,
-        "has_next": companies_page.has_next() if companies_page else False,
-        "page_range": paginator.get_elided_page_range(number=companies_page.number if companies_page else 1, on_each_side=1, on_ends=1) if paginator else []
+        "has_prev": companies_page.has_previous if companies_page else False,
+        "has_next": companies_page.has_next if companies_page else False,
     }
 
     return render(request, "checker/company_capacity_list.html", context)
 
 def technology_list_view(request):
     """Displays a full, paginated list of technologies ranked by component count."""
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    from django.db.models import Count
-    from .models import Component
+    from django.db.models import Sum
+    from .models import TechnologyCapacityTotal
     import logging
     import time
 
     logger = logging.getLogger(__name__)
     start_time = time.time()
 
-    page = request.GET.get('page', 1)
+    cursor = request.GET.get('cursor')
     per_page = 50  # Or adjust as needed
     error_message = None
 
     try:
-        # Query all non-empty technologies, count components, order by count
-        tech_queryset = Component.objects.exclude(technology__isnull=True) \
-                                 .exclude(technology='') \
-                                 .values('technology') \
-                                 .annotate(count=Count('id')) \
-                                 .order_by('-count')
-        
-        total_count = tech_queryset.count()
-        logger.info(f"Found {total_count} distinct non-empty technologies.")
-
-        # Apply pagination
-        paginator = Paginator(tech_queryset, per_page)
-        try:
-            tech_page = paginator.page(page)
-        except PageNotAnInteger:
-            tech_page = paginator.page(1)
-        except EmptyPage:
-            tech_page = paginator.page(paginator.num_pages)
+        # All non-empty technologies with their component counts (capacity totals table)
+        tech_queryset = TechnologyCapacityTotal.objects.exclude(technology='') \
+                                 .filter(component_count__gt=0) \
+                                 .values('technology', 'component_count')
+
+        # Keyset pagination ordered by count (largest first), then technology
+        paginator = KeysetPaginator(tech_queryset, per_page, 'component_count', descending=True, key_field='technology')
+        tech_page = paginator.get_page(cursor)
+        total_count = tech_page.total_count or 0
+        logger.info(f"Found {tech_page.display_count} distinct non-empty technologies.")
             
-        # Calculate percentages for display relative to total components
-        total_components = Component.objects.count()
+        # Calculate percentages for display relative to total components (blank technology included)
+        total_components = TechnologyCapacityTotal.objects.aggregate(total=Sum('component_count'))['total'] or 0
         for tech_data in tech_page.object_list:
+            tech_data['count'] = tech_data.pop('component_count')
             if total_components > 0:
                 tech_data['percentage'] = (tech_data['count'] / total_components) * 100
             else:
@@ -1781,15 +1535,12 @@ def technology_list_view(request):
         # Ensure variables are in a safe state for the template
         tech_page = None 
         total_count = 0
-        paginator = Paginator([], per_page) # Empty paginator
-        tech_page = paginator.page(1)
 
     api_time = time.time() - start_time
 
     context = {
         'page_obj': tech_page,
         'total_count': total_count,
-        'paginator': paginator,
         'api_time': api_time,
         'error': error_message,
     }
@@ -1828,8 +1579,11 @@ def map_view(request):
     
     return render(request, 'checker/map.html', context)
 
-def map_data_api(request):
-    """API endpoint to provide map marker data in GeoJSON format"""
+def _map_component_query(request):
+    """
+    Geocoded components matching the map filters in request.GET (shared by the map APIs).
+    Returns (queryset, bbox or None, is_filtered).
+    """
     # Start with geocoded components only
     base_query = Component.objects.filter(
         geocoded=True,
@@ -1853,35 +1607,20 @@ def map_data_api(request):
         default_filters_applied = True
 
     # Apply viewport filtering if bounds are provided
-    viewport_filtered = False
+    bbox = None
     try:
         north = float(request.GET.get('north'))
         south = float(request.GET.get('south'))
         east = float(request.GET.get('east'))
         west = float(request.GET.get('west'))
-        # Check if east < west (dateline crossing) - handle if necessary, simple case for now
-        if east < west: # Basic dateline wrap handling
-            # Query components in two parts: west to 180 and -180 to east
-            viewport_query = Q(latitude__gte=south, latitude__lte=north) & \
-                             (Q(longitude__gte=west) | Q(longitude__lte=east))
-
-        else: # Standard case
-             viewport_query = Q(latitude__gte=south, latitude__lte=north,
-                                longitude__gte=west, longitude__lte=east)
-
-        base_query = base_query.filter(viewport_query)
-        viewport_filtered = True
-        print(f"Applying viewport filter: N:{north}, S:{south}, E:{east}, W:{west}") # Simple logging
+        # east < west means the viewport crosses the dateline (handled by bbox_filter)
+        bbox = (south, west, north, east)
     except (TypeError, ValueError, KeyError):
         # One or more bounds parameters missing or invalid, don't filter by viewport
         pass
 
     # Apply specific filters if they were provided (overriding defaults)
     if tech := specific_tech_requested:
-        # This filter was already applied if it wasn't the default, 
-        # but we apply it again here to ensure it overrides the default if both are somehow present.
-        # A better approach might be to conditionally apply the default earlier.
-        # Re-applying for simplicity ensures the specific request wins.
         base_query = base_query.filter(technology=tech)
         
     if company := request.GET.get('company'):
@@ -1894,36 +1633,6 @@ def map_data_api(request):
     if cmu_id := request.GET.get('cmu_id'):
         base_query = base_query.filter(cmu_id=cmu_id)
 
-    # Calculate total count *before* limiting
-    total_filtered_count = base_query.count()
-
-    # Apply limit *after* filtering
-    # Consider removing or reducing the hard limit when viewport filtering is active
-    # For now, keep the limit logic but maybe make it larger if viewport is used?
-    limit = int(request.GET.get('limit', 5000 if viewport_filtered else 2000)) # Increase limit if viewport filtered
-    components = base_query[:limit]
-
-    # Build GeoJSON response
-    features = []
-    for comp in components:
-        features.append({
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Point',
-                'coordinates': [comp.longitude, comp.latitude]  # GeoJSON uses [lng, lat] order
-            },
-            'properties': {
-                'id': comp.id,
-                'cmu_id': comp.cmu_id,
-                'title': comp.location or 'Unknown Location',
-                'technology': comp.technology or 'Unknown',
-                'company': comp.company_name or 'Unknown',
-                'description': comp.description or '',
-                'delivery_year': comp.delivery_year or '',
-                'detailUrl': f'/component/{comp.id}/' # Ensure you have a URL pattern for this!
-            }
-        })
-
     # Determine if any filters were applied (specific requests, default filters, viewport)
     is_filtered = any([
         specific_tech_requested,
@@ -1931,8 +1640,52 @@ def map_data_api(request):
         specific_year_requested,
         request.GET.get('cmu_id'),
         default_filters_applied, # True if default year or tech was applied
-        viewport_filtered
+        bbox is not None
     ])
+    return base_query, bbox, is_filtered
+
+
+@versioned_response
+def map_data_api(request):
+    """
+    API endpoint to provide map marker data in GeoJSON format, or with ?format=compact /
+    ?format=binary as parallel arrays (see map_clusters.compact_points / pack_compact_points)
+    whose per-marker details come from map_marker_api.
+    """
+    response_format = request.GET.get('format', map_clusters.MAP_FORMAT_GEOJSON)
+    if response_format not in map_clusters.MAP_FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(map_clusters.MAP_FORMATS)}"}, status=400)
+
+    base_query, bbox, is_filtered = _map_component_query(request)
+    viewport_filtered = bbox is not None
+    if viewport_filtered:
+        base_query = base_query.filter(bbox_filter(bbox))
+        logger.info(f"Applying viewport filter: N:{bbox[2]}, S:{bbox[0]}, E:{bbox[3]}, W:{bbox[1]}")
+
+    # Calculate total count *before* limiting
+    total_filtered_count = base_query.count()
+
+    # Apply limit *after* filtering
+    limit = int(request.GET.get('limit', 5000 if viewport_filtered else 2000)) # Increase limit if viewport filtered
+
+    if response_format != map_clusters.MAP_FORMAT_GEOJSON:
+        points = map_clusters.compact_points(base_query, limit)
+        metadata = {
+            'count': len(points['ids']),
+            'total': total_filtered_count,
+            'filtered': is_filtered
+        }
+        if response_format == map_clusters.MAP_FORMAT_BINARY:
+            return HttpResponse(
+                map_clusters.pack_compact_points(points, metadata),
+                content_type=map_clusters.BINARY_CONTENT_TYPE
+            )
+        return JsonResponse(dict(points, format=response_format, metadata=metadata))
+
+    components = base_query[:limit]
+
+    # Build GeoJSON response
+    features = [component_feature(comp) for comp in components]
 
     # Include count information
     response_data = {
@@ -1947,4 +1700,88 @@ def map_data_api(request):
 
     return JsonResponse(response_data)
 
+
+@require_http_methods(["GET"])
+@versioned_response
+def map_clusters_api(request):
+    """
+    Clustered map data for a zoom level and viewport: one feature per occupied grid cell
+    (count, technology breakdown, centroid) below MAP_CLUSTER_MAX_ZOOM, individual
+    components (at most MAP_POINT_LIMIT) from that zoom up. Takes the same filters as
+    map_data_api plus `zoom`.
+    """
+    try:
+        zoom = int(request.GET.get('zoom', 6))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+    zoom = min(max(zoom, map_clusters.MIN_ZOOM), map_clusters.MAX_ZOOM)
+
+    base_query, bbox, is_filtered = _map_component_query(request)
+    mode = 'points' if zoom >= map_clusters.MAP_CLUSTER_MAX_ZOOM else 'clusters'
+
+    # Snap the viewport to the grid so nearby pans share a cache entry
+    cell_size = map_clusters.cell_size_for_zoom(zoom)
+    if bbox is not None and bbox[3] >= bbox[1]:
+        bbox = map_clusters.snap_bbox(bbox, cell_size)
+    # Points can be sent compact (clusters are compact already)
+    compact = mode == 'points' and request.GET.get('format') == map_clusters.MAP_FORMAT_COMPACT
+    filters = {key: request.GET.get(key, '') for key in ('technology', 'company', 'year', 'cmu_id')}
+    cache_key = versioned_cache_key("map_clusters", f"{mode}|{zoom}|{bbox}|{compact}|{sorted(filters.items())}")
+    response_data = cache.get(cache_key)
+    if response_data is not None:
+        return JsonResponse(response_data)
+
+    start_time = time.time()
+    if bbox is not None:
+        base_query = base_query.filter(bbox_filter(bbox))
+
+    if mode == 'clusters':
+        features, cell_size = map_clusters.cluster_features(base_query, zoom, bbox)
+        total = sum(feature['properties']['count'] for feature in features)
+        truncated = False
+    elif compact:
+        points = map_clusters.compact_points(base_query.order_by('id'), map_clusters.MAP_POINT_LIMIT + 1)
+        truncated = len(points['ids']) > map_clusters.MAP_POINT_LIMIT
+        for column in ('ids', 'lng', 'lat', 'tech'):
+            del points[column][map_clusters.MAP_POINT_LIMIT:]
+        features = points['ids']
+        total = base_query.count() if truncated else len(features)
+    else:
+        features, truncated = map_clusters.point_features(base_query)
+        total = base_query.count() if truncated else len(features)
+
+    response_data = dict(points, format=map_clusters.MAP_FORMAT_COMPACT) if compact else {
+        'type': 'FeatureCollection',
+        'features': features,
+    }
+    response_data.update({
+        'metadata': {
+            'mode': mode,
+            'zoom': zoom,
+            'cell_size': cell_size if mode == 'clusters' else None,
+            'bbox': bbox,
+            'count': len(features),  # Features returned (clusters or points)
+            'total': total,  # Components they cover / matched
+            'truncated': truncated,
+            'filtered': is_filtered,
+            'cluster_max_zoom': map_clusters.MAP_CLUSTER_MAX_ZOOM,
+        }
+    })
+    logger.info(
+        f"Map clusters z{zoom} ({mode}): {len(features)} features for {total} components "
+        f"in {time.time() - start_time:.3f}s"
+    )
+    cache.set(cache_key, response_data, map_clusters.MAP_CLUSTER_CACHE_TTL)
+    return JsonResponse(response_data)
+
+
+@require_http_methods(["GET"])
+@versioned_response
+def map_marker_api(request, component_id):
+    """Title, description, company etc. for one map marker, fetched when it is clicked (compact map formats)."""
+    component = Component.objects.filter(pk=component_id).only(*map_clusters.POINT_FIELDS).first()
+    if component is None:
+        return JsonResponse({'error': 'Component not found'}, status=404)
+    return JsonResponse(map_clusters.marker_details(component))
+
 # -------- Map View and API --------- END ---------
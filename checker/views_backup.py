@@ -132,7 +132,7 @@ def htmx_cmu_details(request, cmu_id):
 def debug_mapping(request):
     """Debug view to examine the CMU ID to company name mapping"""
     from django.http import JsonResponse
-    from .services.company_search import get_cmu_dataframe
+    from .services.data_access import get_cmu_dataframe
     import traceback
     
     debug_info = {
@@ -266,7 +266,7 @@ def debug_company_components(request):
         })
     
     # Get CMU dataframe to find all CMU IDs for this company
-    from .services.company_search import get_cmu_dataframe
+    from .services.data_access import get_cmu_dataframe
     cmu_df, _ = get_cmu_dataframe()
     
     if cmu_df is None: